@@ -0,0 +1,298 @@
+"""
+Admission control for Whisper and Grok calls.
+
+Every transcription and Grok call takes a slot from its resource's
+controller first. Waiting calls are admitted in this order:
+
+    lane        interactive (live mode, superagent turns) before standard
+                (web uploads) before batch (profile builds, CLI mapping);
+                ADMISSION_INTERACTIVE_RESERVE slots are only ever given to
+                interactive calls, so they never queue behind a full batch
+    fairness    within a lane, weighted fair queuing across users: each
+                admitted call advances its user's virtual time by 1/weight
+                and the user furthest behind goes next, so one user's 30
+                files interleave with everyone else's instead of going first
+    user cap    at most ADMISSION_USER_SLOTS calls per user per resource
+
+When the queue is full, or a call has waited longer than its lane allows,
+the call is shed with Busy, which carries a retry-after estimate (the web
+app answers 503 with a Retry-After header). Time spent waiting only on the
+caller's own user cap does not count towards that limit, so a large
+upload's later files wait their turn instead of being shed on an idle server.
+
+Who is calling is set per request or per script with acting_as(Client(...));
+calls without one run as the default client. Limits apply per process (each
+gunicorn worker has its own controllers).
+
+    with admission.acting_as(admission.Client("alice", "interactive")):
+        grok_client.chat_completion(...)     # waits for a fair "grok" slot
+"""
+
+import math
+import time
+import itertools
+import threading
+import contextvars
+from collections import deque, Counter
+from contextlib import contextmanager
+
+import config
+import cancellation
+
+LANES = ("interactive", "standard", "batch")  # in priority order
+DEFAULT_LANE = config.get("ADMISSION_DEFAULT_LANE", "standard")
+DEFAULT_USER = "local"
+
+ADMISSION = config.get_bool("ADMISSION", True)
+GROK_SLOTS = int(config.get("ADMISSION_GROK_SLOTS", "8"))
+TRANSCRIPTION_SLOTS = int(config.get("ADMISSION_TRANSCRIPTION_SLOTS", "4"))
+USER_SLOTS = int(config.get("ADMISSION_USER_SLOTS", "2"))
+INTERACTIVE_RESERVE = int(config.get("ADMISSION_INTERACTIVE_RESERVE", "2"))
+MAX_QUEUE = int(config.get("ADMISSION_MAX_QUEUE", "64"))  # waiting calls per resource before shedding
+MAX_WAIT_SEC = {  # longest a call may queue, per lane
+    "interactive": float(config.get("ADMISSION_INTERACTIVE_MAX_WAIT", "15")),
+    "standard": float(config.get("ADMISSION_STANDARD_MAX_WAIT", "300")),
+    "batch": float(config.get("ADMISSION_BATCH_MAX_WAIT", "3600")),
+}
+HOLD_WINDOW = 50  # recent slot hold times used for retry-after estimates
+DEFAULT_HOLD_SEC = 30.0
+
+
+def _parse_weights(value: str) -> dict:
+    """ADMISSION_WEIGHTS="alice=2,bob=0.5" -> {"alice": 2.0, "bob": 0.5}"""
+    weights = {}
+    for item in (value or "").split(","):
+        user, _, weight = item.partition("=")
+        if user.strip() and weight.strip():
+            weights[user.strip()] = float(weight)
+    return weights
+
+
+USER_WEIGHTS = _parse_weights(config.get("ADMISSION_WEIGHTS", ""))
+
+
+class Busy(Exception):
+    """The call was shed; retry after retry_after seconds."""
+
+    def __init__(self, resource: str, retry_after: int, reason: str):
+        self.resource = resource
+        self.retry_after = retry_after
+        super().__init__(f"Server busy ({resource}: {reason}). Please retry in {retry_after} seconds.")
+
+
+class Client:
+    """Who a call is made for, and in which lane."""
+
+    def __init__(self, user: str = DEFAULT_USER, lane: str = DEFAULT_LANE, weight: float = None):
+        if lane not in LANES:
+            raise ValueError(f"Unknown admission lane: {lane!r}. Choose from {', '.join(LANES)}.")
+        self.user = user
+        self.lane = lane
+        self.weight = weight or USER_WEIGHTS.get(user, 1.0)
+
+    def __repr__(self):
+        return f"Client({self.user!r}, {self.lane!r})"
+
+
+_current = contextvars.ContextVar("admission_client", default=None)
+
+
+def current() -> Client:
+    return _current.get() or Client()
+
+
+@contextmanager
+def acting_as(client: Client):
+    """Make client the caller of every admission-controlled call in the block."""
+    reset = _current.set(client)
+    try:
+        yield client
+    finally:
+        _current.reset(reset)
+
+
+def bind(fn, client: Client):
+    """fn wrapped to run as client (for work handed to other threads)."""
+    def run_as_client(*args, **kwargs):
+        with acting_as(client):
+            return fn(*args, **kwargs)
+    return run_as_client
+
+
+class _Waiter:
+    def __init__(self, client: Client, seq: int):
+        self.client = client
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+
+
+class AdmissionController:
+    """Slots of one resource, handed out by lane, then weighted fair share, then arrival."""
+
+    def __init__(self, resource: str, slots: int, user_slots: int = USER_SLOTS,
+                 interactive_reserve: int = INTERACTIVE_RESERVE, max_queue: int = MAX_QUEUE):
+        self.resource = resource
+        self.slots = slots
+        self.user_slots = user_slots
+        self.interactive_reserve = min(interactive_reserve, max(slots - 1, 0))
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._active = 0
+        self._active_by_user = Counter()
+        self._vtime = {}  # user -> virtual time after their last admission
+        self._clock = 0.0  # virtual time of the last admission
+        self._holds = deque(maxlen=HOLD_WINDOW)
+        self._waits = deque(maxlen=HOLD_WINDOW)
+        self._counters = {"admitted": 0, "shed_queue_full": 0, "shed_timeout": 0, "cancelled": 0}
+        self._by_lane = Counter()
+
+    # -- scheduling (call with _lock held) -----------------------------------
+
+    def _eligible(self, waiter: _Waiter) -> bool:
+        free = self.slots - self._active
+        if free <= 0 or self._active_by_user[waiter.client.user] >= self.user_slots:
+            return False
+        return waiter.client.lane == "interactive" or free > self.interactive_reserve
+
+    def _start_time(self, user: str) -> float:
+        # Users returning from idle start at the current clock instead of using banked credit
+        return max(self._vtime.get(user, 0.0), self._clock)
+
+    def _dispatch(self):
+        while self._waiting:
+            eligible = [waiter for waiter in self._waiting if self._eligible(waiter)]
+            if not eligible:
+                return
+            waiter = min(
+                eligible,
+                key=lambda w: (LANES.index(w.client.lane), self._start_time(w.client.user), w.seq),
+            )
+            self._waiting.remove(waiter)
+            user = waiter.client.user
+            start = self._start_time(user)
+            self._vtime[user] = start + 1.0 / waiter.client.weight
+            self._clock = start
+            self._active += 1
+            self._active_by_user[user] += 1
+            self._counters["admitted"] += 1
+            self._by_lane[waiter.client.lane] += 1
+            self._waits.append(time.monotonic() - waiter.enqueued_at)
+            waiter.granted.set()
+
+    def _retry_after(self) -> int:
+        hold = sum(self._holds) / len(self._holds) if self._holds else DEFAULT_HOLD_SEC
+        return max(1, math.ceil(hold * (len(self._waiting) + 1) / self.slots))
+
+    # -- public ----------------------------------------------------------------
+
+    def acquire(self, client: Client) -> float:
+        """Block until client holds a slot; returns the monotonic time it was granted."""
+        with self._lock:
+            if len(self._waiting) >= self.max_queue:
+                self._counters["shed_queue_full"] += 1
+                raise Busy(self.resource, self._retry_after(), "queue full")
+            waiter = _Waiter(client, next(self._seq))
+            self._waiting.append(waiter)
+            self._dispatch()
+        waited = 0.0  # seconds spent blocked by other users' calls
+        polled_at = waiter.enqueued_at
+        try:
+            while not waiter.granted.wait(cancellation.POLL_SEC):
+                cancellation.check()
+                now = time.monotonic()
+                with self._lock:
+                    if self._active_by_user[client.user] < self.user_slots:
+                        waited += now - polled_at
+                    polled_at = now
+                    if waited >= MAX_WAIT_SEC[client.lane]:
+                        if not waiter.granted.is_set():
+                            self._waiting.remove(waiter)
+                            self._counters["shed_timeout"] += 1
+                            raise Busy(self.resource, self._retry_after(), "waited too long")
+        except cancellation.Cancelled:
+            with self._lock:
+                if not waiter.granted.is_set():
+                    self._waiting.remove(waiter)
+                    self._counters["cancelled"] += 1
+                    raise
+            self.release(client, time.monotonic())
+            raise
+        return time.monotonic()
+
+    def release(self, client: Client, granted_at: float):
+        with self._lock:
+            self._active -= 1
+            self._active_by_user[client.user] -= 1
+            if not self._active_by_user[client.user]:
+                del self._active_by_user[client.user]
+            self._holds.append(time.monotonic() - granted_at)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, client: Client = None):
+        client = client or current()
+        granted_at = self.acquire(client)
+        abandoned = None
+        try:
+            yield
+        except cancellation.Cancelled as e:
+            abandoned = e.abandoned
+            raise
+        finally:
+            if abandoned is None:
+                self.release(client, granted_at)
+            else:
+                # A cancelled call still occupies the resource until it returns
+                abandoned.add_done_callback(lambda _: self.release(client, granted_at))
+
+    def retry_after_if_saturated(self) -> int:
+        """Seconds to suggest if new work should be refused right away (queue full), else 0."""
+        with self._lock:
+            return self._retry_after() if len(self._waiting) >= self.max_queue else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "slots": self.slots,
+                "active": self._active,
+                "waiting": dict(Counter(waiter.client.lane for waiter in self._waiting)),
+                "active_users": len(self._active_by_user),
+                "admitted_by_lane": dict(self._by_lane),
+                "p50_wait_seconds": waits[len(waits) // 2] if waits else None,
+                "max_wait_seconds": waits[-1] if waits else None,
+                **self._counters,
+            }
+
+
+controllers = {
+    "grok": AdmissionController("grok", GROK_SLOTS),
+    "transcription": AdmissionController("transcription", TRANSCRIPTION_SLOTS),
+}
+
+
+@contextmanager
+def slot(resource: str):
+    """Hold one slot of resource ("grok" or "transcription") for the current client."""
+    if not ADMISSION:
+        yield
+        return
+    with controllers[resource].slot():
+        yield
+
+
+def shed_if_saturated(*resources: str):
+    """Raise Busy now, before any work is done, if a resource's queue is already full."""
+    if not ADMISSION:
+        return
+    for resource in resources:
+        retry_after = controllers[resource].retry_after_if_saturated()
+        if retry_after:
+            raise Busy(resource, retry_after, "queue full")
+
+
+def stats() -> dict:
+    return {resource: controller.stats() for resource, controller in controllers.items()}
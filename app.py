@@ -1,13 +1,47 @@
 import os
 import json
 import re
+import time
 import tempfile
 import hashlib
 import uuid
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError, FIRST_COMPLETED, wait
+from collections import deque
 from pathlib import Path
-from dotenv import load_dotenv
-from flask import Flask, request, render_template, url_for
-import requests
+from flask import Flask, Response, request, render_template, stream_template, url_for, jsonify, abort
+from werkzeug.middleware.proxy_fix import ProxyFix
+import sqlite3
+from datetime import datetime
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None  # live mode needs: pip install flask-sock
+
+import config
+import assets
+import admission
+import cancellation
+import checkpoints
+import shared_state
+import memory_diagnostics
+import grok_client
+import model_routing
+import emotional_mapping
+import emotion_analytics
+import search_index
+import audio_preprocess
+import compaction
+import transcription
+import transcript_store
+import live_session
+import timeline_svg
+import prompt_budget
+from retrieval import RetrievalIndex
+from transcript_model import Transcript
 
 # Try to import matplotlib for chart generation
 try:
@@ -20,27 +54,42 @@ try:
 except ImportError:
     MATPLOTLIB_AVAILABLE = False
 
-# Try to import OpenAI at module level to catch import errors early
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-
-load_dotenv()
-XAI_API_KEY = os.getenv("XAI_API_KEY")
-if not XAI_API_KEY:
-    raise RuntimeError("XAI_API_KEY not found in environment. Check your .env file.")
-
-# Note: OPENAI_API_KEY is loaded dynamically in transcribe_audio_openai() 
-# to ensure it's always fresh from .env file
-
 # Supported audio formats
 AUDIO_EXTENSIONS = {'.m4a', '.mp3', '.wav', '.mp4', '.webm', '.ogg', '.flac'}
 TEXT_EXTENSIONS = {'.txt'}
 
-XAI_URL = "https://api.x.ai/v1/chat/completions"
-MODEL = "grok-4-0709"  # adjust if needed
+
+# Rough transcript tokens per MB of audio, used to preview a plan before
+# transcription (speech runs ~200 tokens/minute; uncompressed formats are larger)
+AUDIO_TOKENS_PER_MB = {'.wav': 20, '.flac': 40}
+DEFAULT_AUDIO_TOKENS_PER_MB = 400
+
+# How long a transcript is reused for the same audio (by any worker or node)
+TRANSCRIPTION_CACHE_DAYS = float(config.get("TRANSCRIPTION_CACHE_DAYS", "30"))
+
+# Characters of each transcript rendered in a report; the rest is fetched on expand
+TRANSCRIPT_PREVIEW_CHARS = 200
+
+# Threads running per-file analyses across all requests; keep this above
+# ADMISSION_GROK_SLOTS. Each request submits at most its user's admission cap
+# of files at a time, so the rest of a large upload waits in its own request
+# rather than in pool threads other users' files need.
+ANALYSIS_CONCURRENCY = int(config.get("ANALYSIS_CONCURRENCY", "16"))
+ANALYSIS_PER_REQUEST = max(1, admission.USER_SLOTS)
+
+# Largest upload request accepted (all files together); larger ones get 413
+MAX_UPLOAD_MB = float(config.get("MAX_UPLOAD_MB", "1024"))
+
+# Serve memory diagnostics under /debug/memory (exposes source file names)
+DIAGNOSTICS = config.get_bool("DIAGNOSTICS", False)
+
+# Request header naming the user for fair sharing (set by an auth proxy);
+# without it users are told apart by client address
+ADMISSION_USER_HEADER = config.get("ADMISSION_USER_HEADER")
+
+# Reverse proxies in front of the app whose X-Forwarded-For (and -Proto,
+# -Host) are trusted; without it, behind a proxy every client has its address
+WEB_PROXIES = int(config.get("WEB_PROXIES", "0"))
 
 PROFILE_PROMPT = """
 You are HumanIntuition.ai's deep analysis engine. You receive a raw conversation transcript and must produce a multi-layered report through the lenses of Marco's maxims, Kessler's Five Personality Patterns, shadow work, meditative development, and the Hopkins "Mind Sight" research. Your goal is to reveal the patterns and possibilities within the dialogue—not to diagnose anyone—and to present the information in a clear, structured, and visually rich format.
@@ -105,65 +154,62 @@ CONSTRAINTS:
 
 
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = int(MAX_UPLOAD_MB * 1024 * 1024)
+if WEB_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=WEB_PROXIES, x_proto=WEB_PROXIES, x_host=WEB_PROXIES)
+assets.init_app(app)
+memory_diagnostics.init_app(app)
+STARTED_AT = time.time()
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_CONCURRENCY, thread_name_prefix="analysis")
+_pyplot_lock = threading.Lock()
+_retrieval_index = None  # loaded on first use; appends only re-read its stats.json
+shared_state.backend()  # fail at startup on a bad SHARED_STATE rather than on the first upload
 
 
-def transcribe_audio_openai(audio_path: str) -> str:
-    """Transcribe audio using OpenAI's Whisper API."""
-    # Double-check import at runtime with path fallback
-    try:
-        from openai import OpenAI
-    except ImportError:
-        # Try adding user site-packages to path
-        import sys
-        user_site = os.path.expanduser('~/Library/Python/3.9/lib/python/site-packages')
-        if user_site not in sys.path:
-            sys.path.insert(0, user_site)
-        try:
-            from openai import OpenAI
-        except ImportError as e:
-            raise ImportError(
-                f"openai package not installed. Run: pip install openai\n"
-                f"Then restart the Flask app.\n"
-                f"Import error: {e}\n"
-                f"Python path: {sys.executable}"
-            )
-    
-    # Reload .env to ensure we have the latest values
-    load_dotenv()
-    openai_key = os.getenv("OPENAI_API_KEY")
-    
-    if not openai_key:
-        raise ValueError(
-            "OPENAI_API_KEY not found in .env file. "
-            "Please add it to your .env file: OPENAI_API_KEY=your_key_here"
-        )
-    
-    try:
-        client = OpenAI(api_key=openai_key)
-        
-        with open(audio_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
-        
-        return transcript
-    except Exception as e:
-        raise Exception(f"OpenAI transcription error: {e}")
+def transcribe_upload(f, temp_files: list, audio_digest: str = None) -> str:
+    """
+    Save an uploaded audio file to a temporary file (recorded in temp_files)
+    and transcribe it. Given the upload's digest, the transcript is shared
+    through shared_state: audio already transcribed anywhere is not sent
+    again, and audio being transcribed elsewhere is waited for. Transcripts
+    are keyed by the backend that produced them; a local-Whisper fallback
+    transcript is reused only while the API's breaker is open.
+    """
+    router = transcription.router
+    served = {}
 
+    def transcribe_saved():
+        with tempfile.NamedTemporaryFile(delete=False, suffix=get_file_extension(f.filename)) as tmp_file:
+            f.save(tmp_file.name)
+            temp_files.append(tmp_file.name)
+        # Whisper API, or local Whisper while the API is failing
+        text, served["backend"] = transcribe_audio(tmp_file.name)
+        return text
 
-def transcribe_audio_local(audio_path: str) -> str:
-    """Transcribe audio using local Whisper model."""
-    try:
-        import whisper
-        model = whisper.load_model("base")  # or "tiny", "small", "medium", "large"
-        result = model.transcribe(audio_path)
-        return result["text"]
-    except ImportError:
-        raise ImportError("openai-whisper package not installed. Run: pip install openai-whisper")
-    except Exception as e:
-        raise Exception(f"Local Whisper transcription error: {e}")
+    if audio_digest is None:
+        return transcribe_saved()
+    ttl = TRANSCRIPTION_CACHE_DAYS * 86400
+    fallback_key = f"{audio_digest}:{router.fallback_name}"
+    if router.breaker.state == "open":
+        cached = shared_state.get("transcription", fallback_key)
+        if cached is not None:
+            return cached
+    text = shared_state.single_flight(
+        "transcription", f"{audio_digest}:{router.primary_name}", transcribe_saved, ttl=ttl,
+        keep=lambda _: served.get("backend") == router.primary_name,
+    )
+    if served.get("backend") == router.fallback_name:
+        shared_state.put("transcription", fallback_key, text, ttl=ttl)
+    return text
+
+
+def transcribe_audio(audio_path: str) -> tuple:
+    """
+    Preprocess an upload (strip video, downmix, trim long silences, re-encode)
+    and transcribe it; returns (text, name of the backend that produced it).
+    """
+    with audio_preprocess.preprocess(audio_path) as prepared:
+        return transcription.router.route(prepared.path, prepared.processed_duration)
 
 
 def get_file_extension(filename: str) -> str:
@@ -480,6 +526,16 @@ def execute_matplotlib_code(code: str) -> str:
     if not MATPLOTLIB_AVAILABLE:
         return None
     
+    # pyplot keeps every open figure in one process-wide registry: run one
+    # chart at a time and always close its figures, or they pile up per request
+    with _pyplot_lock:
+        try:
+            return _execute_matplotlib_code(code)
+        finally:
+            plt.close('all')
+
+
+def _execute_matplotlib_code(code: str) -> str:
     try:
         # Clean up the code - normalize whitespace and newlines
         code = code.strip()
@@ -496,10 +552,6 @@ def execute_matplotlib_code(code: str) -> str:
             '__builtins__': __builtins__
         }
         
-        # Clear any previous plots
-        plt.clf()
-        plt.close('all')
-        
         # Remove plt.show() calls as we'll save instead
         code_modified = re.sub(r'plt\.show\(\)', '', code)
         code_modified = re.sub(r'plt\.show\s*\(\s*\)', '', code_modified)
@@ -544,31 +596,221 @@ def format_code_block(code: str) -> str:
     return f'<div class="analysis-code-block"><pre><code>{code}</code></pre></div>'
 
 
+def plan_analysis(transcript: str, strategy: str = None) -> prompt_budget.PromptPlan:
+    """Estimate the analysis prompt size locally, pick a model and choose how to fit the token budget."""
+    return model_routing.plan_for_task("analysis", PROFILE_PROMPT, transcript, strategy=strategy)
+
+
+def run_analysis_plan(plan: prompt_budget.PromptPlan, run: checkpoints.Run = None) -> str:
+    """Run every Grok call a plan needs (checkpointed in run, if given) and return the raw markdown analysis."""
+    send = model_routing.plan_sender("analysis", plan)
+    return prompt_budget.run_plan(plan, run.sender(send) if run else send)
+
+
+def estimate_upload_tokens(text_files: list, audio_sizes: list, compaction_level: str = None) -> list:
+    """Estimate transcript tokens per file: text files exactly (after compaction), audio from (filename, bytes)."""
+    tokens = []
+    for f in text_files:
+        text = f.read().decode("utf-8", errors="ignore")
+        tokens.append(compaction.compact(text, compaction_level).compacted_tokens)
+    for filename, size in audio_sizes:
+        per_mb = AUDIO_TOKENS_PER_MB.get(get_file_extension(filename), DEFAULT_AUDIO_TOKENS_PER_MB)
+        tokens.append(int(size / (1024 * 1024) * per_mb))
+    return tokens
+
+
 def analyze_transcript_with_grok(transcript: str) -> str:
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {XAI_API_KEY}",
+    raw_analysis = run_analysis_plan(plan_analysis(compaction.compact(transcript).text))
+
+    # Convert to formatted HTML
+    return format_analysis_html(raw_analysis)
+
+
+def build_analysis_result(title: str, transcript: str, strategy: str = None, file_list: str = None,
+                          emotions: bool = False, compaction_level: str = None,
+                          run: checkpoints.Run = None) -> dict:
+    """
+    Plan, run and format one analysis, returning a result dict for the template.
+    With emotions, the emotional map is requested in the same Grok call.
+    The transcript is compacted first (see compaction.py); the page shows the original.
+    With a run, each Grok call and the finished analysis are checkpointed.
+    """
+    cancellation.check()
+    compacted = compaction.compact(transcript, compaction_level)
+    # Check the size locally before sending anything to Grok
+    if emotions:
+        plan = emotional_mapping.plan_fused(PROFILE_PROMPT, compacted.text, strategy)
+    else:
+        plan = plan_analysis(compacted.text, strategy)
+    if not plan.fits:
+        return {
+            "filename": title,
+            "transcript": None,
+            "analysis": None,
+            "error": f"Transcripts are too long to analyze in one request: {plan.describe()}. "
+                     "Choose a different strategy for long inputs and try again."
+        }
+
+    source = f"Combined Analysis ({file_list})" if file_list else title
+
+    def analyze() -> list:
+        if emotions:
+            return list(emotional_mapping.call_grok_fused(plan, run=run))
+        return [run_analysis_plan(plan, run), None]
+
+    stage = f"analysis {source} {plan.model} {plan.strategy} {emotions} {compacted.level}"
+    raw_analysis, emo_map = run.step(stage, analyze) if run else analyze()
+    index_for_search([], source, raw_analysis, emo_map, f"{run.run_id} {source}" if run else None)
+    return {
+        "filename": title,
+        "transcript": transcript[:TRANSCRIPT_PREVIEW_CHARS],
+        "transcript_id": store_transcript(transcript),
+        "analysis": format_analysis_html(raw_analysis),
+        "emotional_map": emo_map,
+        "emotional_chart": timeline_svg.render_timeline_html(emo_map) if emo_map else None,
+        "error": None,
+        "file_list": file_list,
+        "plan": plan.describe(),
+        "compaction": compacted.describe() if compacted.level != "off" else None,
     }
 
-    payload = {
-        "model": MODEL,
-        "messages": [
-            {"role": "system", "content": PROFILE_PROMPT},
-            {"role": "user", "content": transcript},
-        ],
-        "stream": False,
+
+def store_transcript(transcript: str) -> str:
+    """Id under which /transcript/<id> serves the full text (None if it fits in the preview or cannot be stored)."""
+    if len(transcript) <= TRANSCRIPT_PREVIEW_CHARS:
+        return None
+    return transcript_store.save(transcript)
+
+
+def iter_concurrent_analyses(jobs: list, strategy: str = None, trailing: list = None, emotions: bool = False,
+                             compaction_level: str = None, run: checkpoints.Run = None,
+                             client: admission.Client = None, job_id: str = None):
+    """
+    Run (title, transcript, file_list) analysis jobs on the shared pool, at
+    most ANALYSIS_PER_REQUEST at a time, and yield their result dicts in
+    completion order, then any trailing results.
+    The run's checkpoints are dropped once every job has succeeded. Grok
+    calls are admitted as client's (the page is streamed after the view
+    returns, so the caller passes it in).
+    The jobs are cancellable as job_id (see /cancel/<job_id>); they are also
+    cancelled if the client disconnects mid-stream (noticed when the next
+    result is written): queued jobs are dropped and running ones abort their
+    Grok calls.
+    """
+    token = cancellation.register(job_id)
+    analyze = admission.bind(build_analysis_result, client or admission.current())
+    queued = deque(jobs)
+    futures = {}
+
+    def submit_next():
+        # Jobs submitted after a cancel stop at their first cancellation check
+        title, transcript, file_list = queued.popleft()
+        future = analysis_executor.submit(cancellation.bind(analyze, token), title, transcript, strategy, file_list, emotions,
+                                          compaction_level, run)
+        futures[future] = title
+
+    while queued and len(futures) < ANALYSIS_PER_REQUEST:
+        submit_next()
+    token.on_cancel(lambda: [future.cancel() for future in list(futures)])
+    failed = False
+    try:
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                title = futures.pop(future)
+                if queued:
+                    submit_next()
+                try:
+                    result = future.result()
+                except (cancellation.Cancelled, CancelledError):
+                    result = cancelled_result(title)
+                except Exception as e:
+                    result = {
+                        "filename": title,
+                        "transcript": None,
+                        "analysis": None,
+                        "error": str(e) if isinstance(e, admission.Busy) else f"Unexpected error: {str(e)}"
+                    }
+                failed = failed or bool(result["error"])
+                yield result
+        if run and not failed:
+            run.finish()
+        yield from trailing or []
+    except GeneratorExit:
+        token.cancel("client disconnected")
+        raise
+    finally:
+        cancellation.release(token)
+
+
+def cancelled_result(title: str) -> dict:
+    return {
+        "filename": title,
+        "transcript": None,
+        "analysis": None,
+        "error": "Analysis cancelled."
     }
 
-    resp = requests.post(XAI_URL, headers=headers, data=json.dumps(payload))
-    resp.raise_for_status()
-    data = resp.json()
-    raw_analysis = data["choices"][0]["message"]["content"]
-    
-    # Convert to formatted HTML
-    return format_analysis_html(raw_analysis)
+
+def request_client(lane: str = "standard") -> admission.Client:
+    """The admission-control identity of the current request."""
+    user = request.headers.get(ADMISSION_USER_HEADER) if ADMISSION_USER_HEADER else None
+    return admission.Client(user or request.remote_addr or "anonymous", lane)
+
+
+def cancellable_upload(view):
+    """
+    Run the view as a cancellable job named by the form's job_id (see
+    /cancel/<job_id>), with its Whisper and Grok calls admitted as the
+    requesting user's. Uploads are refused up front while the queues are full.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "POST":
+            return view(*args, **kwargs)
+        admission.shed_if_saturated("transcription", "grok")
+        with cancellation.job(request.form.get("job_id") or None), admission.acting_as(request_client()):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def index_for_search(transcripts: list, analysis_source: str = None, raw_analysis: str = None,
+                     emo_map: dict = None, analysis_key: str = None):
+    """
+    Add (filename, Transcript) pairs and the analysis and emotional map, if
+    any, to the local search and retrieval indexes. Transcripts are keyed by
+    their content and the analysis by analysis_key (default: its content), so
+    uploads that share a file name do not replace each other.
+    """
+    try:
+        for filename, text in transcripts:
+            search_index.index_transcript(text, filename)
+        if raw_analysis:
+            search_index.index_analysis(raw_analysis, analysis_source, key=analysis_key)
+        if emo_map:
+            search_index.index_emotional_map(emo_map, analysis_source, key=analysis_key)
+    except sqlite3.Error:
+        # Indexing is best-effort; never break the page because of it
+        pass
+
+    if emo_map:
+        try:
+            emotion_analytics.ingest_map(emo_map, analysis_source, key=analysis_key)
+        except (OSError, ValueError):
+            pass
+
+    global _retrieval_index
+    try:
+        if _retrieval_index is None:
+            _retrieval_index = RetrievalIndex()
+        for filename, text in transcripts:
+            _retrieval_index.add_transcript(text, filename)
+    except (OSError, ValueError):
+        pass
 
 
 @app.route("/", methods=["GET", "POST"])
+@cancellable_upload
 def index():
     results = []
     if request.method == "POST":
@@ -597,25 +839,27 @@ def index():
         # Collect all transcripts
         processed_filenames = []
         error = None
+
+        # Each stage is checkpointed under an id derived from the uploaded
+        # files, so submitting them again resumes a failed run (with other
+        # options, only the transcripts are reused)
+        audio_digests = [checkpoints.digest(f.stream) for f in audio_files]
+        run = checkpoints.Run(checkpoints.run_id(audio_digests, [checkpoints.digest(f.stream) for f in text_files]))
         
         try:
             # Step 1: Transcribe all audio files first
             audio_transcripts = []
             temp_files = []
             
-            for f in audio_files:
+            for f, audio_digest in zip(audio_files, audio_digests):
                 filename = f.filename
                 try:
-                    # Save audio file temporarily
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=get_file_extension(filename)) as tmp_file:
-                        f.save(tmp_file.name)
-                        tmp_path = tmp_file.name
-                        temp_files.append(tmp_path)
-                    
-                    # Transcribe audio using OpenAI Whisper API
-                    transcript = transcribe_audio_openai(tmp_path)
+                    transcript = run.step(f"transcript {audio_digest}", transcribe_upload, f, temp_files, audio_digest)
                     audio_transcripts.append((filename, transcript))
                     processed_filenames.append(filename)
+                except cancellation.Cancelled:
+                    error = "Analysis cancelled."
+                    break
                 except Exception as e:
                     error = f"Error transcribing {filename}: {str(e)}"
                     break
@@ -655,33 +899,58 @@ def index():
                 })
                 return render_template("index.html", results=results)
             
-            # Step 3: Combine all transcripts
-            combined_transcript_parts = []
-            
-            # Add audio transcripts
-            for filename, transcript in audio_transcripts:
-                combined_transcript_parts.append(f"[Audio: {filename}]\n{transcript}")
-            
-            # Add text transcripts
-            for filename, text in text_transcripts:
-                combined_transcript_parts.append(f"[Text: {filename}]\n{text}")
+            # Step 3: Parse each transcript once and combine them under
+            # [Audio: ...] / [Text: ...] headers
+            parsed_transcripts = [
+                (filename, Transcript.parse(text)) for filename, text in audio_transcripts + text_transcripts
+            ]
+            combined = Transcript.combine(
+                [("Audio", filename, parsed) for filename, parsed in parsed_transcripts[: len(audio_transcripts)]]
+                + [("Text", filename, parsed) for filename, parsed in parsed_transcripts[len(audio_transcripts) :]]
+            )
+            combined_transcript = combined.text
             
-            # Join with double newline separator
-            combined_transcript = "\n\n".join(combined_transcript_parts)
+            # Add errors for unsupported files if any
+            unsupported_results = [
+                {
+                    "filename": filename,
+                    "transcript": None,
+                    "analysis": None,
+                    "error": f"Unsupported file type. Please upload .txt transcript files or audio files ({', '.join(AUDIO_EXTENSIONS)})."
+                }
+                for filename in unsupported_files
+            ]
             
-            # Step 4: Send combined transcript to Grok API once
+            # Step 4: Send combined transcript to Grok API
             if combined_transcript:
-                analysis = analyze_transcript_with_grok(combined_transcript)
-                
-                # Create a single result for the combined analysis
                 file_list = ", ".join(processed_filenames)
-                results.append({
-                    "filename": f"Combined Analysis ({len(processed_filenames)} file{'s' if len(processed_filenames) != 1 else ''})",
-                    "transcript": combined_transcript,
-                    "analysis": analysis,
-                    "error": None,
-                    "file_list": file_list
-                })
+                combined_title = f"Combined Analysis ({len(processed_filenames)} file{'s' if len(processed_filenames) != 1 else ''})"
+                strategy = request.form.get("strategy") or None
+                emotions = request.form.get("emotions") == "1"
+                compaction_level = request.form.get("compaction") or None
+                index_for_search(parsed_transcripts)
+                
+                if request.form.get("mode") == "per_file" and len(parsed_transcripts) > 1:
+                    # Per-file reports plus the combined one, run concurrently and
+                    # streamed into the page as each finishes
+                    jobs = [(combined_title, combined_transcript, file_list)] + [
+                        (filename, parsed.text, None) for filename, parsed in parsed_transcripts
+                    ]
+                    return stream_template(
+                        "index.html",
+                        results=iter_concurrent_analyses(
+                            jobs, strategy, trailing=unsupported_results, emotions=emotions,
+                            compaction_level=compaction_level, run=run, client=admission.current(),
+                            job_id=request.form.get("job_id") or None,
+                        ),
+                    )
+                
+                result = build_analysis_result(
+                    combined_title, combined_transcript, strategy, file_list, emotions, compaction_level, run
+                )
+                results.append(result)
+                if not result["error"]:
+                    run.finish()
             else:
                 error = "No valid transcripts to analyze."
                 results.append({
@@ -691,16 +960,12 @@ def index():
                     "error": error
                 })
             
-            # Add errors for unsupported files if any
-            if unsupported_files:
-                for filename in unsupported_files:
-                    results.append({
-                        "filename": filename,
-                        "transcript": None,
-                        "analysis": None,
-                        "error": f"Unsupported file type. Please upload .txt transcript files or audio files ({', '.join(AUDIO_EXTENSIONS)})."
-                    })
+            results.extend(unsupported_results)
                     
+        except cancellation.Cancelled:
+            results.append(cancelled_result("Combined Analysis"))
+        except admission.Busy:
+            raise
         except Exception as e:
             error = f"Unexpected error: {str(e)}"
             results.append({
@@ -713,6 +978,216 @@ def index():
     return render_template("index.html", results=results)
 
 
+@app.errorhandler(admission.Busy)
+def busy(e):
+    """Shed load with 503 and a Retry-After the client (or the page) can act on."""
+    headers = {"Retry-After": str(e.retry_after)}
+    if request.endpoint == "index":
+        results = [{"filename": "Combined Analysis", "transcript": None, "analysis": None, "error": str(e)}]
+        return render_template("index.html", results=results), 503, headers
+    return jsonify({"error": str(e), "retry_after": e.retry_after}), 503, headers
+
+
+@app.route("/transcript/<transcript_id>", methods=["GET"])
+def transcript(transcript_id):
+    """Full text of a report's transcript, loaded when the reader expands its preview."""
+    text = transcript_store.load(transcript_id)
+    if text is None:
+        abort(404)
+    response = Response(text, mimetype="text/plain")
+    # Content-addressed: the text behind an id never changes
+    response.headers["Cache-Control"] = "private, max-age=86400, immutable"
+    return response
+
+
+@app.route("/cancel/<job_id>", methods=["POST"])
+def cancel_job(job_id):
+    """Cancel a running upload (the page's cancel button, or the page being closed mid-analysis)."""
+    return jsonify({"job_id": job_id, "cancelled": cancellation.cancel(job_id)})
+
+
+@app.route("/plan", methods=["POST"])
+def plan():
+    """Preview the token estimate, strategy and cost of an upload before it is analyzed."""
+    # Text files are uploaded as-is; audio is described by {"name", "size"} so
+    # the preview does not upload it twice
+    text_files = [f for f in request.files.getlist("files") if f.filename and is_text_file(f.filename)]
+    try:
+        audio_sizes = [
+            (item["name"], int(item["size"]))
+            for item in json.loads(request.form.get("audio_sizes") or "[]")
+            if is_audio_file(item["name"])
+        ]
+    except (ValueError, KeyError, TypeError):
+        return jsonify({"error": "audio_sizes must be a JSON list of {name, size} objects"}), 400
+
+    try:
+        file_tokens = estimate_upload_tokens(text_files, audio_sizes, request.form.get("compaction") or None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    strategy = request.form.get("strategy") or None
+    if request.form.get("emotions") == "1":
+        task, system_prompt = "fused", emotional_mapping.make_fused_prompt(PROFILE_PROMPT)
+    else:
+        task, system_prompt = "analysis", PROFILE_PROMPT
+    try:
+        preview = model_routing.preview_for_task(task, system_prompt, sum(file_tokens), strategy=strategy)
+        if request.form.get("mode") == "per_file" and len(file_tokens) > 1:
+            per_file = [model_routing.preview_for_task(task, system_prompt, t, strategy=strategy) for t in file_tokens]
+            preview["calls"] += sum(p["calls"] for p in per_file)
+            preview["sent_tokens"] += sum(p["sent_tokens"] for p in per_file)
+            preview["estimated_cost"] = round(preview["estimated_cost"] + sum(p["estimated_cost"] for p in per_file), 4)
+            preview["fits"] = preview["fits"] and all(p["fits"] for p in per_file)
+            preview["description"] += (
+                f" + {len(per_file)} per-file reports in parallel; {preview['calls']} calls in total,"
+                f" est. ${preview['estimated_cost']:.2f}"
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    preview["exact"] = not audio_sizes
+    if audio_sizes:
+        preview["description"] += " (audio length estimated from file size)"
+    return jsonify(preview)
+
+
+@app.route("/search", methods=["GET"])
+def search():
+    """Query the local transcript/analysis index and return JSON results."""
+    try:
+        results = search_index.search(
+            query=request.args.get("q") or None,
+            speaker=request.args.get("speaker") or None,
+            emotion=request.args.get("emotion") or None,
+            source_file=request.args.get("file") or None,
+            kind=request.args.get("kind") or None,
+            since=request.args.get("since") or None,
+            until=request.args.get("until") or None,
+            limit=request.args.get("limit", default=20, type=int),
+            highlight=("<mark>", "</mark>"),
+        )
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Invalid search query: {e}"}), 400
+    return jsonify({"results": results})
+
+
+@app.route("/analytics/<report>", methods=["GET"])
+def analytics(report):
+    """Aggregates over every ingested emotional map (see emotion_analytics.REPORTS)."""
+    try:
+        result = emotion_analytics.report(
+            report,
+            freq=request.args.get("freq", default="M"),
+            top=request.args.get("top", default=10, type=int),
+            speaker=request.args.get("speaker") or None,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+@app.route("/live", methods=["GET"])
+def live():
+    """Page that streams microphone audio to /live/ws and shows the rolling transcript."""
+    return render_template("live.html", available=Sock is not None)
+
+
+def live_socket(ws):
+    """
+    Live ingestion: binary messages are 16 kHz mono int16 PCM frames, a text
+    message {"type": "stop"} ends the session. Transcript and emotion events
+    are sent back as JSON text messages; a malformed text message gets an
+    error message back and the session carries on.
+    """
+    try:
+        # Live emotion estimates are admitted ahead of uploads and batch work
+        with admission.acting_as(request_client("interactive")):
+            session = live_session.LiveSession()
+    except (ImportError, ValueError) as e:
+        ws.send(json.dumps({"type": "error", "error": str(e)}))
+        return
+
+    try:
+        while True:
+            message = ws.receive(timeout=0.2)
+            if isinstance(message, (bytes, bytearray)):
+                session.add_audio(message)
+            elif message:
+                try:
+                    control = json.loads(message)
+                    if not isinstance(control, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    ws.send(json.dumps({"type": "error", "error": f"Malformed message: {e}"}))
+                    control = {}
+                if control.get("type") == "stop":
+                    break
+            for event in session.drain_events():
+                ws.send(json.dumps(event))
+    except ConnectionClosed:
+        pass
+
+    transcript = session.close()
+    if len(transcript):
+        index_for_search([(f"Live session {datetime.now():%Y-%m-%d %H:%M}", transcript)])
+    try:
+        for event in session.drain_events():
+            ws.send(json.dumps(event))
+    except ConnectionClosed:
+        pass
+
+
+if Sock is not None:
+    Sock(app).route("/live/ws")(live_socket)
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness check for the process manager or load balancer (no upstream calls)."""
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - STARTED_AT, 1),
+        "jobs_running": cancellation.stats()["running"],
+    })
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Request counters for tuning (hedging, time-to-first-byte, model routing, transcription breaker, cancellation, admission, shared caches)."""
+    return jsonify({
+        "grok_hedging": grok_client.hedge_stats(),
+        "model_routing": model_routing.routing_stats(),
+        "transcription": transcription.router_stats(),
+        "cancellation": cancellation.stats(),
+        "admission": admission.stats(),
+        "shared_state": shared_state.stats(),
+    })
+
+
+@app.route("/debug/memory", methods=["GET"])
+def debug_memory():
+    """RSS, garbage collector and tracemalloc totals, and per-endpoint request growth (DIAGNOSTICS=1 only)."""
+    if not DIAGNOSTICS:
+        abort(404)
+    return jsonify(memory_diagnostics.summary())
+
+
+@app.route("/debug/memory/snapshot", methods=["POST"])
+def debug_memory_snapshot():
+    """Start tracing if needed and take the baseline for /debug/memory/diff; returns the top allocation sites."""
+    if not DIAGNOSTICS:
+        abort(404)
+    return jsonify({"pid": os.getpid(), "sites": memory_diagnostics.snapshot()})
+
+
+@app.route("/debug/memory/diff", methods=["GET"])
+def debug_memory_diff():
+    """Allocation sites that grew since the last snapshot (or diff) in this worker."""
+    if not DIAGNOSTICS:
+        abort(404)
+    return jsonify({"pid": os.getpid(), "sites": memory_diagnostics.diff()})
+
+
 if __name__ == "__main__":
     # Run the web server
     # Using port 5001 because port 5000 is often taken by macOS AirPlay Receiver
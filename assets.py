@@ -0,0 +1,179 @@
+"""
+Static asset fingerprinting and response compression.
+
+asset_url("css/index.css") (a template global) returns the static URL with
+a content hash (?v=<hash>). Requests carrying the current hash are served
+with a one-year immutable Cache-Control, so browsers fetch the stylesheet
+and script once per deploy instead of with every page; editing a file
+changes its hash and therefore its URL.
+
+Text responses (HTML, JSON, CSS, JS, SVG) are compressed with brotli when
+the client accepts it and the brotli package is installed, otherwise gzip.
+Streamed pages are compressed chunk by chunk with a flush after each one,
+so results still appear as they finish. Compressed static files are cached
+in memory per file version.
+"""
+
+import os
+import gzip
+import zlib
+import hashlib
+import threading
+
+from flask import request, url_for
+
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip only; pip install brotli for smaller responses
+
+COMPRESSION = config.get_bool("COMPRESSION", True)
+MIN_COMPRESS_BYTES = 1024  # smaller bodies are not worth the header overhead
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic responses; static files use the maximum
+STATIC_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "image/svg+xml",
+)
+
+_lock = threading.Lock()
+_fingerprints = {}  # static path -> (mtime, hash)
+_static_cache = {}  # (static path, mtime, encoding) -> compressed bytes
+
+
+def fingerprint(static_folder: str, filename: str) -> str:
+    """Short content hash of a static file, or "" if it does not exist."""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return ""
+    with _lock:
+        cached = _fingerprints.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    digest = hasher.hexdigest()[:12]
+    with _lock:
+        _fingerprints[path] = (mtime, digest)
+    return digest
+
+
+def _choose_encoding() -> str:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return ""
+
+
+def _compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+
+
+def _compress_stream(chunks, encoding: str):
+    """Compress a streamed body, flushing after every chunk so the page renders progressively."""
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY) if encoding == "br" else zlib.compressobj(GZIP_LEVEL, wbits=31)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if encoding == "br":
+                data = compressor.process(chunk) + compressor.flush()
+            else:
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.finish() if encoding == "br" else compressor.flush()
+    finally:
+        # Closing the page's generator is how a client disconnect reaches it
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+
+
+def _is_compressible(response) -> bool:
+    mimetype = response.mimetype or ""
+    return (
+        response.status_code == 200
+        and "Content-Encoding" not in response.headers
+        and mimetype.startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+def _static_response(app, response):
+    filename = (request.view_args or {}).get("filename", "")
+    version = request.args.get("v")
+    if version and version == fingerprint(app.static_folder, filename):
+        response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+    if not COMPRESSION or not _is_compressible(response):
+        return response
+    encoding = _choose_encoding()
+    if not encoding:
+        return response
+    path = os.path.join(app.static_folder, filename)
+    try:
+        key = (path, os.path.getmtime(path), encoding)
+    except OSError:
+        return response
+    with _lock:
+        body = _static_cache.get(key)
+    response.direct_passthrough = False
+    if body is None:
+        body = _compress(response.get_data(), encoding, static=True)
+        with _lock:
+            _static_cache[key] = body
+    else:
+        response.response.close()  # the unread file
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def compress_response(response):
+    if not COMPRESSION or not _is_compressible(response) or response.direct_passthrough:
+        return response
+    encoding = _choose_encoding()
+    if not encoding:
+        return response
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_BYTES:
+            return response
+        response.set_data(_compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app):
+    """Register asset_url() for templates and the caching/compression hook."""
+
+    def asset_url(filename: str) -> str:
+        version = fingerprint(app.static_folder, filename)
+        return url_for("static", filename=filename, v=version) if version else url_for("static", filename=filename)
+
+    @app.after_request
+    def _finish_response(response):
+        if request.headers.get("Upgrade"):
+            return response  # WebSocket handshake (live mode)
+        if request.endpoint == "static":
+            return _static_response(app, response)
+        return compress_response(response)
+
+    app.jinja_env.globals["asset_url"] = asset_url
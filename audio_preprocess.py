@@ -0,0 +1,233 @@
+"""
+Audio preprocessing ahead of transcription.
+
+Uploads are probed cheaply (container header only), then decoded to 16 kHz
+mono PCM with any video track dropped. An energy-based voice-activity
+detector removes long silences, and the result is re-encoded compactly
+(Opus in Ogg by default). An offset map records where each kept span came
+from, so timestamps from the transcriber can be mapped back onto the
+original recording.
+
+Requires the ffmpeg binary on PATH (or FFMPEG_BINARY in .env). Without it,
+files are passed through unchanged.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import subprocess
+from bisect import bisect_right
+
+import numpy as np
+
+import config
+
+FFMPEG_BINARY = config.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+FFMPEG_AVAILABLE = bool(FFMPEG_BINARY)
+
+AUDIO_PREPROCESSING = config.get_bool("AUDIO_PREPROCESSING", True)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+VAD_MARGIN_DB = 12.0  # speech must be this far above the noise floor...
+VAD_MIN_DB = -55.0  # ...and above this absolute level (dBFS)
+SPEECH_PAD_SEC = 0.25  # audio kept either side of detected speech
+MIN_SILENCE_SEC = float(config.get("MIN_SILENCE_SEC", "1.0"))  # shorter pauses are kept
+MIN_PREPROCESS_SEC = 20.0  # short clips without video are sent as-is
+
+OUTPUT_CODEC_ARGS = ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]
+OUTPUT_SUFFIX = ".ogg"
+
+_DURATION_PATTERN = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_STREAM_PATTERN = re.compile(r"Stream #\d+:\d+.*?: (Video|Audio):")
+
+
+class PreprocessedAudio:
+    """A (possibly) preprocessed audio file plus the map back to original time."""
+
+    def __init__(self, path: str, original_path: str, offset_map: list = None,
+                 original_duration: float = None, temporary: bool = False):
+        self.path = path
+        self.original_path = original_path
+        # (processed_start, original_start, length) spans, in seconds
+        self.offset_map = offset_map or []
+        self.original_duration = original_duration
+        self.temporary = temporary
+        self._starts = [span[0] for span in self.offset_map]
+
+    @property
+    def changed(self) -> bool:
+        return self.path != self.original_path
+
+    @property
+    def processed_duration(self) -> float:
+        if not self.offset_map:
+            return self.original_duration
+        start, _, length = self.offset_map[-1]
+        return start + length
+
+    def to_original(self, t: float) -> float:
+        """Map a time in the processed audio to the original recording."""
+        if not self.offset_map:
+            return t
+        i = max(bisect_right(self._starts, t) - 1, 0)
+        processed_start, original_start, length = self.offset_map[i]
+        return original_start + min(max(t - processed_start, 0.0), length)
+
+    def remap_segments(self, segments: list) -> list:
+        """Rewrite Whisper segment start/end times onto the original timeline."""
+        return [
+            dict(segment, start=self.to_original(segment["start"]), end=self.to_original(segment["end"]))
+            for segment in segments
+        ]
+
+    def stats(self) -> dict:
+        original_bytes = os.path.getsize(self.original_path)
+        processed_bytes = os.path.getsize(self.path)
+        return {
+            "original_bytes": original_bytes,
+            "processed_bytes": processed_bytes,
+            "original_seconds": self.original_duration,
+            "processed_seconds": self.processed_duration,
+        }
+
+    def cleanup(self):
+        if self.temporary and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+def probe(path: str) -> dict:
+    """Read duration and stream types from the container header via `ffmpeg -i`."""
+    result = subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-i", path],
+        capture_output=True, text=True, errors="ignore",
+    )
+    # ffmpeg exits non-zero without an output file; the header is on stderr
+    info = result.stderr
+    duration = None
+    match = _DURATION_PATTERN.search(info)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    streams = _STREAM_PATTERN.findall(info)
+    return {
+        "duration": duration,
+        "has_video": "Video" in streams,
+        "has_audio": "Audio" in streams,
+    }
+
+
+def decode_pcm(path: str) -> np.ndarray:
+    """Decode any audio/video file to 16 kHz mono int16 samples, dropping video."""
+    result = subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", path,
+         "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+        capture_output=True, check=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def detect_speech(samples: np.ndarray) -> list:
+    """
+    Energy-based VAD. Returns (start_sample, end_sample) spans to keep:
+    everything except silences longer than MIN_SILENCE_SEC.
+    """
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0, len(samples))]
+
+    frames = samples[: n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1)) + 1e-9
+    level_db = 20.0 * np.log10(rms / 32768.0)
+    noise_floor = np.percentile(level_db, 10)
+    speech = level_db > max(noise_floor + VAD_MARGIN_DB, VAD_MIN_DB)
+    if not speech.any():
+        return [(0, len(samples))]
+
+    # Pad speech on both sides so words are not clipped
+    pad = int(SPEECH_PAD_SEC * 1000 / FRAME_MS)
+    speech = np.convolve(speech, np.ones(2 * pad + 1), mode="same") > 0
+
+    # Only silences longer than MIN_SILENCE_SEC are removed
+    keep = speech.copy()
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], speech.astype(np.int8), [1]))))
+    min_frames = int(MIN_SILENCE_SEC * 1000 / FRAME_MS)
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < min_frames:
+            keep[start:end] = True
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], keep.astype(np.int8), [0]))))
+    spans = [(int(start) * frame, int(end) * frame) for start, end in zip(edges[::2], edges[1::2])]
+    # The trailing partial frame follows the last frame's decision
+    if keep[-1]:
+        spans[-1] = (spans[-1][0], len(samples))
+    return spans
+
+
+def encode(samples: np.ndarray, output_path: str):
+    """Encode 16 kHz mono int16 samples compactly."""
+    subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y",
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-i", "-",
+         *OUTPUT_CODEC_ARGS, output_path],
+        input=samples.tobytes(), check=True,
+    )
+
+
+def preprocess(path: str) -> PreprocessedAudio:
+    """
+    Prepare an upload for transcription. Returns a PreprocessedAudio whose
+    path is either a new temporary file (call cleanup() when done) or the
+    original file when preprocessing is disabled, unavailable or not worth it.
+    """
+    if not (AUDIO_PREPROCESSING and FFMPEG_AVAILABLE):
+        return PreprocessedAudio(path, path)
+
+    info = probe(path)
+    if not info["has_audio"]:
+        return PreprocessedAudio(path, path, original_duration=info["duration"])
+    if not info["has_video"] and info["duration"] is not None and info["duration"] < MIN_PREPROCESS_SEC:
+        return PreprocessedAudio(path, path, original_duration=info["duration"])
+
+    try:
+        samples = decode_pcm(path)
+        spans = detect_speech(samples)
+    except (subprocess.CalledProcessError, OSError):
+        # Probed as audio but not decodable (truncated upload, unusual codec):
+        # let the transcription backend try the original
+        return PreprocessedAudio(path, path, original_duration=info["duration"])
+    if not len(samples):
+        return PreprocessedAudio(path, path, original_duration=info["duration"])
+
+    offset_map, processed = [], 0
+    for start, end in spans:
+        offset_map.append((processed / SAMPLE_RATE, start / SAMPLE_RATE, (end - start) / SAMPLE_RATE))
+        processed += end - start
+    kept = np.concatenate([samples[start:end] for start, end in spans]) if spans else samples
+
+    fd, output_path = tempfile.mkstemp(suffix=OUTPUT_SUFFIX)
+    os.close(fd)
+    try:
+        encode(kept, output_path)
+    except (subprocess.CalledProcessError, OSError):
+        os.unlink(output_path)
+        return PreprocessedAudio(path, path, original_duration=info["duration"])
+
+    # Keep the original if re-encoding somehow made it bigger
+    if os.path.getsize(output_path) >= os.path.getsize(path) and not info["has_video"]:
+        os.unlink(output_path)
+        return PreprocessedAudio(path, path, original_duration=info["duration"])
+
+    return PreprocessedAudio(
+        output_path, path, offset_map,
+        original_duration=info["duration"] or len(samples) / SAMPLE_RATE,
+        temporary=True,
+    )
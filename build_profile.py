@@ -1,18 +1,18 @@
-import os
 import sys
-import json
 import argparse
-import requests
-from dotenv import load_dotenv
+import sqlite3
 
-load_dotenv()
-XAI_API_KEY = os.getenv("XAI_API_KEY")
-
-if not XAI_API_KEY:
-    raise RuntimeError("XAI_API_KEY not found in environment. Check your .env file.")
-
-XAI_URL = "https://api.x.ai/v1/chat/completions"
-MODEL = "grok-4-0709"  # or your preferred Grok model
+import dedup
+import admission
+import checkpoints
+import compaction
+import json_schema
+import json_stream
+import model_routing
+import search_index
+import prompt_budget
+from retrieval import RetrievalIndex
+from transcript_model import load_transcript
 
 PROFILE_PROMPT = """
 You are building a deep, non-clinical behavioral profile for a single person
@@ -68,39 +68,146 @@ not on hidden truth, diagnosis, or lie detection.
 """.strip()
 
 
-def call_grok(transcript_block: str, context: str = "") -> dict:
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {XAI_API_KEY}",
-    }
-
-    user_content = transcript_block
+def build_user_content(transcript_block: str, context: str = "") -> str:
     if context:
-        user_content = f"Context: {context}\n\nTRANSCRIPTS:\n{transcript_block}"
-
-    payload = {
-        "model": MODEL,
-        "messages": [
-            {"role": "system", "content": PROFILE_PROMPT},
-            {"role": "user", "content": user_content},
-        ],
-        "stream": False,
-    }
-
-    resp = requests.post(XAI_URL, headers=headers, data=json.dumps(payload))
-    resp.raise_for_status()
-    data = resp.json()
-    raw_content = data["choices"][0]["message"]["content"]
+        return f"Context: {context}\n\nTRANSCRIPTS:\n{transcript_block}"
+    return transcript_block
+
+
+def plan_profile(transcript_block: str, context: str = "", strategy: str = "summarize") -> prompt_budget.PromptPlan:
+    """Estimate the profile prompt size locally and choose how to fit it in the token budget."""
+    return model_routing.plan_for_task(
+        "profile", PROFILE_PROMPT, build_user_content(transcript_block, context), strategy=strategy
+    )
+
+
+PROFILE_KEYS = (
+    "core_narratives",
+    "patterns_under_stress",
+    "emotional_pattern",
+    "shadow_material",
+    "growth_edges",
+    "decision_style",
+    "communication_style",
+    "values_and_motivations",
+    "framework_lenses",
+    "reflection_prompts",
+)
+
+PROFILE_VALUE_DESCRIPTION = (
+    "the value of one profile key: a string, a list of strings, or an object whose "
+    "fields are strings or lists of strings."
+)
+
+_TEXT_SCHEMA = {"anyOf": [{"type": "string"}, {"type": "array", "items": {"type": "string"}}]}
+PROFILE_VALUE_SCHEMA = {"anyOf": _TEXT_SCHEMA["anyOf"] + [{"type": "object", "additionalProperties": _TEXT_SCHEMA}]}
+
+
+def profile_schema(keys=PROFILE_KEYS) -> dict:
+    """Schema of a profile object with (only) the given keys."""
+    return {"title": "profile", **json_schema.object_schema({key: PROFILE_VALUE_SCHEMA for key in keys})}
+
+
+PROFILE_SCHEMA = profile_schema()
+
+
+def validate_profile_value(value, key: str = ""):
+    json_schema.validate(value, PROFILE_VALUE_SCHEMA, key)
+
+
+def check_profile_reply(reply: str):
+    """Raise ValueError if a profile reply has none of the profile keys (no API call is made)."""
+    parser = json_stream.StreamingJSONParser()
+    parser.feed(reply)
+    parser.close()
+    if len(parser.missing(PROFILE_KEYS)) == len(PROFILE_KEYS):
+        raise ValueError("Model did not return a profile.")
+
+
+def request_missing_keys(system_prompt: str, user_content: str, keys: list, model: str) -> dict:
+    """Re-request only the profile keys that were missing or unusable."""
+    messages = [
+        {
+            "role": "system",
+            "content": f"{system_prompt}\n\nReturn ONLY a JSON object with these keys: {', '.join(keys)}.",
+        },
+        {"role": "user", "content": user_content},
+    ]
+    schema = profile_schema(keys)
+
+    def check(reply: str) -> dict:
+        values = json_stream.parse_fragment(reply)
+        json_schema.validate(values, schema)
+        return {key: values[key] for key in keys}
+
+    return check(model_routing.complete("profile", messages, model=model, validate=check, schema=schema))
+
+
+def stream_profile(system_prompt: str, user_content: str, model: str, on_progress=None) -> dict:
+    """
+    Stream the profile reply (constrained to PROFILE_SCHEMA where the model
+    supports it), validating and reporting to on_progress each top-level key
+    as it closes. Malformed values are repaired on their own, given the error
+    found; keys that are missing or cut off are re-requested together.
+    """
+    parser = json_stream.StreamingJSONParser()
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+    pieces = model_routing.stream("profile", messages, model=model, schema=PROFILE_SCHEMA,
+                                  validate=check_profile_reply)
+    for piece in pieces:
+        events = parser.feed(piece)
+        for path, value in events:
+            try:
+                validate_profile_value(value, path[0])
+            except ValueError as e:
+                parser.reject(path, str(e))
+        if events and on_progress:
+            on_progress(parser.result)
+    parser.close()
+
+    profile = parser.result
+    for (key, *_), raw, error in parser.errors:
+        if error == "truncated":
+            continue
+        try:
+            profile[key] = json_stream.repair_fragment(raw, PROFILE_VALUE_DESCRIPTION, validate_profile_value, error)
+        except ValueError:
+            pass
+
+    missing = parser.missing(PROFILE_KEYS)
+    if len(missing) == len(PROFILE_KEYS):
+        raise ValueError("Model did not return a profile.")
+    if missing:
+        profile.update(request_missing_keys(system_prompt, user_content, missing, model))
+    return profile
 
-    try:
-        return json.loads(raw_content)
-    except json.JSONDecodeError:
-        # If the model wraps JSON in markdown or adds text, try to salvage
-        start = raw_content.find("{")
-        end = raw_content.rfind("}")
-        if start != -1 and end != -1:
-            return json.loads(raw_content[start : end + 1])
-        raise
+
+def call_grok(transcript_block: str, context: str = "", plan: prompt_budget.PromptPlan = None,
+              on_progress=None, run: checkpoints.Run = None) -> dict:
+    """
+    Build the profile. on_progress, if given, is called with the profile so far
+    as keys arrive; with a run, every call (chunk summaries, the profile) is checkpointed.
+    """
+    # A profile is one JSON object, so over-budget input is condensed rather than chunked
+    plan = plan or plan_profile(transcript_block, context)
+
+    def send(system_prompt: str, content: str):
+        if system_prompt == prompt_budget.SUMMARY_PROMPT:
+            return model_routing.complete("summary", [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content},
+            ])
+        try:
+            return stream_profile(system_prompt, content, plan.model, on_progress)
+        except ValueError:
+            if plan.model == model_routing.LARGE_MODEL:
+                raise
+            return stream_profile(system_prompt, content, model_routing.LARGE_MODEL, on_progress)
+
+    return prompt_budget.run_plan(plan, run.sender(send) if run else send)
 
 
 def main():
@@ -124,24 +231,103 @@ def main():
         default="profile.json",
         help="Output JSON profile file.",
     )
+    parser.add_argument(
+        "--strategy",
+        type=str,
+        default="summarize",
+        choices=["summarize", "truncate", "fail"],
+        help="What to do if the transcripts exceed the model's token budget.",
+    )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help="Rewrite the output file as profile sections arrive (marked \"_partial\" until done).",
+    )
+    parser.add_argument(
+        "--compact",
+        type=str,
+        default=compaction.COMPACTION_LEVEL,
+        choices=compaction.LEVELS,
+        help="Compact transcripts before sending (boilerplate, timestamps, filler, repeated phrases).",
+    )
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="Send every transcript, even near-duplicate copies of the same conversation.",
+    )
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        default=None,
+        help="Checkpoint under this id (default: derived from the transcripts and options).",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard checkpoints of an earlier failed run with the same inputs and start over.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only show the token estimate and plan; do not call the API.",
+    )
 
     args = parser.parse_args()
 
-    # Concatenate all transcripts
+    transcripts = [(path, load_transcript(path)) for path in args.transcripts]
+
+    # The same call exported from several tools would be counted several times
+    profile_transcripts = transcripts
+    if not args.keep_duplicates:
+        profile_transcripts, dropped = dedup.deduplicate(transcripts)
+        for path, kept_path, score in dropped:
+            print(f"Skipping {path}: near-duplicate of {kept_path} ({score:.0%} overlap)")
+
+    # Concatenate the remaining transcripts
     combined = []
-    for path in args.transcripts:
-        with open(path, "r", encoding="utf-8") as f:
-            combined.append(f"\n=== FILE: {path} ===\n")
-            combined.append(f.read())
+    for path, transcript in profile_transcripts:
+        compacted = compaction.compact(transcript, args.compact)
+        if args.compact != "off":
+            print(f"{path}: {compacted.describe()}")
+        combined.append(f"\n=== FILE: {path} ===\n")
+        combined.append(compacted.text)
     transcript_block = "\n".join(combined)
 
-    profile = call_grok(transcript_block, context=args.context)
+    plan = plan_profile(transcript_block, context=args.context, strategy=args.strategy)
+    print(f"Prompt plan: {plan.describe()}")
+    if args.dry_run:
+        return
+    if not plan.fits:
+        print("Error: transcripts exceed the token budget. Use --strategy summarize or truncate.", file=sys.stderr)
+        sys.exit(1)
+
+    # A failed or interrupted run with the same inputs resumes from its last completed call
+    run = checkpoints.Run(args.run_id or checkpoints.run_id(transcript_block, args.context, plan.model, plan.strategy))
+    if args.restart:
+        run.finish()
+    on_progress = (lambda partial: json_stream.write_progress(args.output, partial)) if args.progressive else None
+    profile = call_grok(transcript_block, context=args.context, plan=plan, on_progress=on_progress, run=run)
 
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(profile, f, indent=2, ensure_ascii=False)
+    json_stream.write_progress(args.output, profile, complete=True)
+    if run.resumed:
+        print(f"Resumed {run.describe()}")
+    run.finish()
 
     print(f"Saved HumanIntuition profile to {args.output}")
 
+    try:
+        for path, transcript in transcripts:
+            search_index.index_transcript(transcript, path)
+        search_index.index_profile(profile, args.output, key=run.run_id)
+    except sqlite3.Error as e:
+        print(f"Warning: could not update search index: {e}")
+
+    # The superagent retrieves excerpts from these transcripts at chat time
+    retrieval_index = RetrievalIndex()
+    for path, transcript in profile_transcripts:
+        retrieval_index.add_transcript(transcript, path)
+
 
 if __name__ == "__main__":
-    main()
+    with admission.acting_as(admission.Client(lane="batch")):
+        main()
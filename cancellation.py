@@ -0,0 +1,222 @@
+"""
+Cooperative cancellation of upload pipelines.
+
+Each web job gets a CancelToken, registered under a client-chosen job id so
+the page can cancel it (POST /cancel/<job_id>, sent by the cancel button or
+when the tab is closed). The token is made current in a context variable,
+so deep layers (grok_client, transcription) pick it up without threading it
+through every signature:
+
+    with cancellation.job(job_id) as token:
+        ...                          # token is current here
+        cancellation.check()         # raises Cancelled once the job is cancelled
+        executor.submit(cancellation.bind(fn), ...)  # carry the token into worker threads
+
+With several worker processes or nodes (see wsgi.py) the cancel request
+may reach a different process than the job: every job with an id is
+listed in the shared state while it runs (see shared_state), and cancel()
+leaves a marker for a listed job, which its token notices on its next
+check. Cancelling an id no process is running does nothing.
+
+Generators that outlive the request context (streamed pages) use
+register()/release() and bind(fn, token) instead of job().
+
+Blocking calls that cannot be interrupted (an HTTP request waiting for its
+first byte, a local Whisper run) are waited on with wait(), which returns
+control to the caller as soon as the token is cancelled; the abandoned call
+finishes in the background and its result is dropped. Until it does, it
+keeps its thread of the blocking pool and (through Cancelled.abandoned, see
+admission) its admission slot, so a cancelled transcription still counts
+against the model it occupies. The pool has at least as many threads as
+there are transcription slots, so admitted calls never queue for one.
+"""
+
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures, FIRST_COMPLETED
+
+import config
+import shared_state
+
+POLL_SEC = float(config.get("CANCEL_POLL_SEC", "0.25"))  # how often blocked callers look at their token
+# Threads for blocking calls of cancellable jobs; never fewer than the
+# transcription slots (see admission), which are held until the call returns
+MAX_BLOCKING_WORKERS = max(
+    int(config.get("CANCEL_BLOCKING_WORKERS", "16")), int(config.get("ADMISSION_TRANSCRIPTION_SLOTS", "4"))
+)
+MARKER_TTL_SEC = 3600  # markers for jobs no process claimed expire after this
+RUNNING_TTL_SEC = 86400  # a job's shared listing outlives any real job, even if its process dies
+
+_current = contextvars.ContextVar("cancel_token", default=None)
+_jobs_lock = threading.Lock()
+_jobs = {}  # job id -> CancelToken
+_counters = {"jobs": 0, "cancelled": 0}
+_blocking_executor = ThreadPoolExecutor(max_workers=MAX_BLOCKING_WORKERS, thread_name_prefix="cancellable")
+
+
+class Cancelled(Exception):
+    """
+    The job this work belongs to was cancelled. abandoned is the future of a
+    blocking call given up on by run(), which is still running, if any.
+    """
+
+    abandoned = None
+
+
+class CancelToken:
+    def __init__(self, job_id: str = None):
+        self.job_id = job_id
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._marker_checked_at = 0.0
+        self.reason = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback):
+        """Run callback (once) when the token is cancelled, or now if it already is."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if not self._event.is_set() and self.job_id:
+            now = time.monotonic()
+            if now - self._marker_checked_at >= POLL_SEC:
+                self._marker_checked_at = now
+                reason = shared_state.get("cancel", self.job_id)
+                if reason is not None:
+                    self.cancel(reason)
+        if self._event.is_set():
+            raise Cancelled(f"Job {self.job_id}: {self.reason}" if self.job_id else f"Job {self.reason}")
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._event.wait(timeout)
+
+
+def current() -> CancelToken:
+    """The token of the job running in this context, or None."""
+    return _current.get()
+
+
+def check():
+    """Raise Cancelled if the current job was cancelled."""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+def bind(fn, token: CancelToken = None):
+    """fn wrapped to run in a copy of the current context (for executor threads), with token current if given."""
+    context = contextvars.copy_context()
+    if token is not None:
+        context.run(_current.set, token)
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def wait(futures, timeout: float = None, return_when=FIRST_COMPLETED) -> tuple:
+    """concurrent.futures.wait that raises Cancelled as soon as the current job is cancelled."""
+    token = _current.get()
+    if token is None:
+        return wait_futures(futures, timeout=timeout, return_when=return_when)
+    step = POLL_SEC if timeout is None else min(POLL_SEC, timeout)
+    done, pending = wait_futures(futures, timeout=step, return_when=return_when)
+    waited = step
+    while not done and (timeout is None or waited < timeout):
+        token.check()
+        done, pending = wait_futures(pending, timeout=step, return_when=return_when)
+        waited += step
+    token.check()
+    return done, pending
+
+
+def run(fn, *args, **kwargs):
+    """Call a blocking fn in a helper thread; give up (raise Cancelled) if the job is cancelled meanwhile."""
+    if _current.get() is None:
+        return fn(*args, **kwargs)
+    check()
+    future = _blocking_executor.submit(bind(fn), *args, **kwargs)
+    try:
+        wait([future])
+    except Cancelled as e:
+        e.abandoned = future
+        raise
+    return future.result()
+
+
+def register(job_id: str = None) -> CancelToken:
+    """A new token, cancellable through cancel(job_id) until released."""
+    token = CancelToken(job_id)
+    with _jobs_lock:
+        if job_id:
+            _jobs[job_id] = token
+        _counters["jobs"] += 1
+    if job_id:
+        shared_state.put("running", job_id, "1", ttl=RUNNING_TTL_SEC)
+    return token
+
+
+def release(token: CancelToken):
+    with _jobs_lock:
+        released = bool(token.job_id) and _jobs.get(token.job_id) is token
+        if released:
+            del _jobs[token.job_id]
+    if released:
+        shared_state.delete("running", token.job_id)
+    if token.job_id and token.cancelled:
+        shared_state.delete("cancel", token.job_id)
+
+
+@contextmanager
+def job(job_id: str = None):
+    """Register a token under job_id (if given) and make it current for the block."""
+    token = register(job_id)
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+        release(token)
+
+
+def cancel(job_id: str, reason: str = "cancelled") -> bool:
+    """
+    Cancel a job. Returns True if it runs in this process; otherwise, if
+    another worker process or node runs it, a marker is left for that one,
+    and False is returned.
+    """
+    with _jobs_lock:
+        token = _jobs.get(job_id)
+        if token is not None and not token.cancelled:
+            _counters["cancelled"] += 1
+    if token is None:
+        if shared_state.get("running", job_id) is not None:
+            shared_state.put("cancel", job_id, reason, ttl=MARKER_TTL_SEC)
+        return False
+    token.cancel(reason)
+    return True
+
+
+def stats() -> dict:
+    with _jobs_lock:
+        return dict(_counters, running=len(_jobs))
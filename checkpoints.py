@@ -0,0 +1,237 @@
+"""
+Checkpointed, resumable analysis runs.
+
+A multi-file analysis has expensive stages (transcribing each audio file,
+every Grok call of a prompt plan, the final report). Each stage's output is
+stored as a JSON file under CHECKPOINT_DIR/<run id>/ as soon as it is
+produced, so when a run fails or is interrupted, running it again skips
+every stage that already finished and retries only the failed one.
+
+The run id is derived from the inputs (file contents and the options that
+change the result), so retrying the same upload or command resumes
+automatically; an explicit id can be passed instead. A run's checkpoints
+are deleted when it completes, and abandoned runs older than
+CHECKPOINT_TTL_DAYS are pruned.
+
+Identical uploads may run at the same time, in any worker process, and
+then share one run: each stage is computed under a lock on its checkpoint,
+so the second run waits for the first's result and reuses it, and the
+checkpoints are only deleted by the last of them to finish.
+
+    run = checkpoints.Run(checkpoints.run_id(options, *file_digests))
+    text = run.step(f"transcript {digest}", transcribe, path)
+    send = run.sender(send)       # checkpoint every call of prompt_budget.run_plan
+    ...
+    run.finish()
+
+Usage:
+    python3 checkpoints.py            # list unfinished runs
+    python3 checkpoints.py --prune    # delete expired runs
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+
+import config
+import file_lock
+
+CHECKPOINT_DIR = config.get("CHECKPOINT_DIR", "checkpoints")
+CHECKPOINTS = config.get_bool("CHECKPOINTS", True)
+CHECKPOINT_TTL_DAYS = float(config.get("CHECKPOINT_TTL_DAYS", "7"))
+
+_MISSING = object()
+
+
+def digest(data) -> str:
+    """Hex SHA-256 of bytes, a string, or a binary file object (read in blocks, then rewound)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if isinstance(data, (bytes, bytearray)):
+        return hashlib.sha256(data).hexdigest()
+    position = data.tell()
+    hasher = hashlib.sha256()
+    for block in iter(lambda: data.read(1 << 20), b""):
+        hasher.update(block)
+    data.seek(position)
+    return hasher.hexdigest()
+
+
+def run_id(*parts) -> str:
+    """A stable run id for the given inputs (strings, numbers, lists of them)."""
+    return digest(json.dumps(parts, sort_keys=True, default=str))[:24]
+
+
+def _lock_file(root: str, run_id: str) -> str:
+    # Beside the run's directory, so finish() can delete the directory while holding it
+    return os.path.join(root, f".{run_id}.lock")
+
+
+def _stage_file(stage: str) -> str:
+    # Stage names are free text; the file name only has to be stable and safe
+    return hashlib.sha1(stage.encode("utf-8")).hexdigest() + ".json"
+
+
+class Run:
+    """The checkpoint store of one run. Thread-safe: stages may complete concurrently."""
+
+    def __init__(self, run_id: str, root: str = None, enabled: bool = None):
+        self.run_id = run_id
+        self.path = os.path.join(root or CHECKPOINT_DIR, run_id)
+        self.enabled = CHECKPOINTS if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._active = None  # shared lock held while this run uses the directory
+        self.resumed = 0  # stages served from a checkpoint
+        self.computed = 0  # stages run and checkpointed
+        if self.enabled:
+            prune()
+            self._active = file_lock.hold(_lock_file(root or CHECKPOINT_DIR, run_id), shared=True)
+
+    def get(self, stage: str, default=None):
+        if not self.enabled:
+            return default
+        try:
+            with open(os.path.join(self.path, _stage_file(stage)), "r", encoding="utf-8") as f:
+                return json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            return default
+
+    def put(self, stage: str, value):
+        """Store a stage's JSON-serializable output (atomically, so a crash never leaves half a file)."""
+        if not self.enabled:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        target = os.path.join(self.path, _stage_file(stage))
+        tmp = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"stage": stage, "saved_at": time.time(), "value": value}, f)
+        os.replace(tmp, target)
+
+    def step(self, stage: str, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs), or its checkpointed result if this stage already
+        completed (or completes meanwhile in a concurrent run of the same inputs).
+        """
+        value = self.get(stage, _MISSING)
+        if value is _MISSING and self.enabled:
+            with file_lock.locked(os.path.join(self.path, _stage_file(stage) + ".lock")):
+                value = self.get(stage, _MISSING)
+                if value is _MISSING:
+                    return self._compute(stage, fn, *args, **kwargs)
+        elif value is _MISSING:
+            return self._compute(stage, fn, *args, **kwargs)
+        with self._lock:
+            self.resumed += 1
+        return value
+
+    def _compute(self, stage: str, fn, *args, **kwargs):
+        value = fn(*args, **kwargs)
+        self.put(stage, value)
+        with self._lock:
+            self.computed += 1
+        return value
+
+    def sender(self, send, prefix: str = "call"):
+        """Wrap a run_plan send(system_prompt, content) so every model call is checkpointed."""
+        def checkpointed_send(system_prompt: str, content: str):
+            stage = f"{prefix} {digest(system_prompt + chr(0) + content)}"
+            return self.step(stage, send, system_prompt, content)
+
+        return checkpointed_send
+
+    def describe(self) -> str:
+        return f"run {self.run_id}: {self.resumed} stage(s) resumed from checkpoints, {self.computed} run"
+
+    def finish(self):
+        """
+        The run completed: its checkpoints are no longer needed, unless a
+        concurrent run of the same inputs is still using them (it deletes them).
+        """
+        if self._active is None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            return
+        self._active.close()
+        self._active = None
+        lock_file = _lock_file(os.path.dirname(self.path), self.run_id)
+        last = file_lock.hold(lock_file, blocking=False)
+        if last is not None:
+            try:
+                shutil.rmtree(self.path, ignore_errors=True)
+                os.remove(lock_file)
+            finally:
+                last.close()
+
+
+def prune(root: str = None, ttl_days: float = None) -> list:
+    """Delete runs not touched for ttl_days and not in progress; returns their ids."""
+    root = root or CHECKPOINT_DIR
+    ttl = (CHECKPOINT_TTL_DAYS if ttl_days is None else ttl_days) * 86400
+    removed = []
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return removed
+    now = time.time()
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            if now - os.path.getmtime(path) <= ttl:
+                continue
+            if os.path.isdir(path):
+                held = file_lock.hold(_lock_file(root, name), blocking=False)
+                if held is None:
+                    continue  # a run of the same inputs is still using it
+                try:
+                    shutil.rmtree(path, ignore_errors=True)
+                finally:
+                    held.close()
+                removed.append(name)
+            elif name.startswith(".") and name.endswith(".lock") and not os.path.isdir(os.path.join(root, name[1:-5])):
+                held = file_lock.hold(path, blocking=False)
+                if held is not None:
+                    try:
+                        os.remove(path)
+                    finally:
+                        held.close()
+        except OSError:
+            continue
+    return removed
+
+
+def list_runs(root: str = None) -> list:
+    """(run id, stages, last update) of every unfinished run."""
+    root = root or CHECKPOINT_DIR
+    runs = []
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return runs
+    for name in names:
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            stages = [entry for entry in os.listdir(path) if entry.endswith(".json")]
+            runs.append((name, len(stages), os.path.getmtime(path)))
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect checkpoints of unfinished analysis runs.")
+    parser.add_argument("--prune", action="store_true", help=f"Delete runs older than {CHECKPOINT_TTL_DAYS:g} days.")
+    args = parser.parse_args()
+
+    if args.prune:
+        removed = prune()
+        print(f"Removed {len(removed)} expired run(s).")
+        return
+    runs = list_runs()
+    for name, stages, updated in runs:
+        print(f"{name}  {stages} stage(s)  last update {time.strftime('%Y-%m-%d %H:%M', time.localtime(updated))}")
+    print(f"{len(runs)} unfinished run(s) in {CHECKPOINT_DIR}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Transcript compaction before prompting.
+
+Raw transcripts (especially Whisper output and tool exports) carry text that
+is billed as input tokens without helping the analysis: caption boilerplate,
+timestamps, ragged whitespace, one speaker label per line, hallucinated
+phrase loops ("Thank you. Thank you. Thank you.") and runs of filler.
+compact() rebuilds the transcript from its turn table with that removed.
+
+Hesitation markers (um, uh, hmm, "...", stutters like "I-I") are signal for
+the emotional analysis: runs are collapsed to one, but they are never
+removed.
+
+    off         unchanged
+    light       drop boilerplate lines, normalize whitespace and speaker labels,
+                collapse phrase loops repeated 3+ times
+    normal      + drop timestamps, merge consecutive turns by the same speaker,
+                collapse hesitation runs, drop comma-delimited discourse fillers
+                ("you know", "I mean", "like")
+    aggressive  + collapse phrases repeated twice, shorten stutters ("I I I" -> "I-I"),
+                drop turns that are only a backchannel ("Mm-hmm.", "Okay.")
+
+Usage:
+    python3 compaction.py transcript.txt --level normal --output compact.txt
+"""
+
+import re
+import sys
+import math
+import argparse
+
+import config
+import prompt_budget
+from transcript_model import Transcript
+
+LEVELS = ("off", "light", "normal", "aggressive")
+COMPACTION_LEVEL = config.get("COMPACTION_LEVEL", "off")
+MAX_NGRAM = 8  # longest repeated phrase (in words) that is collapsed
+
+_BOILERPLATE = re.compile(
+    r"^[ \t]*(?:"
+    r"WEBVTT.*"
+    r"|NOTE\b.*"
+    r"|\d+"  # SRT/VTT cue numbers
+    r"|[\d:.,]+[ \t]*-->[ \t]*[\d:.,]+.*"  # cue timings
+    r"|transcribed by .*"
+    r"|this transcript was (?:generated|created) .*"
+    r"|(?:powered by|via) otter\.ai.*"
+    r")[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SHOUTED_SPEAKER = re.compile(r"^([ \t]*(?:\[[^\]\n]*\][ \t]*)?)speaker[ \t_]+(\w+)[ \t]*:", re.IGNORECASE | re.MULTILINE)
+_HESITATION = r"(?:u+m+|u+h+|e+r+m*|h+m+|a+h+)"
+_HESITATION_RUN = re.compile(rf"\b({_HESITATION})\b(?:[,.]?[ \t]+(?:{_HESITATION})\b)+", re.IGNORECASE)
+_ELLIPSIS_RUN = re.compile(r"(?:\.{3}|…)(?:[ \t]*(?:\.{3}|…))+")
+_FILLER = re.compile(r",[ \t]*(?:you know|i mean|like)[ \t]*,", re.IGNORECASE)
+_STUTTER = re.compile(r"\b(\w{1,3})(?:[,]?[ \t]+\1\b)+", re.IGNORECASE)
+_BACKCHANNEL = re.compile(
+    r"^(?:mm+[- ]?hmm+|uh[- ]?huh|yeah|yep|yes|okay|ok|right|sure|got it|i see)[.!]?$", re.IGNORECASE
+)
+_WORD_KEY = re.compile(r"[^\w']+")
+
+
+class CompactionResult:
+    """Compacted text plus what it saved."""
+
+    def __init__(self, text: str, level: str, original_tokens: int, compacted_tokens: int, changes: dict):
+        self.text = text
+        self.level = level
+        self.original_tokens = original_tokens
+        self.compacted_tokens = compacted_tokens
+        self.changes = changes
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+    @property
+    def saved_ratio(self) -> float:
+        return self.saved_tokens / self.original_tokens if self.original_tokens else 0.0
+
+    def describe(self) -> str:
+        return (
+            f"compaction ({self.level}): ~{self.original_tokens:,} -> ~{self.compacted_tokens:,} tokens "
+            f"({self.saved_ratio:.0%} saved)"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "level": self.level,
+            "original_tokens": self.original_tokens,
+            "compacted_tokens": self.compacted_tokens,
+            "saved_tokens": self.saved_tokens,
+            "saved_ratio": round(self.saved_ratio, 4),
+            "changes": dict(self.changes),
+            "description": self.describe(),
+        }
+
+
+def collapse_repeats(words: list, min_repeats: int) -> tuple:
+    """Keep one copy of any 2..MAX_NGRAM-word phrase repeated min_repeats+ times in a row."""
+    keys = [_WORD_KEY.sub("", word).lower() for word in words]
+    kept, collapsed, i = [], 0, 0
+    while i < len(words):
+        run = None
+        for n in range(2, MAX_NGRAM + 1):
+            phrase = keys[i : i + n]
+            if len(phrase) < n or not all(phrase):
+                break
+            repeats = 1
+            while keys[i + repeats * n : i + (repeats + 1) * n] == phrase:
+                repeats += 1
+            if repeats >= min_repeats:
+                run = (n, repeats)
+                break
+        if run is None:
+            kept.append(words[i])
+            i += 1
+            continue
+        n, repeats = run
+        # Keep the last copy so the run's closing punctuation survives
+        kept.extend(words[i + (repeats - 1) * n : i + repeats * n])
+        collapsed += repeats - 1
+        i += repeats * n
+    return kept, collapsed
+
+
+def _compact_body(body: str, level: str, changes: dict) -> str:
+    words = body.split()
+    words, collapsed = collapse_repeats(words, 2 if level == "aggressive" else 3)
+    changes["repeated_phrases"] += collapsed
+    body = " ".join(words)
+    if level in ("normal", "aggressive"):
+        body, n = _HESITATION_RUN.subn(r"\1", body)
+        changes["hesitation_runs"] += n
+        body = _ELLIPSIS_RUN.sub("...", body)
+        body, n = _FILLER.subn("", body)
+        changes["fillers"] += n
+    if level == "aggressive":
+        body, n = _STUTTER.subn(lambda m: f"{m.group(1)}-{m.group(1)}", body)
+        changes["stutters"] += n
+    return body
+
+
+def _label(speaker: str) -> str:
+    speaker = " ".join(speaker.split())
+    return speaker.title() if speaker.isupper() else speaker
+
+
+def _timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"[{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}] "
+
+
+def compact(transcript, level: str = None) -> CompactionResult:
+    """Compact a transcript (text or Transcript) at the given level (default COMPACTION_LEVEL)."""
+    level = level or COMPACTION_LEVEL
+    if level not in LEVELS:
+        raise ValueError(f"Unknown compaction level: {level!r}. Choose from {', '.join(LEVELS)}.")
+    text = transcript.text if isinstance(transcript, Transcript) else transcript
+    original_tokens = prompt_budget.estimate_tokens(text)
+    changes = {
+        "boilerplate_lines": 0, "repeated_phrases": 0, "hesitation_runs": 0,
+        "fillers": 0, "stutters": 0, "merged_turns": 0, "backchannels": 0,
+    }
+    if level == "off":
+        return CompactionResult(text, level, original_tokens, original_tokens, changes)
+
+    cleaned, changes["boilerplate_lines"] = _BOILERPLATE.subn("", text)
+    cleaned = _SHOUTED_SPEAKER.sub(r"\1Speaker \2:", cleaned)  # "SPEAKER_1 :" -> "Speaker 1:"
+    parsed = Transcript.parse(cleaned)
+
+    lines = []
+    last_file, last_speaker = None, None
+    for turn in parsed:
+        fid = parsed.file_ids[turn.index]
+        if fid != last_file:
+            if fid >= 0:
+                if lines:
+                    lines.append("")
+                lines.append(f"[{parsed.file_labels[fid] or 'File'}: {turn.file}]")
+            last_file, last_speaker = fid, None
+        body = _compact_body(turn.text, level, changes)
+        if not body:
+            continue
+        if level == "aggressive" and _BACKCHANNEL.match(body):
+            changes["backchannels"] += 1
+            continue
+        speaker = _label(turn.speaker)
+        if level != "light" and speaker and speaker == last_speaker and lines:
+            lines[-1] += " " + body
+            changes["merged_turns"] += 1
+            continue
+        prefix = _timestamp(turn.start_time) if level == "light" and not math.isnan(turn.start_time) else ""
+        lines.append(f"{prefix}{speaker}: {body}" if speaker else f"{prefix}{body}")
+        last_speaker = speaker
+
+    compacted = "\n".join(lines)
+    return CompactionResult(compacted, level, original_tokens, prompt_budget.estimate_tokens(compacted), changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact a transcript to save prompt tokens.")
+    parser.add_argument("transcript", help="Path to a transcript text file.")
+    parser.add_argument("--level", choices=LEVELS, default="normal", help="How aggressively to compact.")
+    parser.add_argument("--output", type=str, default=None, help="Write the compacted transcript here.")
+    args = parser.parse_args()
+
+    with open(args.transcript, "r", encoding="utf-8") as f:
+        result = compact(f.read(), args.level)
+    print(result.describe(), file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result.text + "\n")
+    else:
+        print(result.text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Central configuration.
+
+The .env file is read once at import and its values are applied to
+os.environ (variables already set in the process environment win, as with
+load_dotenv). Afterwards get() re-checks the file's modification time at
+most every CONFIG_CHECK_INTERVAL seconds and reloads it when it changed, so
+rotated credentials are picked up without restarting the app. Clients that
+hold a credential (see grok_client and transcription) read it through
+get() on every call and rebuild themselves only when it changes.
+
+    get("OPENAI_API_KEY")                   value or default
+    require("XAI_API_KEY")                  value, or RuntimeError if unset
+    on_change(callback)                     called with the changed keys after a reload
+"""
+
+import os
+import time
+import threading
+
+from dotenv import dotenv_values, find_dotenv
+
+ENV_FILE = os.getenv("ENV_FILE") or find_dotenv() or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+CONFIG_CHECK_INTERVAL = float(os.getenv("CONFIG_CHECK_INTERVAL", "2"))
+
+_PROCESS_ENV = frozenset(os.environ)  # set outside .env; never overridden
+
+
+class Config:
+    """Values from one .env file layered under the process environment."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0  # increments on every reload that changed a value
+        self._lock = threading.Lock()
+        self._values = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self._load()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> set:
+        """(Re)read the file and apply it to os.environ; returns the keys that changed."""
+        self._mtime = self._stat()
+        values = {}
+        if self._mtime is not None:
+            values = {key: value for key, value in dotenv_values(self.path).items() if value is not None}
+        changed = {key for key in values.keys() | self._values.keys() if values.get(key) != self._values.get(key)}
+        for key in changed - _PROCESS_ENV:
+            if key in values:
+                os.environ[key] = values[key]
+            else:
+                os.environ.pop(key, None)
+        self._values = values
+        return changed
+
+    def refresh(self, force: bool = False):
+        """Reload the file if it changed since the last check."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < CONFIG_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            if self._stat() == self._mtime:
+                return
+            changed = self._load()
+            if not changed:
+                return
+            self.version += 1
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(changed)
+
+    def get(self, key: str, default: str = None) -> str:
+        self.refresh()
+        return os.environ.get(key, default)
+
+    def require(self, key: str) -> str:
+        value = self.get(key)
+        if not value:
+            raise RuntimeError(f"{key} not found in environment. Check your .env file.")
+        return value
+
+    def on_change(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+
+settings = Config(ENV_FILE)
+
+
+def get(key: str, default: str = None) -> str:
+    return settings.get(key, default)
+
+
+def require(key: str) -> str:
+    return settings.require(key)
+
+
+def get_bool(key: str, default: bool) -> bool:
+    """Boolean flag: 1/true/yes are on, 0/false/no are off, anything else is the default."""
+    value = (settings.get(key) or "").strip().lower()
+    if value in {"1", "true", "yes"}:
+        return True
+    if value in {"0", "false", "no"}:
+        return False
+    return default
+
+
+def on_change(callback):
+    settings.on_change(callback)
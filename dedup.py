@@ -0,0 +1,181 @@
+"""
+Near-duplicate transcript detection.
+
+The same call often arrives several times (an Otter export, a Zoom
+transcript, a phone recording run through Whisper). Those copies differ in
+speaker labels, timestamps, punctuation and a share of misheard words, so
+exact hashing misses them. Each transcript is normalized to lowercase words
+(line-leading speaker labels and timestamps removed), cut into overlapping
+word shingles and reduced to a MinHash signature. Signatures are split into
+LSH bands; only transcripts that share a band bucket are compared, so
+clustering stays roughly linear in the number of transcripts. Candidates
+are merged when the estimated share of the shorter transcript's shingles
+found in the other one reaches the threshold (so a recording of only part
+of a call still matches the full export), and the longest transcript of
+each cluster is kept.
+
+Usage:
+    python3 dedup.py call_otter.txt call_zoom.txt call_phone.txt other.txt
+"""
+
+import re
+import zlib
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+import config
+from transcript_model import load_transcript
+
+DEDUP_THRESHOLD = float(config.get("DEDUP_THRESHOLD", "0.5"))  # estimated overlap of the shorter transcript
+SHINGLE_WORDS = 3  # short shingles tolerate transcription differences between sources
+NUM_PERM = 126
+LSH_BANDS = 42  # 3 rows per band: pairs with Jaccard 0.3 become candidates ~70% of the time, 0.05 ~0.5%
+MAX_SHINGLES_PER_BLOCK = 50000  # bounds the (NUM_PERM x shingles) working array
+
+_LABEL_RE = re.compile(r"^\s*(\[[^\]]*\]\s*)?([^:\n]{1,40}:)?", re.MULTILINE)
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+_rng = np.random.default_rng(20240601)  # fixed, so signatures are comparable across runs
+_A = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)  # odd
+_B = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize(text: str) -> list:
+    """Lowercase words without leading timestamps or "Speaker:" labels."""
+    return _WORD_RE.findall(_LABEL_RE.sub("", text).lower())
+
+
+def shingles(words: list, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """Distinct 32-bit hashes of every run of `size` consecutive words."""
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    ids = np.array([zlib.crc32(word.encode("utf-8")) for word in words], dtype=np.uint64)
+    if len(ids) < size:
+        return np.unique(ids)
+    # Polynomial combination of the word hashes, kept within 32 bits
+    combined = np.zeros(len(ids) - size + 1, dtype=np.uint64)
+    for offset in range(size):
+        combined = (combined * np.uint64(1000003) + ids[offset : offset + len(combined)]) & np.uint64(0xFFFFFFFF)
+    return np.unique(combined)
+
+
+def minhash(hashes: np.ndarray) -> np.ndarray:
+    """
+    NUM_PERM minimum values of the multiply-shift hashes (a*x + b mod 2^64) >> 32
+    over the shingle hashes (uint64 multiplication wraps, which is the mod).
+    """
+    signature = np.full(NUM_PERM, 1 << 32, dtype=np.uint64)
+    for start in range(0, len(hashes), MAX_SHINGLES_PER_BLOCK):
+        block = hashes[start : start + MAX_SHINGLES_PER_BLOCK]
+        values = (_A[:, None] * block[None, :] + _B[:, None]) >> np.uint64(32)
+        signature = np.minimum(signature, values.min(axis=1))
+    return signature
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def overlap(jaccard: float, size_a: int, size_b: int) -> float:
+    """Estimated share of the smaller shingle set contained in the other, from their Jaccard similarity."""
+    if not size_a or not size_b:
+        return 0.0
+    shared = jaccard * (size_a + size_b) / (1 + jaccard)
+    return min(shared / min(size_a, size_b), 1.0)
+
+
+class _Clusters:
+    """Union-find over document indices."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        self.parent[self.find(i)] = self.find(j)
+
+
+def find_duplicates(texts: list, threshold: float = None) -> list:
+    """
+    Group near-duplicate texts. Returns clusters as lists of
+    (index, overlap with the kept text), kept text first; singletons are omitted.
+    """
+    threshold = DEDUP_THRESHOLD if threshold is None else threshold
+    word_lists = [normalize(text) for text in texts]
+    shingle_sets = [shingles(words) for words in word_lists]
+    sizes = [len(hashes) for hashes in shingle_sets]
+    signatures = np.array([minhash(hashes) for hashes in shingle_sets]).reshape(len(texts), NUM_PERM)
+
+    def score(i: int, j: int) -> float:
+        return overlap(similarity(signatures[i], signatures[j]), sizes[i], sizes[j])
+
+    rows = NUM_PERM // LSH_BANDS
+    clusters = _Clusters(len(texts))
+    compared = set()
+    for band in range(LSH_BANDS):
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            if sizes[i]:
+                buckets[signature[band * rows : (band + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            for position, i in enumerate(members):
+                for j in members[position + 1:]:
+                    if (i, j) in compared:
+                        continue
+                    compared.add((i, j))
+                    if score(i, j) >= threshold:
+                        clusters.union(i, j)
+
+    groups = defaultdict(list)
+    for i in range(len(texts)):
+        groups[clusters.find(i)].append(i)
+    result = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        # Keep the most complete copy
+        kept = max(members, key=lambda i: (len(word_lists[i]), -i))
+        others = sorted(i for i in members if i != kept)
+        result.append([(kept, 1.0)] + [(i, score(kept, i)) for i in others])
+    return sorted(result, key=lambda cluster: cluster[0][0])
+
+
+def deduplicate(items: list, threshold: float = None) -> tuple:
+    """
+    Drop near-duplicates from (name, transcript) pairs, where transcript is a
+    Transcript or a string. Returns (kept pairs in input order,
+    dropped list of (name, kept name, overlap)).
+    """
+    texts = [item.text if hasattr(item, "text") else item for _, item in items]
+    dropped_by = {}
+    for cluster in find_duplicates(texts, threshold):
+        kept = cluster[0][0]
+        for i, score in cluster[1:]:
+            dropped_by[i] = (items[i][0], items[kept][0], score)
+    kept_items = [item for i, item in enumerate(items) if i not in dropped_by]
+    return kept_items, [dropped_by[i] for i in sorted(dropped_by)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate transcripts.")
+    parser.add_argument("transcripts", nargs="+", help="Paths to transcript text files.")
+    parser.add_argument("--threshold", type=float, default=None, help=f"Overlap to merge (default {DEDUP_THRESHOLD}).")
+    args = parser.parse_args()
+
+    items = [(path, load_transcript(path)) for path in args.transcripts]
+    kept, dropped = deduplicate(items, args.threshold)
+    for name, kept_name, score in dropped:
+        print(f"{name}: duplicate of {kept_name} ({score:.0%} overlap)")
+    print(f"Kept {len(kept)} of {len(items)} transcripts.")
+
+
+if __name__ == "__main__":
+    main()
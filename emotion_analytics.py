@@ -0,0 +1,395 @@
+"""
+Cross-conversation emotion analytics.
+
+Emotional maps are flattened into columnar tables (one row per segment, per
+inferred emotion, per conversation summary, per trigger and per main
+emotion) and appended to a store on disk as they are produced. Questions
+across hundreds of conversations then become vectorized pandas
+aggregations over a few columns instead of a walk over nested JSON files.
+
+Tables are stored as Parquet when pyarrow is installed, otherwise as pandas
+pickles. Each ingest appends one part file per table; a manifest maps each
+conversation key (a map file's path, an upload's run, or by default the
+map's content; never just its display name) to its current conversation id,
+so re-ingesting a changed map under the same key replaces the old rows, and
+parts are compacted once there are many.
+
+Usage:
+    python3 emotion_analytics.py ingest maps/*.json
+    python3 emotion_analytics.py emotions --freq M --top 8
+    python3 emotion_analytics.py intensity
+    python3 emotion_analytics.py trend --freq W
+    python3 emotion_analytics.py triggers --top 20
+"""
+
+import os
+import glob
+import json
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import config
+import file_lock
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EMOTION_ANALYTICS_DIR = config.get("EMOTION_ANALYTICS_DIR", "emotion_analytics")
+MAX_PARTS = 32  # part files per table before they are compacted into one
+TABLES = ("segments", "emotions", "summaries", "triggers", "main_emotions")
+INTENSITY_LEVELS = {"low": 1.0, "medium": 2.0, "high": 3.0}
+REPORTS = ("overview", "emotions", "intensity", "trend", "triggers")
+
+_write_lock = threading.Lock()
+_cache = {}  # store dir -> (manifest mtime, tables)
+
+
+def _suffix() -> str:
+    return ".parquet" if PARQUET_AVAILABLE else ".pkl"
+
+
+def _write_frame(frame: pd.DataFrame, path: str):
+    if PARQUET_AVAILABLE:
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_pickle(path)
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+
+
+def _manifest_path(store: str) -> str:
+    return os.path.join(store, "manifest.json")
+
+
+def _load_manifest(store: str) -> dict:
+    try:
+        with open(_manifest_path(store), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"conversations": {}, "next_part": 0}
+
+
+def _save_manifest(store: str, manifest: dict):
+    tmp_path = _manifest_path(store) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, _manifest_path(store))
+
+
+def _parts(store: str, table: str) -> list:
+    return sorted(glob.glob(os.path.join(store, f"{table}-*.parquet")) + glob.glob(os.path.join(store, f"{table}-*.pkl")))
+
+
+def _intensity(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return INTENSITY_LEVELS.get(value.strip().lower(), np.nan)
+    return np.nan
+
+
+def _as_list(value) -> list:
+    if isinstance(value, str):
+        return [value]
+    return [str(item) for item in value or []]
+
+
+def _normalize(label: str) -> str:
+    return " ".join(label.strip().lower().rstrip(".!").split())
+
+
+COLUMNS = {
+    "segments": ["position", "rel_position", "speaker", "intensity"],
+    "emotions": ["position", "speaker", "intensity", "emotion"],
+    "summaries": ["source", "baseline_tone", "regulation_style", "n_segments", "mean_intensity"],
+    "triggers": ["trigger"],
+    "main_emotions": ["emotion"],
+}
+CATEGORY_COLUMNS = ("speaker", "emotion", "trigger")
+
+
+def flatten_map(emo_map: dict, conversation_id: str, source: str, date) -> dict:
+    """Row tuples (conversation_id, date, *COLUMNS[table]) for every table from one emotional map."""
+    timeline = emo_map.get("timeline") or []
+    summary = emo_map.get("global_summary") or {}
+    key = (conversation_id, pd.Timestamp(date))
+    n = max(len(timeline), 1)
+
+    segments, emotions = [], []
+    for position, segment in enumerate(timeline):
+        speaker = str(segment.get("speaker") or "unknown")
+        intensity = _intensity(segment.get("intensity"))
+        segments.append(key + (position, position / n, speaker, intensity))
+        for emotion in _as_list(segment.get("inferred_emotions")):
+            emotions.append(key + (position, speaker, intensity, _normalize(emotion)))
+
+    known = [row[5] for row in segments if not np.isnan(row[5])]
+    return {
+        "segments": segments,
+        "emotions": emotions,
+        "summaries": [key + (
+            source,
+            str(summary.get("baseline_tone", "")),
+            str(summary.get("regulation_style", "")),
+            len(timeline),
+            sum(known) / len(known) if known else np.nan,
+        )],
+        "triggers": [key + (_normalize(t),) for t in _as_list(summary.get("key_triggers"))],
+        "main_emotions": [key + (_normalize(e),) for e in _as_list(summary.get("main_emotions"))],
+    }
+
+
+def _conversation_id(source: str, emo_map: dict) -> str:
+    digest = hashlib.sha1(f"{source}\0{json.dumps(emo_map, sort_keys=True)}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def ingest_maps(items: list, store: str = None) -> int:
+    """
+    Append (emo_map, source, date, key) items to the store; a key of None
+    means the map's conversation id. Keys whose map is unchanged are skipped;
+    changed ones replace their previous rows. Returns the number of
+    conversations written.
+    """
+    store = store or EMOTION_ANALYTICS_DIR
+    with _write_lock, file_lock.locked(os.path.join(store, ".lock")):
+        manifest = _load_manifest(store)
+        batches = {table: [] for table in TABLES}
+        written = 0
+        for emo_map, source, date, key in items:
+            conversation_id = _conversation_id(source, emo_map)
+            key = key or conversation_id
+            if manifest["conversations"].get(key, {}).get("id") == conversation_id:
+                continue
+            date = date or datetime.now(timezone.utc)
+            for table, rows in flatten_map(emo_map, conversation_id, source, date).items():
+                batches[table].extend(rows)
+            manifest["conversations"][key] = {
+                "id": conversation_id, "source": source, "date": pd.Timestamp(date).isoformat(),
+            }
+            written += 1
+        if not written:
+            return 0
+
+        part = manifest["next_part"]
+        for table, rows in batches.items():
+            if rows:
+                frame = pd.DataFrame(rows, columns=["conversation_id", "date"] + COLUMNS[table])
+                _write_frame(frame, os.path.join(store, f"{table}-{part:06d}{_suffix()}"))
+        manifest["next_part"] = part + 1
+        _save_manifest(store, manifest)
+        if len(_parts(store, "segments")) > MAX_PARTS:
+            _compact(store, manifest)
+    return written
+
+
+def ingest_map(emo_map: dict, source: str, date: datetime = None, store: str = None, key: str = None) -> bool:
+    return ingest_maps([(emo_map, source, date, key)], store) > 0
+
+
+def ingest_files(paths: list, store: str = None) -> int:
+    """Ingest emotional_map.json files, dated by their modification time."""
+    items = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            emo_map = json.load(f)
+        path = os.path.abspath(path)
+        items.append((emo_map, path, datetime.fromtimestamp(os.path.getmtime(path), timezone.utc), path))
+    return ingest_maps(items, store)
+
+
+def _compact(store: str, manifest: dict):
+    """Rewrite each table as a single part holding only current conversations."""
+    active = {entry["id"] for entry in manifest["conversations"].values()}
+    part = manifest["next_part"]
+    for table in TABLES:
+        old_parts = _parts(store, table)
+        if not old_parts:
+            continue
+        frame = pd.concat([_read_frame(path) for path in old_parts], ignore_index=True)
+        frame = frame[frame["conversation_id"].isin(active)]
+        _write_frame(frame, os.path.join(store, f"{table}-{part:06d}{_suffix()}"))
+        for path in old_parts:
+            os.unlink(path)
+    manifest["next_part"] = part + 1
+    _save_manifest(store, manifest)
+
+
+def load_tables(store: str = None) -> dict:
+    """All tables as DataFrames, restricted to current conversations (cached until the store changes)."""
+    store = store or EMOTION_ANALYTICS_DIR
+    try:
+        stamp = os.path.getmtime(_manifest_path(store))
+    except OSError:
+        stamp = None
+    cached = _cache.get(store)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    manifest = _load_manifest(store)
+    active = pd.Index([entry["id"] for entry in manifest["conversations"].values()])
+    tables = {}
+    for table in TABLES:
+        parts = _parts(store, table)
+        if parts:
+            frame = pd.concat([_read_frame(path) for path in parts], ignore_index=True)
+            frame = frame[frame["conversation_id"].isin(active)].reset_index(drop=True)
+        else:
+            frame = pd.DataFrame(columns=["conversation_id", "date"] + COLUMNS[table])
+        frame["date"] = pd.to_datetime(frame["date"], utc=True)
+        for column in CATEGORY_COLUMNS:
+            if column in frame:
+                frame[column] = frame[column].astype("category")
+        tables[table] = frame
+    _cache[store] = (stamp, tables)
+    return tables
+
+
+def _periods(dates: pd.Series, freq: str) -> pd.Series:
+    """Label of the period each date falls in; formatted once per distinct date."""
+    codes, distinct = pd.factorize(dates)
+    labels = pd.DatetimeIndex(distinct).tz_convert(None).to_period(freq).start_time.strftime("%Y-%m-%d")
+    return pd.Series(np.asarray(labels)[codes], index=dates.index)
+
+
+def overview(store: str = None) -> dict:
+    tables = load_tables(store)
+    summaries = tables["summaries"]
+    if summaries.empty:
+        return {"conversations": 0, "segments": 0}
+    return {
+        "conversations": int(len(summaries)),
+        "segments": int(len(tables["segments"])),
+        "first": summaries["date"].min().isoformat(),
+        "last": summaries["date"].max().isoformat(),
+        "mean_intensity": round(float(summaries["mean_intensity"].mean()), 3),
+        "top_emotions": {str(e): int(n) for e, n in tables["emotions"]["emotion"].value_counts().head(10).items()},
+    }
+
+
+def emotion_frequency(freq: str = "M", top: int = 10, speaker: str = None, store: str = None) -> dict:
+    """Mentions of the most frequent emotions per period, with each period's share."""
+    emotions = load_tables(store)["emotions"]
+    if speaker:
+        emotions = emotions[emotions["speaker"] == speaker]
+    if emotions.empty:
+        return {"freq": freq, "periods": [], "counts": {}, "share": {}}
+    leading = emotions["emotion"].value_counts().index[:top]
+    emotions = emotions[emotions["emotion"].isin(leading)]
+    counts = emotions.groupby([_periods(emotions["date"], freq), "emotion"], observed=True).size().unstack(fill_value=0)
+    counts = counts[[e for e in leading if e in counts.columns]]
+    share = counts.div(counts.sum(axis=1), axis=0).round(4)
+    return {
+        "freq": freq,
+        "periods": counts.index.tolist(),
+        "counts": {emotion: counts[emotion].astype(int).tolist() for emotion in counts.columns},
+        "share": {emotion: share[emotion].tolist() for emotion in share.columns},
+    }
+
+
+def intensity_by_speaker(store: str = None) -> dict:
+    """Per speaker: segment count, mean intensity, quartiles and a low/medium/high histogram."""
+    segments = load_tables(store)["segments"].dropna(subset=["intensity"])
+    if segments.empty:
+        return {"speakers": {}}
+    grouped = segments.groupby("speaker", observed=True)["intensity"]
+    stats = grouped.agg(["count", "mean", "std"]).join(grouped.quantile([0.25, 0.5, 0.75]).unstack())
+    levels = pd.cut(segments["intensity"], bins=[0, 1.5, 2.5, np.inf], labels=list(INTENSITY_LEVELS))
+    histogram = pd.crosstab(segments["speaker"], levels)
+    result = {}
+    for speaker, row in stats.iterrows():
+        result[str(speaker)] = {
+            "segments": int(row["count"]),
+            "mean": round(float(row["mean"]), 3),
+            "std": round(float(row["std"]), 3) if pd.notna(row["std"]) else None,
+            "quartiles": [round(float(row[q]), 3) for q in (0.25, 0.5, 0.75)],
+            "histogram": {str(level): int(histogram.loc[speaker].get(level, 0)) for level in INTENSITY_LEVELS},
+        }
+    return {"speakers": result}
+
+
+def intensity_trend(freq: str = "M", store: str = None) -> dict:
+    """Mean segment intensity and number of conversations per period."""
+    tables = load_tables(store)
+    segments = tables["segments"].dropna(subset=["intensity"])
+    if segments.empty:
+        return {"freq": freq, "periods": [], "mean_intensity": [], "conversations": []}
+    by_period = segments.groupby(_periods(segments["date"], freq)).agg(
+        mean_intensity=("intensity", "mean"), conversations=("conversation_id", "nunique")
+    )
+    return {
+        "freq": freq,
+        "periods": by_period.index.tolist(),
+        "mean_intensity": by_period["mean_intensity"].round(3).tolist(),
+        "conversations": by_period["conversations"].astype(int).tolist(),
+    }
+
+
+def trigger_cooccurrence(top: int = 20, store: str = None) -> dict:
+    """Trigger pairs named in the same conversation, and triggers against its main emotions."""
+    tables = load_tables(store)
+    triggers = tables["triggers"][["conversation_id", "trigger"]].astype(str).drop_duplicates()
+    main_emotions = tables["main_emotions"][["conversation_id", "emotion"]].astype(str).drop_duplicates()
+    if triggers.empty:
+        return {"trigger_pairs": [], "trigger_emotions": [], "triggers": {}}
+
+    pairs = triggers.merge(triggers, on="conversation_id")
+    pairs = pairs[pairs["trigger_x"] < pairs["trigger_y"]]
+    pair_counts = pairs.groupby(["trigger_x", "trigger_y"]).size().nlargest(top)
+    with_emotions = triggers.merge(main_emotions, on="conversation_id")
+    emotion_counts = with_emotions.groupby(["trigger", "emotion"]).size().nlargest(top)
+    return {
+        "triggers": triggers["trigger"].value_counts().head(top).to_dict(),
+        "trigger_pairs": [
+            {"a": a, "b": b, "conversations": int(count)} for (a, b), count in pair_counts.items()
+        ],
+        "trigger_emotions": [
+            {"trigger": t, "emotion": e, "conversations": int(count)} for (t, e), count in emotion_counts.items()
+        ],
+    }
+
+
+def report(name: str, freq: str = "M", top: int = 10, speaker: str = None, store: str = None) -> dict:
+    """Run one of REPORTS by name (used by the CLI and the web endpoint)."""
+    if name == "overview":
+        return overview(store)
+    if name == "emotions":
+        return emotion_frequency(freq, top, speaker, store)
+    if name == "intensity":
+        return intensity_by_speaker(store)
+    if name == "trend":
+        return intensity_trend(freq, store)
+    if name == "triggers":
+        return trigger_cooccurrence(top, store)
+    raise ValueError(f"Unknown report: {name!r}. Choose from {', '.join(REPORTS)}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion analytics across many conversations.")
+    parser.add_argument("command", choices=("ingest",) + REPORTS)
+    parser.add_argument("paths", nargs="*", help="emotional_map.json files to ingest.")
+    parser.add_argument("--freq", type=str, default="M", help="Period for trends: D, W, M, Q or Y.")
+    parser.add_argument("--top", type=int, default=10, help="Number of emotions/triggers to report.")
+    parser.add_argument("--speaker", type=str, default=None, help="Only count this speaker's emotions.")
+    parser.add_argument("--store", type=str, default=None, help="Analytics store directory.")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        written = ingest_files(args.paths, args.store)
+        print(f"Ingested {written} new or changed emotional map(s) of {len(args.paths)}.")
+        return
+    print(json.dumps(report(args.command, args.freq, args.top, args.speaker, args.store), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
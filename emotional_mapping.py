@@ -1,16 +1,18 @@
 import os
+import sys
 import json
 import argparse
-import requests
-from dotenv import load_dotenv
+import sqlite3
 
-load_dotenv()
-XAI_API_KEY = os.getenv("XAI_API_KEY")
-if not XAI_API_KEY:
-    raise RuntimeError("XAI_API_KEY not found in environment. Check your .env file.")
-
-XAI_URL = "https://api.x.ai/v1/chat/completions"
-MODEL = "grok-4-0709"
+import admission
+import compaction
+import json_schema
+import json_stream
+import model_routing
+import emotion_analytics
+import search_index
+import prompt_budget
+from transcript_model import load_transcript
 
 EMO_PROMPT = """
 You are an emotional mapping assistant.
@@ -58,33 +60,287 @@ Return STRICTLY valid JSON with:
 Focus on clarity and usefulness, not clinical language.
 """.strip()
 
+SEGMENT_FIELDS = ("text_snippet", "inferred_emotions")
+SEGMENT_DESCRIPTION = (
+    "one emotional timeline segment: an object with segment_id, text_snippet, approx_position, "
+    "speaker, inferred_emotions (list of strings), intensity and notes."
+)
+SUMMARY_DESCRIPTION = (
+    "the global_summary of an emotional map: an object with baseline_tone and regulation_style "
+    "(strings) and main_emotions, key_triggers and reflection_prompts (lists of strings)."
+)
+
+_STRINGS = {"type": "array", "items": {"type": "string"}}
+SEGMENT_SCHEMA = json_schema.object_schema({
+    "segment_id": {"type": ["integer", "string"]},
+    "text_snippet": {"type": "string"},
+    "approx_position": {"type": "string"},
+    "speaker": {"type": "string"},
+    "inferred_emotions": _STRINGS,
+    "intensity": {"type": ["string", "number"]},
+    "notes": {"type": "string"},
+}, required=SEGMENT_FIELDS)
+SUMMARY_SCHEMA = {"title": "global_summary", **json_schema.object_schema({
+    "baseline_tone": {"type": "string"},
+    "main_emotions": _STRINGS,
+    "key_triggers": _STRINGS,
+    "regulation_style": {"type": "string"},
+    "reflection_prompts": _STRINGS,
+}, required=())}
+EMOTION_MAP_SCHEMA = {"title": "emotional_map", **json_schema.object_schema({
+    "timeline": {"type": "array", "items": SEGMENT_SCHEMA, "minItems": 1},
+    "global_summary": SUMMARY_SCHEMA,
+})}
+
+GLOBAL_SUMMARY_PROMPT = """
+You receive the timeline of an emotional map of one conversation, as JSON.
+Write only its "global_summary" object, with the fields baseline_tone,
+main_emotions, key_triggers, regulation_style and reflection_prompts as in
+this format, in plain, non-clinical language. Return STRICTLY valid JSON.
+""".strip()
+
+# Fused mode: one call returns a markdown report followed by the emotional map
+EMOTION_MAP_DELIMITER = "=== EMOTIONAL MAP JSON ==="
+
+FUSED_INSTRUCTIONS = f"""
+SECOND OUTPUT: EMOTIONAL MAP
+After the report, output a line containing exactly
+{EMOTION_MAP_DELIMITER}
+followed by an emotional map of the same conversation, as specified below.
+Output nothing after the JSON.
+
+{EMO_PROMPT}
+""".strip()
+
+
+def merge_emotion_maps(maps: list) -> dict:
+    """Merge emotional maps of consecutive transcript parts into one map."""
+    timeline = [segment for emo_map in maps for segment in emo_map.get("timeline", [])]
+    for i, segment in enumerate(timeline):
+        segment["segment_id"] = i + 1
+        # Positions were relative to each part; make them relative to the whole call
+        third = i * 3 // max(len(timeline), 1)
+        segment["approx_position"] = ("start", "middle", "end")[third]
+
+    summaries = [emo_map.get("global_summary") or {} for emo_map in maps]
+    merged_summary = dict(summaries[0]) if summaries else {}
+    for key in ("main_emotions", "key_triggers", "reflection_prompts"):
+        merged_summary[key] = list(dict.fromkeys(
+            item for summary in summaries for item in summary.get(key, [])
+        ))
+    return {"timeline": timeline, "global_summary": merged_summary}
+
+
+def plan_emotions(transcript: str, strategy: str = "chunk") -> prompt_budget.PromptPlan:
+    """Estimate the prompt size locally, pick a model and choose how to fit the token budget."""
+    return model_routing.plan_for_task("emotions", EMO_PROMPT, transcript, strategy=strategy)
+
+
+def validate_segment(segment, path: str = ""):
+    json_schema.validate(segment, SEGMENT_SCHEMA, path)
+
+
+def validate_global_summary(summary, path: str = ""):
+    json_schema.validate(summary, SUMMARY_SCHEMA, path)
+
+
+def summarize_timeline(timeline: list) -> dict:
+    """Re-request only the global summary, from the timeline rather than the transcript."""
+    messages = [
+        {"role": "system", "content": GLOBAL_SUMMARY_PROMPT},
+        {"role": "user", "content": json.dumps(timeline, ensure_ascii=False)},
+    ]
+
+    def check(reply: str) -> dict:
+        summary = json_stream.parse_fragment(reply)
+        summary = summary.get("global_summary", summary)
+        validate_global_summary(summary)
+        return summary
+
+    return check(model_routing.complete("emotions", messages, validate=check, schema=SUMMARY_SCHEMA))
+
+
+def _feed_map(parser: json_stream.StreamingJSONParser, text: str) -> list:
+    """Feed emotional-map text to parser, rejecting parts that fail their schema; returns the events."""
+    events = parser.feed(text)
+    for path, value in events:
+        if path == ("timeline",):
+            # Emitted whole only when it is not an array
+            parser.reject(path, "timeline: expected array")
+            continue
+        try:
+            if path[0] == "timeline":
+                validate_segment(value, f"timeline[{path[1]}]")
+            elif path[0] == "global_summary":
+                validate_global_summary(value, "global_summary")
+        except ValueError as e:
+            parser.reject(path, str(e))
+    return events
+
+
+def _timeline_salvageable(parser: json_stream.StreamingJSONParser) -> bool:
+    """Whether the map has a valid segment, or one that can be repaired, once parsed."""
+    return any(segment is not None for segment in parser.result.get("timeline") or ()) or any(
+        len(path) == 2 and path[0] == "timeline" and error != "truncated" for path, _, error in parser.errors
+    )
+
+
+def _finish_emotion_map(parser: json_stream.StreamingJSONParser) -> dict:
+    """
+    Close parser and build the map: malformed segments and summary are
+    repaired on their own (given the error found), and a missing or cut-off
+    summary is rebuilt from the timeline.
+    """
+    parser.close()
+    timeline = parser.result.get("timeline") or []
+    summary = parser.result.get("global_summary")
+    for path, raw, error in parser.errors:
+        if error == "truncated":
+            continue
+        try:
+            if len(path) == 2 and path[0] == "timeline":
+                timeline[path[1]] = json_stream.repair_fragment(raw, SEGMENT_DESCRIPTION, validate_segment, error)
+            elif path == ("global_summary",):
+                summary = json_stream.repair_fragment(raw, SUMMARY_DESCRIPTION, validate_global_summary, error)
+        except ValueError:
+            pass  # drop the segment rather than the whole map
+    timeline = [segment for segment in timeline if segment is not None]
+    if not timeline:
+        raise ValueError("Model did not return an emotional timeline.")
+
+    return {"timeline": timeline, "global_summary": summary or summarize_timeline(timeline)}
+
+
+def parse_emotion_map(raw_content: str) -> dict:
+    """Parse a complete emotional-map reply, repairing only the parts that fail validation."""
+    parser = json_stream.StreamingJSONParser(item_arrays=("timeline",))
+    _feed_map(parser, raw_content)
+    return _finish_emotion_map(parser)
+
+
+def stream_emotion_map(system_prompt: str, content: str, model: str, on_progress=None) -> dict:
+    """
+    Stream one emotional-map reply (constrained to EMOTION_MAP_SCHEMA where
+    the model supports it). Segments are validated and reported to on_progress
+    as they close; see _finish_emotion_map for what happens to bad parts.
+    """
+    parser = json_stream.StreamingJSONParser(item_arrays=("timeline",))
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
+    pieces = model_routing.stream("emotions", messages, model=model, schema=EMOTION_MAP_SCHEMA,
+                                  validate=check_emotion_map)
+    for piece in pieces:
+        events = _feed_map(parser, piece)
+        if events and on_progress:
+            on_progress(parser.result)
+    return _finish_emotion_map(parser)
+
+
+def call_grok_for_emotions(transcript: str, plan: prompt_budget.PromptPlan = None, on_progress=None) -> dict:
+    """
+    Map emotions over a transcript. on_progress, if given, is called with the
+    map so far each time another segment arrives.
+    """
+    plan = plan or plan_emotions(transcript)
+    finished = []  # maps of completed chunks
+
+    def progress(partial: dict):
+        current = {
+            "timeline": [segment for segment in partial.get("timeline", []) if segment is not None],
+            "global_summary": partial.get("global_summary") or {},
+        }
+        if finished:
+            # merge_emotion_maps renumbers segments in place, so merge copies
+            current = merge_emotion_maps([
+                {"timeline": [dict(s) for s in m["timeline"]], "global_summary": m["global_summary"]}
+                for m in finished + [current]
+            ])
+        on_progress(current)
+
+    def send(system_prompt: str, content: str):
+        if system_prompt == prompt_budget.SUMMARY_PROMPT:
+            return model_routing.complete("summary", [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content},
+            ])
+        try:
+            emo_map = stream_emotion_map(system_prompt, content, plan.model, on_progress and progress)
+        except ValueError:
+            if plan.model == model_routing.LARGE_MODEL:
+                raise
+            emo_map = stream_emotion_map(system_prompt, content, model_routing.LARGE_MODEL, on_progress and progress)
+        finished.append(emo_map)
+        return emo_map
+
+    result = prompt_budget.run_plan(plan, send, join_parts=lambda results: results)
+    if plan.strategy == "chunk":
+        return merge_emotion_maps(result)
+    return result
+
+
+def make_fused_prompt(report_prompt: str) -> str:
+    """System prompt asking for report_prompt's report plus the emotional map in one reply."""
+    return f"{report_prompt}\n\n{FUSED_INSTRUCTIONS}"
 
-def call_grok_for_emotions(transcript: str) -> dict:
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {XAI_API_KEY}",
-    }
 
-    payload = {
-        "model": MODEL,
-        "messages": [
-            {"role": "system", "content": EMO_PROMPT},
-            {"role": "user", "content": transcript},
-        ],
-        "stream": False,
-    }
+def _fused_sections(raw_content: str) -> tuple:
+    report, delimiter, tail = raw_content.rpartition(EMOTION_MAP_DELIMITER)
+    if not delimiter:
+        raise ValueError("Model did not return an emotional map section.")
+    report = report.strip()
+    if not report:
+        raise ValueError("Model did not return a report section.")
+    return report, tail
 
-    resp = requests.post(XAI_URL, headers=headers, data=json.dumps(payload))
-    resp.raise_for_status()
-    data = resp.json()
-    raw_content = data["choices"][0]["message"]["content"]
 
-    start = raw_content.find("{")
-    end = raw_content.rfind("}")
-    if start == -1 or end == -1:
-        raise ValueError("Model did not return JSON-like content.")
+def check_emotion_map(raw_content: str):
+    """
+    Raise ValueError if an emotional-map reply cannot be salvaged (it has no
+    usable timeline). Defects parse_emotion_map repairs on their own pass,
+    and no API call is made.
+    """
+    parser = json_stream.StreamingJSONParser(item_arrays=("timeline",))
+    _feed_map(parser, raw_content)
+    parser.close()
+    if not _timeline_salvageable(parser):
+        raise ValueError("Model did not return an emotional timeline.")
 
-    return json.loads(raw_content[start : end + 1])
+
+def check_fused_reply(raw_content: str):
+    """
+    Raise ValueError if a fused reply cannot be salvaged: a section is missing
+    or the map has no usable timeline. Defects split_fused_reply can repair
+    on their own pass, so they do not cost a full re-run on the large model.
+    """
+    check_emotion_map(_fused_sections(raw_content)[1])
+
+
+def split_fused_reply(raw_content: str) -> tuple:
+    """Split a fused reply into (report markdown, emotional map); raises ValueError if either is missing."""
+    report, tail = _fused_sections(raw_content)
+    return report, parse_emotion_map(tail)
+
+
+def plan_fused(report_prompt: str, transcript: str, strategy: str = None) -> prompt_budget.PromptPlan:
+    """Plan a single request for both the report and the emotional map."""
+    return model_routing.plan_for_task("fused", make_fused_prompt(report_prompt), transcript, strategy=strategy)
+
+
+def call_grok_fused(plan: prompt_budget.PromptPlan, user_prefix: str = "", run=None) -> tuple:
+    """Run a fused plan and return (report markdown, emotional map); run (a checkpoints.Run) checkpoints each call."""
+    send = model_routing.plan_sender("fused", plan, validate=check_fused_reply, user_prefix=user_prefix)
+    if run:
+        send = run.sender(send, prefix=f"call {user_prefix}")
+    raw = prompt_budget.run_plan(plan, send, join_parts=lambda results: results)
+    if plan.strategy != "chunk":
+        return split_fused_reply(raw)
+    parts = [split_fused_reply(part) for part in raw]
+    report = "\n\n".join(
+        f"## Part {i} of {len(parts)}\n\n{part_report}" for i, (part_report, _) in enumerate(parts, 1)
+    )
+    return report, merge_emotion_maps([emo_map for _, emo_map in parts])
 
 
 def main():
@@ -98,18 +354,82 @@ def main():
         default="emotional_map.json",
         help="Output JSON file.",
     )
+    parser.add_argument(
+        "--strategy",
+        type=str,
+        default="chunk",
+        choices=["chunk", "summarize", "truncate", "fail"],
+        help="What to do if the transcript exceeds the model's token budget.",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Also write the conversation report (markdown) to this file, from the same Grok call.",
+    )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help="Rewrite the output file as segments arrive (marked \"_partial\" until done).",
+    )
+    parser.add_argument(
+        "--compact",
+        type=str,
+        default=compaction.COMPACTION_LEVEL,
+        choices=compaction.LEVELS,
+        help="Compact the transcript before sending (hesitation markers are kept).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only show the token estimate and plan; do not call the API.",
+    )
     args = parser.parse_args()
 
-    with open(args.transcript, "r", encoding="utf-8") as f:
-        transcript = f.read()
+    transcript = load_transcript(args.transcript)
+    compacted = compaction.compact(transcript, args.compact)
+    if args.compact != "off":
+        print(compacted.describe())
+
+    if args.report:
+        from main import SYSTEM_PROMPT as REPORT_PROMPT
+        plan = plan_fused(REPORT_PROMPT, compacted.text, strategy=args.strategy)
+    else:
+        plan = plan_emotions(compacted.text, strategy=args.strategy)
+    print(f"Prompt plan: {plan.describe()}")
+    if args.dry_run:
+        return
+    if not plan.fits:
+        print("Error: transcript exceeds the token budget. Use --strategy chunk, summarize or truncate.", file=sys.stderr)
+        sys.exit(1)
 
-    emo_map = call_grok_for_emotions(transcript)
+    if args.report:
+        report, emo_map = call_grok_fused(plan, user_prefix="Transcript:\n")
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print(f"Saved report to {args.report}")
+    else:
+        on_progress = (lambda partial: json_stream.write_progress(args.output, partial)) if args.progressive else None
+        emo_map = call_grok_for_emotions(compacted.text, plan=plan, on_progress=on_progress)
 
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(emo_map, f, indent=2, ensure_ascii=False)
+    json_stream.write_progress(args.output, emo_map, complete=True)
 
     print(f"Saved emotional map to {args.output}")
 
+    try:
+        search_index.index_transcript(transcript, args.transcript)
+        # Keyed on the transcript, so mapping it again replaces the previous map
+        search_index.index_emotional_map(emo_map, args.transcript, key=search_index.content_key(transcript.text))
+    except sqlite3.Error as e:
+        print(f"Warning: could not update search index: {e}")
+
+    try:
+        output = os.path.abspath(args.output)
+        emotion_analytics.ingest_map(emo_map, output, key=output)
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not update emotion analytics: {e}")
+
 
 if __name__ == "__main__":
-    main()
+    with admission.acting_as(admission.Client(lane="batch")):
+        main()
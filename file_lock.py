@@ -0,0 +1,60 @@
+"""
+Advisory inter-process file locks.
+
+The web app can run as several worker processes (see wsgi.py), which all
+append to the same local stores (retrieval index, emotion analytics). A
+threading.Lock only serializes threads of one process, so writers also take
+an exclusive flock on a lock file next to the store. On platforms without
+fcntl the lock is a no-op and a single worker process should be used.
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def locked(path: str):
+    """Hold an exclusive lock on path (created if missing) for the block."""
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def hold(path: str, shared: bool = False, blocking: bool = True):
+    """
+    Open path (created if missing) and lock it, shared or exclusive, until the
+    returned file is closed. Non-blocking, returns None if the lock is taken.
+    The holder of an exclusive lock may delete path.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    while True:
+        f = open(path, "a")
+        if fcntl is None:
+            return f
+        try:
+            fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            f.close()
+            return None
+        try:
+            if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()  # deleted while we waited for it; lock the new file
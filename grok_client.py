@@ -0,0 +1,330 @@
+"""
+Shared Grok chat-completions client.
+
+Every script sends its Grok requests through chat_completion(), so policies
+that apply to all calls live here.
+
+Hedged requests (opt-in, GROK_HEDGING=1): if no response headers arrive
+within a deadline taken from a percentile of recent time-to-first-byte
+samples, a duplicate request is sent. The first successful response wins
+and the other is abandoned and its connection closed. A hedge budget caps
+duplicates to a fraction of all requests, and counters plus latency samples
+are kept so the deadline can be tuned from real traffic (see hedge_stats()).
+
+Each thread keeps one requests.Session, so connections to the API are
+reused across calls instead of being set up per request. The API key is
+read from config on every request, so a rotated key in .env takes effect
+without a restart.
+
+Requests made inside a cancellable job (see cancellation) give up as soon
+as the job is cancelled: the caller is released immediately, and the
+abandoned attempt drops its connection when the response starts arriving
+(or, for streams, between server-sent events).
+
+Every call first takes a "grok" admission slot (see admission), so
+interactive callers and other users are not starved by one large batch.
+
+Replies can be cached in the shared state (opt-in, GROK_CACHE=1) keyed by
+the whole request, streamed or not: an identical request made by any
+worker or node within GROK_CACHE_TTL_HOURS reuses the reply, and one made
+while the first is still in flight waits for it (see shared_state). Only
+non-empty replies that pass the caller's validate check are stored, so a
+malformed reply is not served again to every retry.
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import config
+import admission
+import cancellation
+import shared_state
+
+config.require("XAI_API_KEY")  # fail at startup rather than on the first request
+
+XAI_URL = "https://api.x.ai/v1/chat/completions"
+REQUEST_TIMEOUT = 3600  # seconds; long analyses can take several minutes
+
+GROK_HEDGING = config.get_bool("GROK_HEDGING", False)
+HEDGE_PERCENTILE = float(config.get("GROK_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = 20  # below this, HEDGE_DEFAULT_DEADLINE is used
+HEDGE_DEFAULT_DEADLINE = float(config.get("GROK_HEDGE_DEFAULT_DEADLINE", "90"))
+HEDGE_MIN_DEADLINE = float(config.get("GROK_HEDGE_MIN_DEADLINE", "5"))
+HEDGE_BUDGET_RATIO = float(config.get("GROK_HEDGE_BUDGET", "0.1"))  # max hedges per request
+HEDGE_BUDGET_BURST = 2  # hedges allowed before the ratio has anything to work with
+LATENCY_WINDOW = 200  # time-to-first-byte samples kept per model
+
+GROK_CACHE = config.get_bool("GROK_CACHE", False)  # reuse replies to identical requests
+GROK_CACHE_TTL_HOURS = float(config.get("GROK_CACHE_TTL_HOURS", "24"))
+
+_stats_lock = threading.Lock()
+_ttfb_samples = {}  # model -> deque of seconds
+_counters = {
+    "requests": 0,
+    "hedges_issued": 0,
+    "hedge_wins": 0,
+    "primary_wins": 0,
+    "hedges_denied_by_budget": 0,
+    "failures": 0,
+    "cancelled": 0,
+}
+
+_attempt_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="grok-attempt")
+_local = threading.local()
+
+
+class _Attempt:
+    """One HTTP attempt; signals when response headers (the first byte) arrive."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.first_byte = threading.Event()
+        self.cancelled = threading.Event()
+
+    def run(self, payload: dict, model: str) -> dict:
+        started = time.monotonic()
+        try:
+            with _session().post(
+                XAI_URL, headers=_headers(), data=json.dumps(payload), stream=True, timeout=REQUEST_TIMEOUT
+            ) as resp:
+                _record_ttfb(model, time.monotonic() - started)
+                self.first_byte.set()
+                if self.cancelled.is_set():
+                    raise _Cancelled()
+                _raise_for_status(resp)
+                body = []
+                for chunk in resp.iter_content(chunk_size=16384):
+                    if self.cancelled.is_set():
+                        # Closing the response drops the connection
+                        raise _Cancelled()
+                    body.append(chunk)
+                return json.loads(b"".join(body))
+        finally:
+            self.first_byte.set()
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _raise_for_status(resp: requests.Response):
+    """resp.raise_for_status(), with an error body read first so it is still on the error after the stream closes."""
+    if resp.status_code >= 400:
+        resp.content
+    resp.raise_for_status()
+
+
+def _session() -> requests.Session:
+    """This thread's long-lived session (keeps connections to the API open)."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def _headers() -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {config.require('XAI_API_KEY')}",
+    }
+
+
+def _record_ttfb(model: str, seconds: float):
+    with _stats_lock:
+        _ttfb_samples.setdefault(model, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def hedge_deadline(model: str) -> float:
+    """Seconds to wait for the first byte before hedging, from recent latency."""
+    with _stats_lock:
+        samples = sorted(_ttfb_samples.get(model, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DEADLINE
+    index = min(int(len(samples) * HEDGE_PERCENTILE / 100), len(samples) - 1)
+    return max(samples[index], HEDGE_MIN_DEADLINE)
+
+
+def _take_hedge_budget() -> bool:
+    with _stats_lock:
+        allowed = HEDGE_BUDGET_RATIO * _counters["requests"] + HEDGE_BUDGET_BURST
+        if _counters["hedges_issued"] < allowed:
+            _counters["hedges_issued"] += 1
+            return True
+        _counters["hedges_denied_by_budget"] += 1
+        return False
+
+
+def _count(key: str):
+    with _stats_lock:
+        _counters[key] += 1
+
+
+def hedge_stats() -> dict:
+    """Counters and latency percentiles for tuning the hedge deadline."""
+    with _stats_lock:
+        stats = dict(_counters)
+        latency = {}
+        for model, samples in _ttfb_samples.items():
+            ordered = sorted(samples)
+            latency[model] = {
+                "samples": len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                "max": ordered[-1],
+            }
+    stats["enabled"] = GROK_HEDGING
+    stats["hedge_rate"] = stats["hedges_issued"] / stats["requests"] if stats["requests"] else 0.0
+    stats["hedge_win_rate"] = stats["hedge_wins"] / stats["hedges_issued"] if stats["hedges_issued"] else 0.0
+    stats["ttfb_seconds"] = latency
+    stats["deadlines"] = {model: hedge_deadline(model) for model in latency}
+    return stats
+
+
+def _hedged_request(payload: dict, model: str, hedge: bool) -> dict:
+    primary = _Attempt("primary")
+    if not hedge and cancellation.current() is None:
+        try:
+            return primary.run(payload, model)
+        except Exception:
+            _count("failures")
+            raise
+
+    futures = {_attempt_executor.submit(primary.run, payload, model): primary}
+    hedge_at = time.monotonic() + hedge_deadline(model) if hedge else None
+
+    pending = set(futures)
+    error = None
+    try:
+        while pending:
+            timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            done, pending = cancellation.wait(pending, timeout=timeout)
+            if not done:
+                # Hedge deadline passed
+                hedge_at = None
+                if not primary.first_byte.is_set() and _take_hedge_budget():
+                    backup = _Attempt("hedge")
+                    future = _attempt_executor.submit(backup.run, payload, model)
+                    futures[future] = backup
+                    pending.add(future)
+                continue
+            for future in done:
+                try:
+                    data = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                winner = futures[future]
+                for other in pending:
+                    futures[other].cancelled.set()
+                if len(futures) > 1:
+                    _count("hedge_wins" if winner.label == "hedge" else "primary_wins")
+                return data
+    except cancellation.Cancelled:
+        for attempt in futures.values():
+            attempt.cancelled.set()
+        _count("cancelled")
+        raise
+    _count("failures")
+    raise error
+
+
+def _cache_key(payload: dict) -> str:
+    request = json.dumps({**payload, "stream": False}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def _cacheable(reply: str, validate) -> bool:
+    if not reply.strip():
+        return False
+    try:
+        if validate:
+            validate(reply)
+        return True
+    except ValueError:
+        return False
+
+
+def chat_completion(messages: list, model: str, hedge: bool = None, validate=None, **options) -> str:
+    """
+    Send a chat completion request to Grok and return the reply text.
+
+    hedge overrides the GROK_HEDGING default for this call; validate(reply)
+    should raise ValueError for a reply that must not be cached. Extra
+    options (e.g. temperature) are passed through in the request payload.
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": False,
+        **options,
+    }
+    hedge = GROK_HEDGING if hedge is None else hedge
+
+    def request() -> str:
+        _count("requests")
+        with admission.slot("grok"):
+            data = _hedged_request(payload, model, hedge)
+        return data["choices"][0]["message"]["content"]
+
+    if not GROK_CACHE:
+        return request()
+    return shared_state.single_flight(
+        "grok", _cache_key(payload), request, ttl=GROK_CACHE_TTL_HOURS * 3600,
+        keep=lambda reply: _cacheable(reply, validate),
+    )
+
+
+def stream_chat_completion(messages: list, model: str, validate=None, **options):
+    """
+    Yield the reply text in pieces as Grok streams it (server-sent events).
+    Streams are not hedged: partial output has usually been consumed by the
+    time a duplicate could win. A cached reply is yielded in one piece; the
+    whole reply is cached only if it passes validate, as in chat_completion().
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        **options,
+    }
+    cache_key = _cache_key(payload) if GROK_CACHE else None
+    cached = shared_state.get("grok", cache_key) if cache_key else None
+    if cached is not None:
+        yield cached
+        return
+    _count("requests")
+    pieces = []
+    with admission.slot("grok"):  # held until the stream is consumed or closed
+        started = time.monotonic()
+        try:
+            with _session().post(
+                XAI_URL, headers=_headers(), data=json.dumps(payload), stream=True, timeout=REQUEST_TIMEOUT
+            ) as resp:
+                _record_ttfb(model, time.monotonic() - started)
+                _raise_for_status(resp)
+                for line in resp.iter_lines(decode_unicode=True):
+                    cancellation.check()
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        reply = "".join(pieces)
+                        if cache_key and _cacheable(reply, validate):
+                            shared_state.put("grok", cache_key, reply, ttl=GROK_CACHE_TTL_HOURS * 3600)
+                        return
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        pieces.append(delta)
+                        yield delta
+        except cancellation.Cancelled:
+            _count("cancelled")
+            raise
+        except Exception:
+            _count("failures")
+            raise
@@ -0,0 +1,63 @@
+"""
+gunicorn settings for the production server (see wsgi.py).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers are forked from a master that has already imported the app
+(preload_app), and each worker serves requests on a pool of threads, since
+most request time is spent waiting on Whisper and Grok.
+
+Reloading without dropping requests:
+    kill -HUP <master pid>     new settings: workers are replaced, in-flight requests finish
+    kill -USR2 <master pid>    new code: starts a new master alongside the old one;
+                               then send the old master WINCH (stop its workers) and QUIT
+
+Workers whose memory grows past MAX_WORKER_RSS_MB recycle themselves
+after the request that crossed it: they stop accepting, finish what they
+are serving and exit, and the master forks a fresh one. WEB_MAX_REQUESTS
+(with jitter, so workers do not restart together) is a blunter backstop.
+
+All settings can be set in .env or the environment.
+"""
+
+import os
+import multiprocessing
+
+import config as app_config  # "config" is itself a gunicorn setting name
+import memory_diagnostics
+
+bind = app_config.get("WEB_BIND", "127.0.0.1:8000")
+workers = int(app_config.get("WEB_WORKERS", str(multiprocessing.cpu_count())))
+threads = int(app_config.get("WEB_THREADS", "8"))
+worker_class = "gthread"
+preload_app = True
+
+# gthread workers heartbeat from their main loop, so long analyses do not
+# trip timeout; graceful_timeout is how long a reload waits for them
+timeout = int(app_config.get("WEB_TIMEOUT", "120"))
+graceful_timeout = int(app_config.get("WEB_GRACEFUL_TIMEOUT", "600"))
+keepalive = 5
+max_requests = int(app_config.get("WEB_MAX_REQUESTS", "0"))  # 0: never restart on count
+max_requests_jitter = max_requests // 10
+
+accesslog = app_config.get("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+pidfile = app_config.get("WEB_PIDFILE") or None
+
+
+def when_ready(server):
+    server.log.info("Serving on %s with %d worker(s) x %d thread(s), master pid %d", bind, workers, threads, os.getpid())
+    if not app_config.get("ADMISSION_USER_HEADER") and not int(app_config.get("WEB_PROXIES", "0")):
+        server.log.warning(
+            "Neither ADMISSION_USER_HEADER nor WEB_PROXIES is set: behind a reverse proxy every request "
+            "has the proxy's address, so admission control treats all users as one"
+        )
+
+
+def post_request(worker, req, environ, resp):
+    if worker.alive and memory_diagnostics.over_limit():
+        worker.log.warning(
+            "Worker %d is using %.0f MB (MAX_WORKER_RSS_MB=%g); recycling it",
+            worker.pid, memory_diagnostics.rss_bytes() / 2**20, memory_diagnostics.MAX_WORKER_RSS_MB,
+        )
+        worker.alive = False  # finish in-flight requests, then exit; the master replaces it
@@ -0,0 +1,108 @@
+"""
+JSON Schema checks for structured model replies.
+
+validate(value, schema) implements the part of JSON Schema the reply
+formats use (type, enum, properties, required, additionalProperties, items,
+minItems, anyOf) and raises SchemaError naming the first offending path,
+e.g. "timeline[3].inferred_emotions: expected array, got string". That
+message is what a targeted repair request sends back with the fragment.
+
+response_format(name, schema) is the chat-completions option that asks the
+API to constrain its reply to the schema (structured outputs); see
+model_routing for how models without support are handled.
+"""
+
+import json
+
+_PYTHON_TYPES = {"object": dict, "array": list, "string": str, "boolean": bool, "null": type(None)}
+
+
+class SchemaError(ValueError):
+    """A value does not match its schema; path locates the offending part."""
+
+    def __init__(self, path: str, message: str):
+        self.path = path
+        super().__init__(f"{path}: {message}" if path else message)
+
+
+def _json_type(value) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    for name, python_type in _PYTHON_TYPES.items():
+        if isinstance(value, python_type):
+            return name
+    return type(value).__name__
+
+
+def _has_type(value, expected) -> bool:
+    actual = _json_type(value)
+    expected = [expected] if isinstance(expected, str) else expected
+    return actual in expected or (actual == "integer" and "number" in expected)
+
+
+def validate(value, schema: dict, path: str = ""):
+    """Raise SchemaError if value does not match schema."""
+    if "anyOf" in schema:
+        errors = []
+        for option in schema["anyOf"]:
+            try:
+                validate(value, option, path)
+                break
+            except SchemaError as e:
+                errors.append((option, e))
+        else:
+            # Report against the form the value was evidently meant to have
+            for option, error in errors:
+                if "type" in option and _has_type(value, option["type"]):
+                    raise error
+            expected = " or ".join(
+                "/".join([option["type"]] if isinstance(option["type"], str) else option["type"])
+                for option, _ in errors if "type" in option
+            )
+            raise SchemaError(path, f"expected {expected or 'another form'}, got {_json_type(value)}")
+
+    if "type" in schema and not _has_type(value, schema["type"]):
+        expected = schema["type"] if isinstance(schema["type"], str) else " or ".join(schema["type"])
+        raise SchemaError(path, f"expected {expected}, got {_json_type(value)}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise SchemaError(path, f"must be one of {', '.join(json.dumps(option) for option in schema['enum'])}")
+
+    if isinstance(value, dict):
+        for key in schema.get("required", ()):
+            if key not in value:
+                raise SchemaError(path, f"missing required key {key!r}")
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties", True)
+        for key, item in value.items():
+            item_path = f"{path}.{key}" if path else key
+            if key in properties:
+                validate(item, properties[key], item_path)
+            elif additional is False:
+                raise SchemaError(path, f"unexpected key {key!r}")
+            elif isinstance(additional, dict):
+                validate(item, additional, item_path)
+
+    if isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            raise SchemaError(path, f"needs at least {schema['minItems']} item(s)")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                validate(item, schema["items"], f"{path}[{i}]")
+
+
+def object_schema(properties: dict, required=None) -> dict:
+    """An object schema with the given property schemas (all required unless required says otherwise)."""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties) if required is None else list(required),
+    }
+
+
+def response_format(name: str, schema: dict) -> dict:
+    """The chat-completions response_format asking for a reply that matches schema."""
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema}}
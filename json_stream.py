@@ -0,0 +1,252 @@
+"""
+Incremental parsing of JSON objects streamed by the model.
+
+StreamingJSONParser is fed reply text as it arrives. It reports each
+top-level value of the reply object as soon as that value closes, and each
+element of the chosen top-level arrays (e.g. an emotional map's "timeline")
+as soon as that element closes. Text before the first "{" (prose, markdown
+fences) is skipped. A malformed or truncated part is recorded in .errors on
+its own, so it can be repaired or re-requested without redoing the whole
+call.
+"""
+
+import os
+import json
+
+import model_routing
+
+REPAIR_PROMPT = """
+You repair malformed JSON fragments. You receive a fragment that was meant to be
+{description}
+and, when known, the problem found with it.
+Return ONLY the corrected JSON value, keeping the content unchanged wherever
+possible. No prose, no markdown fences.
+""".strip()
+
+
+class StreamingJSONParser:
+    """Character-level scanner that emits completed parts of one JSON object."""
+
+    def __init__(self, item_arrays: tuple = ()):
+        self.item_arrays = set(item_arrays)
+        self.result = {}
+        self.errors = []  # (path, raw text, message); path is (key,) or (key, index)
+        self.complete = False
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"  # at depth 1: "key", "colon", "value" or "comma"
+        self._key = None
+        self._token_start = None  # start of the current key or top-level value
+        self._items_key = None  # top-level array currently emitting items
+        self._item_start = None
+        self._item_index = 0
+
+    def feed(self, chunk: str) -> list:
+        """Consume more text; returns (path, value) for every part that closed."""
+        events = []
+        self._text += chunk
+        text = self._text
+        while self._pos < len(text) and not self.complete:
+            i, c = self._pos, text[self._pos]
+            self._pos += 1
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key":
+                        self._key = self._load(text[self._token_start : i + 1])
+                        self._expect = "colon"
+                continue
+
+            if c.isspace():
+                continue
+
+            if self._depth == 1:
+                self._scan_top_level(i, c, events)
+            elif self._depth == 2 and self._items_key is not None:
+                self._scan_items(i, c, events)
+            else:
+                self._scan_nested(i, c, events)
+        return events
+
+    def _scan_top_level(self, i: int, c: str, events: list):
+        if self._expect == "key":
+            if c == '"':
+                self._in_string = True
+                self._token_start = i
+            elif c == "}":
+                self.complete = True
+            return
+        if self._expect == "colon":
+            if c == ":":
+                self._expect = "value"
+                self._token_start = None
+            return
+        if self._expect == "value":
+            if self._token_start is None:
+                self._token_start = i
+                if c == '"':
+                    self._in_string = True
+                elif c in "[{":
+                    self._depth = 2
+                    if c == "[" and self._key in self.item_arrays:
+                        self._items_key = self._key
+                        self._item_index = 0
+                        self.result[self._key] = []
+                return
+            if c in ",}":
+                # End of a scalar value
+                self._emit_value(self._text[self._token_start : i].strip(), events)
+                self._expect = "key"
+                if c == "}":
+                    self.complete = True
+            return
+        if self._expect == "comma":
+            if c == ",":
+                self._expect = "key"
+            elif c == "}":
+                self.complete = True
+
+    def _scan_items(self, i: int, c: str, events: list):
+        if self._item_start is None:
+            if c == "]":
+                self._close_container(i, events)
+            elif c != ",":
+                self._item_start = i
+                if c == '"':
+                    self._in_string = True
+                elif c in "[{":
+                    self._depth = 3
+            return
+        if c in ",]":
+            # End of a scalar item
+            self._emit_item(self._text[self._item_start : i].strip(), events)
+            if c == "]":
+                self._close_container(i, events)
+
+    def _scan_nested(self, i: int, c: str, events: list):
+        if c == '"':
+            self._in_string = True
+        elif c in "[{":
+            self._depth += 1
+        elif c in "]}":
+            self._depth -= 1
+            if self._depth == 2 and self._items_key is not None:
+                self._emit_item(self._text[self._item_start : i + 1], events)
+            elif self._depth == 1:
+                self._close_container(i, events)
+
+    def _close_container(self, i: int, events: list):
+        self._depth = 1
+        self._expect = "comma"
+        if self._items_key is not None:
+            self._items_key = None
+            return
+        self._emit_value(self._text[self._token_start : i + 1], events)
+
+    def _emit_value(self, raw: str, events: list):
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.errors.append(((self._key,), raw, str(e)))
+            return
+        self.result[self._key] = value
+        events.append(((self._key,), value))
+
+    def _emit_item(self, raw: str, events: list):
+        path = (self._items_key, self._item_index)
+        self._item_index += 1
+        self._item_start = None
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.result[self._items_key].append(None)
+            self.errors.append((path, raw, str(e)))
+            return
+        self.result[self._items_key].append(value)
+        events.append((path, value))
+
+    def _load(self, raw: str):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return raw.strip('"')
+
+    def reject(self, path: tuple, message: str):
+        """Mark an emitted part as invalid (e.g. it failed schema checks) so it is repaired."""
+        if len(path) == 1:
+            value = self.result.pop(path[0], None)
+        else:
+            value = self.result[path[0]][path[1]]
+            self.result[path[0]][path[1]] = None
+        self.errors.append((path, json.dumps(value, ensure_ascii=False), message))
+
+    def close(self):
+        """Record whatever was cut off if the stream ended before the object closed."""
+        if not self._started:
+            raise ValueError("Model did not return JSON-like content.")
+        if self.complete:
+            return
+        if self._items_key is not None and self._item_start is not None:
+            self.result[self._items_key].append(None)
+            self.errors.append(
+                ((self._items_key, self._item_index), self._text[self._item_start :], "truncated")
+            )
+        elif self._expect == "value" and self._token_start is not None and self._items_key is None:
+            self.errors.append(((self._key,), self._text[self._token_start :], "truncated"))
+
+    def missing(self, keys: tuple) -> list:
+        """Expected top-level keys that have no value yet."""
+        return [key for key in keys if key not in self.result]
+
+
+def parse_fragment(reply: str):
+    """Parse a short JSON reply, ignoring prose or markdown fences around it."""
+    starts = [i for i in (reply.find("{"), reply.find("[")) if i != -1]
+    end = max(reply.rfind("}"), reply.rfind("]"))
+    if starts and end > min(starts):
+        return json.loads(reply[min(starts) : end + 1])
+    return json.loads(reply)
+
+
+def repair_fragment(raw: str, description: str, validate=None, error: str = None):
+    """
+    Ask the fast model to fix one malformed fragment (not the whole reply).
+    validate(value) may raise ValueError; error, the parse or schema error
+    found, is sent along. Returns the repaired value.
+    """
+    messages = [
+        {"role": "system", "content": REPAIR_PROMPT.format(description=description)},
+        {"role": "user", "content": f"Fragment:\n{raw}\n\nProblem: {error}" if error else raw},
+    ]
+
+    def check(reply: str):
+        value = parse_fragment(reply)
+        if validate:
+            validate(value)
+        return value
+
+    return check(model_routing.complete("json_repair", messages, validate=check))
+
+
+def write_progress(path: str, data: dict, complete: bool = False):
+    """Atomically write a (possibly partial) result; partial files carry "_partial": true."""
+    payload = data if complete else dict(data, _partial=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
@@ -0,0 +1,286 @@
+"""
+Live meeting ingestion.
+
+A LiveSession receives 16 kHz mono PCM frames as they arrive (the web app
+feeds it from the /live/ws WebSocket), transcribes a sliding window of the
+not-yet-confirmed audio every few seconds and queues events for the client:
+
+    {"type": "partial", "text": ...}         words that may still change
+    {"type": "final", "segments": [...]}     turns that will not change
+    {"type": "emotions", "estimate": {...}}  rolling emotional state
+    {"type": "error", "error": ...}
+    {"type": "done", "transcript": ...}
+
+Segments that end well before the edge of the window are confirmed and the
+window moves past them, so each second of audio is transcribed only a few
+times. Every LIVE_EMOTION_INTERVAL seconds of audio the emotional state is
+re-estimated from just the turns confirmed since the previous estimate.
+
+Live Whisper runs take a "transcription" admission slot like uploads do,
+in the session's (interactive) lane. close() runs the last pass and
+estimate on the worker pool and waits at most LIVE_CLOSE_TIMEOUT_SEC.
+"""
+
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+import numpy as np
+
+import config
+import admission
+import json_schema
+import json_stream
+import model_routing
+import transcription
+from audio_preprocess import SAMPLE_RATE, detect_speech
+from transcript_model import Transcript
+
+LIVE_TRANSCRIBER = config.get("LIVE_TRANSCRIBER", "whisper")  # "whisper" or "stand-in"
+LIVE_WHISPER_MODEL = config.get("LIVE_WHISPER_MODEL", "base")
+LIVE_STEP_SEC = float(config.get("LIVE_STEP_SEC", "3"))  # new audio between transcriptions
+LIVE_MAX_WINDOW_SEC = float(config.get("LIVE_MAX_WINDOW_SEC", "30"))  # longest unconfirmed window
+LIVE_COMMIT_LAG_SEC = 2.0  # segments ending this close to the window edge stay partial
+LIVE_EMOTION_INTERVAL = float(config.get("LIVE_EMOTION_INTERVAL", "30"))
+LIVE_WORKERS = int(config.get("LIVE_WORKERS", "2"))  # concurrent transcriptions across sessions
+LIVE_CLOSE_TIMEOUT_SEC = float(config.get("LIVE_CLOSE_TIMEOUT_SEC", "30"))  # longest wait for the final pass
+PROMPT_CHARS = 200  # confirmed text passed to the transcriber as context
+
+LIVE_EMOTION_PROMPT = """
+You are tracking the emotional state of a live conversation as it happens.
+You receive your previous estimate (or null) and only the turns spoken since.
+Update the estimate. Do not diagnose, and present everything as inference
+from language only.
+
+Return STRICTLY valid JSON:
+{
+  "current_emotions": ["emotion1", "emotion2"],
+  "intensity": "low|medium|high",
+  "shift": "what changed since the previous estimate, or 'steady'",
+  "note": "one short, kind, in-the-moment observation"
+}
+""".strip()
+
+LIVE_ESTIMATE_SCHEMA = {"title": "live_emotions", **json_schema.object_schema({
+    "current_emotions": {"type": "array", "items": {"type": "string"}},
+    "intensity": {"type": ["string", "number"]},
+    "shift": {"type": "string"},
+    "note": {"type": "string"},
+}, required=("current_emotions",))}
+
+_transcribe_executor = ThreadPoolExecutor(max_workers=LIVE_WORKERS, thread_name_prefix="live-asr")
+_emotion_executor = ThreadPoolExecutor(max_workers=LIVE_WORKERS, thread_name_prefix="live-emotions")
+
+
+def parse_estimate(raw: str) -> dict:
+    """Parse a live emotion estimate; raises ValueError if it does not match LIVE_ESTIMATE_SCHEMA."""
+    estimate = json_stream.parse_fragment(raw)
+    json_schema.validate(estimate, LIVE_ESTIMATE_SCHEMA)
+    return estimate
+
+
+class WhisperTranscriber:
+    """Local Whisper over in-memory audio; the model is shared with uploads (see transcription)."""
+
+    def __init__(self, model_name: str = LIVE_WHISPER_MODEL):
+        self.model_name = model_name
+        transcription.whisper_model(model_name)  # load now, not on the first frame
+
+    def __call__(self, audio: np.ndarray, prompt: str = "") -> list:
+        with admission.slot("transcription"):
+            segments = transcription.transcribe_local(
+                audio, segments=True, model_name=self.model_name, initial_prompt=prompt or None, fp16=False
+            )
+        return [{"start": segment["start"], "end": segment["end"], "text": segment["text"]} for segment in segments]
+
+
+class StandInTranscriber:
+    """Model-free transcriber for testing: one placeholder segment per detected speech span."""
+
+    def __call__(self, audio: np.ndarray, prompt: str = "") -> list:
+        samples = (audio * 32767).astype(np.int16)
+        return [
+            {
+                "start": start / SAMPLE_RATE,
+                "end": end / SAMPLE_RATE,
+                "text": f"[speech {(end - start) / SAMPLE_RATE:.1f}s]",
+            }
+            for start, end in detect_speech(samples)
+        ]
+
+
+def make_transcriber(name: str = None):
+    name = name or LIVE_TRANSCRIBER
+    if name == "stand-in":
+        return StandInTranscriber()
+    if name == "whisper":
+        return WhisperTranscriber()
+    raise ValueError(f"Unknown live transcriber: {name!r}")
+
+
+class LiveSession:
+    """Incremental transcription and emotion tracking for one live stream."""
+
+    def __init__(self, transcriber=None):
+        self.transcriber = transcriber or make_transcriber()
+        self.segments = []  # confirmed segments, times relative to the session start
+        self.events = queue.Queue()
+        self._lock = threading.Lock()
+        self._step_lock = threading.Lock()  # one transcription at a time per session
+        self._chunks = []  # unconfirmed int16 audio
+        self._window_start = 0.0  # session time of the first unconfirmed sample
+        self._pending_samples = 0  # samples received since the last transcription
+        self._step_scheduled = False
+        self._estimate = None
+        self._estimate_until = 0  # segments already covered by an estimate
+        self._estimate_at = 0.0  # session time of the last estimate
+        self._estimating = False
+        self._client = admission.current()  # estimates run on other threads, as this caller
+
+    # -- input --------------------------------------------------------------
+
+    def add_audio(self, frame: bytes):
+        """Add little-endian int16 PCM at SAMPLE_RATE; schedules transcription as audio accrues."""
+        samples = np.frombuffer(frame[: len(frame) // 2 * 2], dtype="<i2")
+        with self._lock:
+            self._chunks.append(samples)
+            self._pending_samples += len(samples)
+            if self._step_scheduled or self._pending_samples < LIVE_STEP_SEC * SAMPLE_RATE:
+                return
+            self._step_scheduled = True
+        _transcribe_executor.submit(self._run_step)
+
+    def drain_events(self) -> list:
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self, timeout: float = LIVE_CLOSE_TIMEOUT_SEC) -> Transcript:
+        """
+        Confirm whatever audio is left and return the session transcript. The
+        final pass (and estimate) is given at most timeout seconds; if it takes
+        longer, the transcript ends at the last confirmed turn.
+        """
+        final = _transcribe_executor.submit(self._step, final=True)
+        try:
+            final.result(timeout=timeout)
+        except FuturesTimeout:
+            self.events.put({"type": "error", "error": "Final transcription timed out; the last seconds are missing."})
+        except Exception as e:
+            self.events.put({"type": "error", "error": f"Transcription failed: {e}"})
+        with self._lock:
+            segments = list(self.segments)
+        self.events.put({"type": "done", "transcript": "\n".join(segment["text"] for segment in segments)})
+        return Transcript.from_whisper_segments(segments)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(segment["text"] for segment in self.segments)
+
+    # -- transcription -------------------------------------------------------
+
+    def _run_step(self):
+        try:
+            self._step()
+        except Exception as e:
+            self.events.put({"type": "error", "error": f"Transcription failed: {e}"})
+        finally:
+            with self._lock:
+                self._step_scheduled = False
+
+    def _step(self, final: bool = False):
+        with self._step_lock:
+            with self._lock:
+                if not self._chunks:
+                    return
+                window = np.concatenate(self._chunks)
+                self._chunks = [window]
+                self._pending_samples = 0
+                window_start = self._window_start
+
+            window_sec = len(window) / SAMPLE_RATE
+            prompt = self.text[-PROMPT_CHARS:]
+            with admission.acting_as(self._client):
+                segments = self.transcriber(window.astype(np.float32) / 32768.0, prompt)
+            segments = [s for s in segments if s["text"].strip()]
+
+            if final:
+                confirmed, partial = segments, []
+            else:
+                edge = window_sec - LIVE_COMMIT_LAG_SEC
+                confirmed = [s for s in segments if s["end"] <= edge]
+                partial = segments[len(confirmed):]
+                if not confirmed and window_sec > LIVE_MAX_WINDOW_SEC:
+                    # Nothing settled within the longest window: confirm it as is
+                    confirmed, partial = segments, []
+
+            if confirmed:
+                cut = confirmed[-1]["end"]
+            elif final or window_sec > LIVE_MAX_WINDOW_SEC:
+                cut = window_sec  # silence; nothing to keep
+            else:
+                cut = 0.0
+            cut_samples = min(int(cut * SAMPLE_RATE), len(window))
+
+            with self._lock:
+                remaining = np.concatenate(self._chunks)[cut_samples:]
+                self._chunks = [remaining] if len(remaining) else []
+                self._window_start = window_start + cut_samples / SAMPLE_RATE
+
+            if confirmed:
+                new_segments = [
+                    {
+                        "start": round(window_start + s["start"], 2),
+                        "end": round(window_start + s["end"], 2),
+                        "text": s["text"].strip(),
+                    }
+                    for s in confirmed
+                ]
+                with self._lock:
+                    self.segments.extend(new_segments)
+                self.events.put({"type": "final", "segments": new_segments})
+            self.events.put({"type": "partial", "text": " ".join(s["text"].strip() for s in partial)})
+
+        self._maybe_estimate_emotions(window_start + window_sec, final)
+
+    # -- emotions ------------------------------------------------------------
+
+    def _maybe_estimate_emotions(self, now: float, final: bool = False):
+        with self._lock:
+            due = final or now - self._estimate_at >= LIVE_EMOTION_INTERVAL
+            if not due or self._estimating or self._estimate_until >= len(self.segments):
+                return
+            self._estimating = True
+            new_turns = self.segments[self._estimate_until:]
+            self._estimate_until = len(self.segments)
+            self._estimate_at = now
+        if final:
+            self._estimate_emotions(new_turns)
+        else:
+            _emotion_executor.submit(self._estimate_emotions, new_turns)
+
+    def _estimate_emotions(self, new_turns: list):
+        turns = "\n".join(f"[{turn['start']:.0f}s] {turn['text']}" for turn in new_turns)
+        messages = [
+            {"role": "system", "content": LIVE_EMOTION_PROMPT},
+            {
+                "role": "user",
+                "content": f"Previous estimate: {json.dumps(self._estimate)}\n\nNew turns:\n{turns}",
+            },
+        ]
+        try:
+            with admission.acting_as(self._client):
+                raw = model_routing.complete(
+                    "live_emotions", messages, validate=parse_estimate, schema=LIVE_ESTIMATE_SCHEMA
+                )
+            self._estimate = parse_estimate(raw)
+            self.events.put({"type": "emotions", "estimate": self._estimate, "until": new_turns[-1]["end"]})
+        except Exception as e:
+            self.events.put({"type": "error", "error": f"Emotion estimate failed: {e}"})
+        finally:
+            with self._lock:
+                self._estimating = False
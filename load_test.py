@@ -0,0 +1,98 @@
+"""
+HTTP load test for comparing server setups (dev server vs gunicorn workers).
+
+Each target is hit with the same paths from `concurrency` client threads
+for `duration` seconds; throughput, errors and latency percentiles are
+printed per target. The default paths are local-only endpoints (no Whisper
+or Grok calls), so the numbers reflect the server, not the APIs.
+
+Usage:
+    python3 app.py &                                     # dev server on :5001
+    gunicorn -c gunicorn.conf.py wsgi:app &              # production server on :8000
+    python3 load_test.py --url http://127.0.0.1:5001 --url http://127.0.0.1:8000
+"""
+
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_PATHS = ("/healthz", "/analytics/trend", "/analytics/triggers", "/search?q=feel")
+
+
+def _percentile(ordered: list, pct: float) -> float:
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)] if ordered else float("nan")
+
+
+def run_load(base_url: str, paths: list, concurrency: int, duration: float, timeout: float = 30) -> dict:
+    """Hit base_url + paths round-robin from concurrency threads; returns throughput and latency stats."""
+    deadline = time.monotonic() + duration
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, errors = [], {}
+
+    def worker(offset: int):
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        i = offset
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.monotonic()
+            try:
+                status = session.get(base_url.rstrip("/") + path, timeout=timeout).status_code
+                error = None if status < 500 else f"HTTP {status}"
+            except requests.RequestException as e:
+                error = type(e).__name__
+            elapsed = time.monotonic() - started
+            with lock:
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+                else:
+                    latencies.append(elapsed)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.monotonic() - started
+
+    ordered = sorted(latencies)
+    return {
+        "url": base_url,
+        "requests": len(ordered),
+        "errors": errors,
+        "requests_per_second": len(ordered) / wall if wall else 0.0,
+        "p50_ms": _percentile(ordered, 50) * 1000,
+        "p95_ms": _percentile(ordered, 95) * 1000,
+        "p99_ms": _percentile(ordered, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test one or more running instances of the web app.")
+    parser.add_argument("--url", action="append", required=True, help="Base URL of a server (repeat to compare).")
+    parser.add_argument("--path", action="append", default=None,
+                        help=f"Path to request (repeatable; default: {', '.join(DEFAULT_PATHS)}).")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads.")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per target.")
+    args = parser.parse_args()
+
+    paths = args.path or list(DEFAULT_PATHS)
+    results = []
+    for url in args.url:
+        print(f"{url}: {args.concurrency} clients for {args.duration:g}s ...")
+        results.append(run_load(url, paths, args.concurrency, args.duration))
+
+    print(f"\n{'server':<32} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  errors")
+    for result in results:
+        errors = ", ".join(f"{name} x{count}" for name, count in result["errors"].items()) or "-"
+        print(
+            f"{result['url']:<32} {result['requests_per_second']:>8.1f} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}  {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
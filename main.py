@@ -1,15 +1,8 @@
-from dotenv import load_dotenv
-import os
-import requests
-import json
 import sys
 
-load_dotenv()  # loads .env from this folder
-
-api_key = os.getenv("XAI_API_KEY")
-
-if not api_key:
-    raise RuntimeError("XAI_API_KEY not found in environment. Check your .env file.")
+import compaction
+import model_routing
+import prompt_budget
 
 # Conversation Analyst System Prompt
 SYSTEM_PROMPT = """You are HumanIntuition.ai, an embodied-intelligence operating system that merges human consciousness, somatic awareness, intuition, and emotional attunement with machine-scale reasoning.
@@ -159,52 +152,34 @@ STYLE:
 """
 
 
-def analyze_conversation(transcript, metadata=None):
+def analyze_conversation(transcript, metadata=None, strategy=None, compaction_level=None):
     """
     Analyze a conversation transcript using Grok.
     
+    The prompt size is estimated locally first; transcripts over the token
+    budget are truncated, chunked or summarized according to strategy
+    (defaults to OVER_BUDGET_STRATEGY) instead of failing at the API.
+    
     Args:
         transcript (str): The conversation transcript to analyze
         metadata (str, optional): Additional context about the speakers
+        strategy (str, optional): truncate, chunk, summarize or fail
+        compaction_level (str, optional): off, light, normal or aggressive
+            (defaults to COMPACTION_LEVEL)
     
     Returns:
         str: The analysis result
     """
-    url = "https://api.x.ai/v1/chat/completions"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+    compacted = compaction.compact(transcript, compaction_level)
+    if compacted.level != "off":
+        print(compacted.describe(), file=sys.stderr)
+    plan = model_routing.plan_for_task("analysis", SYSTEM_PROMPT, compacted.text, strategy=strategy)
+    print(f"Prompt plan: {plan.describe()}", file=sys.stderr)
     
-    # Build user message in the format: Context: ...\n\nTranscript:\n[transcript]
-    user_message = ""
-    if metadata:
-        user_message += f"Context: {metadata}\n\n"
-    user_message += f"Transcript:\n{transcript}"
-    
-    data = {
-        "messages": [
-            {
-                "role": "system",
-                "content": SYSTEM_PROMPT
-            },
-            {
-                "role": "user",
-                "content": user_message
-            }
-        ],
-        "model": "grok-4",
-        "stream": False
-    }
-    
-    response = requests.post(url, headers=headers, json=data, timeout=3600)
-    
-    if response.status_code == 200:
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
-    else:
-        raise Exception(f"API Error: {response.status_code}\n{response.text}")
+    # User message format: Context: ...\n\nTranscript:\n[transcript]
+    user_prefix = f"Context: {metadata}\n\n" if metadata else ""
+    user_prefix += "Transcript:\n"
+    return prompt_budget.run_plan(plan, model_routing.plan_sender("analysis", plan, user_prefix=user_prefix))
 
 
 def main():
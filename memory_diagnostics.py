@@ -0,0 +1,160 @@
+"""
+Memory diagnostics and leak guards for long-running workers.
+
+    rss_bytes()                   resident set size of this process, now
+    over_limit()                  True once RSS passes MAX_WORKER_RSS_MB; gunicorn
+                                  (see gunicorn.conf.py) then recycles the worker
+    start_tracing() / snapshot()  tracemalloc on demand (or from startup with
+                                  MEMORY_TRACE=1) and its top allocation sites
+    diff()                        allocation growth since the previous snapshot()
+
+init_app(app) records, per endpoint, how much RSS grew while its requests
+ran (and the traced peak, while tracing). Requests served concurrently by
+one process share these numbers, so treat them as upper bounds. The web
+app shows all of it at /debug/memory when DIAGNOSTICS=1.
+"""
+
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+from collections import deque
+
+from flask import g, request
+
+import config
+
+MAX_WORKER_RSS_MB = float(config.get("MAX_WORKER_RSS_MB", "0"))  # 0 disables recycling
+MEMORY_TRACE = config.get_bool("MEMORY_TRACE", False)
+TRACE_FRAMES = int(config.get("MEMORY_TRACE_FRAMES", "10"))
+TOP_SITES = 25  # allocation sites listed per snapshot or diff
+REQUEST_WINDOW = 200  # recent requests kept per endpoint
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_lock = threading.Lock()
+_baseline = None  # tracemalloc snapshot taken by the last snapshot()
+_requests = {}  # endpoint -> deque of (rss growth bytes, traced peak bytes or None)
+
+
+def rss_bytes() -> int:
+    """Current RSS (Linux /proc), or the peak RSS where that is all the OS reports."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def over_limit() -> bool:
+    return MAX_WORKER_RSS_MB > 0 and rss_bytes() > MAX_WORKER_RSS_MB * 1024 * 1024
+
+
+def start_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+
+
+def stop_tracing():
+    global _baseline
+    with _lock:
+        _baseline = None
+    tracemalloc.stop()
+
+
+def _sites(stats: list) -> list:
+    sites = []
+    for stat in stats[:TOP_SITES]:
+        frame = stat.traceback[0]
+        site = {"file": frame.filename, "line": frame.lineno, "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        if hasattr(stat, "size_diff"):
+            site["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+            site["count_diff"] = stat.count_diff
+        sites.append(site)
+    return sites
+
+
+def _take_snapshot():
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+
+
+def snapshot() -> list:
+    """Top allocation sites now; also becomes the baseline for diff(). Starts tracing if needed."""
+    global _baseline
+    start_tracing()
+    current = _take_snapshot()
+    with _lock:
+        _baseline = current
+    return _sites(current.statistics("lineno"))
+
+
+def diff() -> list:
+    """Allocation sites that grew most since the last snapshot() (which this replaces)."""
+    global _baseline
+    start_tracing()
+    current = _take_snapshot()
+    with _lock:
+        previous, _baseline = _baseline, current
+    if previous is None:
+        return []
+    return _sites(current.compare_to(previous, "lineno"))
+
+
+def request_stats() -> dict:
+    with _lock:
+        recorded = {endpoint: list(samples) for endpoint, samples in _requests.items()}
+    stats = {}
+    for endpoint, samples in recorded.items():
+        growth = [sample[0] for sample in samples]
+        peaks = [sample[1] for sample in samples if sample[1] is not None]
+        stats[endpoint] = {
+            "requests": len(samples),
+            "max_rss_growth_mb": round(max(growth) / 2**20, 2),
+            "total_rss_growth_mb": round(sum(growth) / 2**20, 2),
+            "max_traced_peak_mb": round(max(peaks) / 2**20, 2) if peaks else None,
+        }
+    return stats
+
+
+def summary() -> dict:
+    traced, traced_peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    return {
+        "pid": os.getpid(),
+        "rss_mb": round(rss_bytes() / 2**20, 1),
+        "max_worker_rss_mb": MAX_WORKER_RSS_MB or None,
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+        "tracing": tracemalloc.is_tracing(),
+        "traced_mb": round(traced / 2**20, 1) if traced is not None else None,
+        "traced_peak_mb": round(traced_peak / 2**20, 1) if traced_peak is not None else None,
+        "requests": request_stats(),
+    }
+
+
+def init_app(app):
+    """Record each request's RSS growth (and traced peak while tracing) under its endpoint."""
+
+    @app.before_request
+    def _note_memory():
+        g.rss_at_start = rss_bytes()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    @app.teardown_request
+    def _record_memory(exc=None):
+        started = g.pop("rss_at_start", None)
+        if started is None:
+            return
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        sample = (max(rss_bytes() - started, 0), peak)
+        with _lock:
+            _requests.setdefault(request.endpoint or "unknown", deque(maxlen=REQUEST_WINDOW)).append(sample)
+
+    if MEMORY_TRACE:
+        start_tracing()
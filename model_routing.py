@@ -0,0 +1,248 @@
+"""
+Per-task model routing.
+
+Each Grok call names its task ("analysis", "emotions", "summary", ...) and
+the routing policy picks a model from the task and the input size: small
+inputs go to a fast, cheap model and everything else to the large one. When
+the fast model's reply fails validation (e.g. unparseable JSON), the call is
+retried once on the large model.
+
+Calls given a JSON schema (see json_schema) ask the API for a reply that
+matches it (structured outputs). A model whose error names the
+response_format option is asked again without it, and is sent no schemas
+for GROK_STRUCTURED_RETRY_SEC; other bad requests (e.g. too long a prompt)
+are raised as they are. Callers always validate replies locally as well.
+Set GROK_STRUCTURED_OUTPUTS=0 to never send schemas.
+
+The policy table can be overridden with a JSON file named by
+MODEL_ROUTING_POLICY, e.g. {"emotions": {"fast_max_tokens": 8000}}.
+Set MODEL_ROUTING=0 to send every call to the large model.
+"""
+
+import json
+import time
+import threading
+
+import requests
+
+import config
+import grok_client
+import json_schema
+import prompt_budget
+
+FAST_MODEL = config.get("GROK_FAST_MODEL", "grok-3-mini")
+LARGE_MODEL = config.get("GROK_LARGE_MODEL", "grok-4-0709")
+MODEL_ROUTING = config.get_bool("MODEL_ROUTING", True)
+GROK_STRUCTURED_OUTPUTS = config.get_bool("GROK_STRUCTURED_OUTPUTS", True)
+SCHEMA_REJECTED_STATUSES = (400, 422)  # how the API refuses an unsupported response_format
+SCHEMA_ERROR_MARKERS = ("response_format", "json_schema")  # one is named in such a refusal
+STRUCTURED_RETRY_SEC = float(config.get("GROK_STRUCTURED_RETRY_SEC", "3600"))  # before a refusing model gets schemas again
+
+# task -> rule. fast_max_tokens is the largest input the fast model is trusted
+# with (0 = always use the large model); escalate retries failed fast replies.
+DEFAULT_POLICY = {
+    "analysis": {"fast_max_tokens": 3000, "escalate": True},  # short voice notes
+    "profile": {"fast_max_tokens": 0, "escalate": True},  # deep synthesis across calls
+    "emotions": {"fast_max_tokens": 30000, "escalate": True},  # JSON extraction
+    "fused": {"fast_max_tokens": 3000, "escalate": True},  # report + emotional map in one call
+    "summary": {"fast_max_tokens": 100000, "escalate": True},  # condensing long transcripts
+    "superagent": {"fast_max_tokens": 0, "escalate": True},  # first turn sets the tone
+    "superagent_followup": {"fast_max_tokens": 400, "escalate": True},
+    "live_emotions": {"fast_max_tokens": 8000, "escalate": True},  # in-call updates every few seconds
+    "json_repair": {"fast_max_tokens": 8000, "escalate": True},  # fixing one malformed fragment
+}
+
+
+def load_policy(path: str = None) -> dict:
+    """Default policy merged with overrides from a JSON file, if any."""
+    policy = {task: dict(rule) for task, rule in DEFAULT_POLICY.items()}
+    path = path or config.get("MODEL_ROUTING_POLICY")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for task, rule in json.load(f).items():
+                policy.setdefault(task, {"fast_max_tokens": 0, "escalate": True}).update(rule)
+    return policy
+
+
+POLICY = load_policy()
+
+_stats_lock = threading.Lock()
+_calls = {}  # task -> {model: count}
+_escalations = {}  # task -> count
+_unstructured_models = {}  # model -> monotonic time until which no response_format is sent
+
+
+def _count_call(task: str, model: str):
+    with _stats_lock:
+        per_task = _calls.setdefault(task, {})
+        per_task[model] = per_task.get(model, 0) + 1
+
+
+def routing_stats() -> dict:
+    with _stats_lock:
+        return {
+            "enabled": MODEL_ROUTING,
+            "fast_model": FAST_MODEL,
+            "large_model": LARGE_MODEL,
+            "calls": {task: dict(models) for task, models in _calls.items()},
+            "escalations": dict(_escalations),
+            "structured_outputs": GROK_STRUCTURED_OUTPUTS,
+            "unstructured_models": sorted(
+                model for model, until in _unstructured_models.items() if until > time.monotonic()
+            ),
+        }
+
+
+def choose_model(task: str, input_tokens: int, context_tokens: int = None) -> str:
+    """
+    Pick the model for a task. input_tokens is the size the policy is judged
+    on; context_tokens (default input_tokens) must also fit the fast model.
+    """
+    if not MODEL_ROUTING:
+        return LARGE_MODEL
+    rule = POLICY.get(task, {})
+    if input_tokens > rule.get("fast_max_tokens", 0):
+        return LARGE_MODEL
+    if (context_tokens or input_tokens) > prompt_budget.input_budget(FAST_MODEL):
+        return LARGE_MODEL
+    return FAST_MODEL
+
+
+def message_tokens(messages: list) -> int:
+    return sum(
+        prompt_budget.estimate_tokens(m["content"]) + prompt_budget.MESSAGE_OVERHEAD_TOKENS
+        for m in messages
+    )
+
+
+def _structured(task: str, model: str, schema: dict) -> dict:
+    """The response_format option for schema on model, or {} where it is not sent."""
+    if schema is None or not GROK_STRUCTURED_OUTPUTS:
+        return {}
+    with _stats_lock:
+        if _unstructured_models.get(model, 0.0) > time.monotonic():
+            return {}
+    return {"response_format": json_schema.response_format(schema.get("title", task), schema)}
+
+
+def _schema_rejected(error: requests.HTTPError, model: str) -> bool:
+    """
+    True (and model is sent no schemas for STRUCTURED_RETRY_SEC) if the API
+    refused the request because of its response_format.
+    """
+    response = error.response
+    if getattr(response, "status_code", None) not in SCHEMA_REJECTED_STATUSES:
+        return False
+    try:
+        body = response.text.lower()
+    except (RuntimeError, ValueError):
+        return False
+    if not any(marker in body for marker in SCHEMA_ERROR_MARKERS):
+        return False
+    with _stats_lock:
+        _unstructured_models[model] = time.monotonic() + STRUCTURED_RETRY_SEC
+    return True
+
+
+def _chat(task: str, messages: list, model: str, schema: dict, validate, options: dict) -> str:
+    _count_call(task, model)
+    structured = _structured(task, model, schema)
+    try:
+        return grok_client.chat_completion(messages, model=model, validate=validate, **options, **structured)
+    except requests.HTTPError as e:
+        if not structured or not _schema_rejected(e, model):
+            raise
+        return grok_client.chat_completion(messages, model=model, validate=validate, **options)
+
+
+def complete(task: str, messages: list, model: str = None, validate=None, schema: dict = None, **options) -> str:
+    """
+    Run one chat completion for a task and return the reply text.
+
+    model skips routing (e.g. when a prompt plan already chose one). validate
+    is called with the reply and should raise ValueError if it is unusable;
+    fast-model replies that fail (or are empty) are retried on the large model,
+    and no reply that fails is cached (see grok_client). schema, a JSON schema the reply should match, is sent as structured-output
+    format where the model supports it.
+    """
+    if model is None:
+        model = choose_model(task, message_tokens(messages))
+    reply = _chat(task, messages, model, schema, validate, options)
+    if model == LARGE_MODEL or not POLICY.get(task, {}).get("escalate", True):
+        return reply
+
+    try:
+        if not reply.strip():
+            raise ValueError("Empty reply.")
+        if validate:
+            validate(reply)
+        return reply
+    except ValueError:
+        with _stats_lock:
+            _escalations[task] = _escalations.get(task, 0) + 1
+        return _chat(task, messages, LARGE_MODEL, schema, validate, options)
+
+
+def stream(task: str, messages: list, model: str = None, schema: dict = None, validate=None, **options):
+    """
+    Like complete(), but yields the reply in pieces. validate is only used to
+    keep failing replies out of the cache; checking them is left to the caller.
+    """
+    if model is None:
+        model = choose_model(task, message_tokens(messages))
+    _count_call(task, model)
+    structured = _structured(task, model, schema)
+    pieces = grok_client.stream_chat_completion(messages, model=model, validate=validate, **options, **structured)
+    if structured:
+        # A refused response_format fails before the first piece arrives
+        try:
+            first = next(pieces, None)
+        except requests.HTTPError as e:
+            if not _schema_rejected(e, model):
+                raise
+            pieces = grok_client.stream_chat_completion(messages, model=model, validate=validate, **options)
+        else:
+            if first is None:
+                return
+            yield first
+    yield from pieces
+
+
+def plan_for_task(task: str, system_prompt: str, content: str, strategy: str = None,
+                  budget: int = None) -> prompt_budget.PromptPlan:
+    """Plan a prompt on the large model, moving it to the fast model if the policy allows."""
+    plan = prompt_budget.plan_prompt(system_prompt, content, LARGE_MODEL, strategy=strategy, budget=budget)
+    if plan.strategy != "send":
+        return plan
+    model = choose_model(task, plan.system_tokens + plan.input_tokens)
+    if model == plan.model:
+        return plan
+    return prompt_budget.PromptPlan(
+        model, plan.strategy, system_prompt, plan.parts, plan.system_tokens, plan.input_tokens,
+        prompt_budget.input_budget(model, budget),
+    )
+
+
+def preview_for_task(task: str, system_prompt: str, content_tokens: int, strategy: str = None,
+                     budget: int = None) -> dict:
+    """prompt_budget.preview_plan for the model the task would be routed to."""
+    system_tokens = prompt_budget.estimate_tokens(system_prompt)
+    model = choose_model(task, system_tokens + content_tokens)
+    return prompt_budget.preview_plan(system_prompt, content_tokens, model, strategy=strategy, budget=budget)
+
+
+def plan_sender(task: str, plan: prompt_budget.PromptPlan, validate=None, user_prefix: str = ""):
+    """
+    send(system_prompt, content) function for prompt_budget.run_plan: the
+    plan's own calls use its model, chunk summaries are routed as "summary".
+    """
+    def send(system_prompt: str, content: str) -> str:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prefix + content},
+        ]
+        if system_prompt == prompt_budget.SUMMARY_PROMPT:
+            return complete("summary", messages)
+        return complete(task, messages, model=plan.model, validate=validate)
+
+    return send
@@ -0,0 +1,342 @@
+"""
+Token-budget-aware prompt assembly.
+
+Estimates the token count of a system prompt plus input locally, before
+anything is uploaded, and picks a plan when the input does not fit the
+model's budget:
+
+    send       - fits as-is
+    truncate   - keep the start and end of the transcript, drop the middle
+    chunk      - split at speaker turns and run one call per chunk
+    summarize  - condense each chunk first, then run one call on the summaries
+    fail       - refuse up front instead of failing after a long upload
+
+Each plan carries an estimated token count and cost so callers can show it
+to the user before the request is made.
+"""
+
+import re
+import math
+
+import config
+from transcript_model import Transcript
+
+# Optional exact tokenizer; falls back to a calibrated word/punctuation estimate
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+    TIKTOKEN_AVAILABLE = True
+except Exception:
+    _ENCODING = None
+    TIKTOKEN_AVAILABLE = False
+
+# Context window per model, in tokens
+MODEL_CONTEXT_TOKENS = {
+    "grok-4-0709": 256_000,
+    "grok-4": 256_000,
+    "grok-3-mini": 131_072,
+}
+DEFAULT_CONTEXT_TOKENS = 128_000
+
+# USD per million (input, output) tokens
+MODEL_PRICING = {
+    "grok-4-0709": (3.00, 15.00),
+    "grok-4": (3.00, 15.00),
+    "grok-3-mini": (0.30, 0.50),
+}
+DEFAULT_PRICING = (3.00, 15.00)
+
+# Room left for the model's reply
+OUTPUT_TOKEN_RESERVE = int(config.get("OUTPUT_TOKEN_RESERVE", "16000"))
+# Optional hard cap on input tokens, below the model's context window
+PROMPT_TOKEN_BUDGET = int(config.get("PROMPT_TOKEN_BUDGET", "0")) or None
+OVER_BUDGET_STRATEGY = config.get("OVER_BUDGET_STRATEGY", "chunk")
+
+EXPECTED_OUTPUT_TOKENS = 4000  # typical report length, for cost estimates
+SUMMARY_OUTPUT_TOKENS = 1500  # typical chunk summary length
+MESSAGE_OVERHEAD_TOKENS = 8  # role/formatting tokens per chat message
+
+STRATEGIES = ("send", "truncate", "chunk", "summarize", "fail")
+
+SUMMARY_PROMPT = """
+You are condensing one part of a longer conversation transcript so that it can be
+analyzed as a whole later.
+
+Keep, in order:
+- who is speaking and what they want,
+- emotional shifts, hesitations, triggers and notable exact phrases (quote them),
+- decisions, disagreements, commitments and open questions.
+
+Drop small talk and repetition. Do not analyze or interpret yet. Return plain text
+of at most ~800 words.
+""".strip()
+
+SUMMARY_HEADER = (
+    "The transcript was too long to send in one request, so it was condensed part by part. "
+    "Below are the condensed parts, in order.\n\n"
+)
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class PromptBudgetError(Exception):
+    """Raised when a prompt does not fit the budget and the plan is to fail."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text locally."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    # Roughly 1.3 BPE tokens per English word, one per punctuation mark
+    words = punctuation = 0
+    for token in _WORD_PATTERN.findall(text):
+        if token[0].isalnum() or token[0] == "_":
+            words += 1
+        else:
+            punctuation += 1
+    return math.ceil(words * 1.3 + punctuation)
+
+
+def input_budget(model: str, budget: int = None) -> int:
+    """Maximum input tokens (system prompt + content) for a model."""
+    limit = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS) - OUTPUT_TOKEN_RESERVE
+    for cap in (budget, PROMPT_TOKEN_BUDGET):
+        if cap:
+            limit = min(limit, cap)
+    return limit
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    price_in, price_out = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    return (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+
+def split_to_budget(text: str, max_tokens: int) -> list:
+    """Split text into parts of at most ~max_tokens, cutting at speaker-turn lines where possible."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    transcript = Transcript.parse(text)
+    parts, start, used = [], 0, 0
+    for i in range(len(transcript)):
+        turn_tokens = estimate_tokens(transcript.turn_text(i)) + MESSAGE_OVERHEAD_TOKENS
+        if used and used + turn_tokens > max_tokens:
+            # Cut at the start of the line holding this turn's speaker label
+            cut = text.rfind("\n", start, transcript.starts[i]) + 1 or transcript.starts[i]
+            if cut > start:
+                parts.append(text[start:cut])
+                start, used = cut, 0
+        used += turn_tokens
+    parts.append(text[start:])
+
+    # A single turn can still be longer than the budget; hard-split those by characters
+    result = []
+    for part in parts:
+        part_tokens = estimate_tokens(part)
+        if part_tokens <= max_tokens:
+            result.append(part)
+            continue
+        size = max(1, int(len(part) * max_tokens / part_tokens * 0.95))
+        result.extend(part[j : j + size] for j in range(0, len(part), size))
+    return [part for part in result if part.strip()]
+
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    """Keep the start and the end of text, dropping the middle, to fit max_tokens."""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    marker = "\n\n[... middle of the transcript omitted to fit the token budget ...]\n\n"
+    keep_chars = int(len(text) * (max_tokens - estimate_tokens(marker)) / total * 0.95)
+    head_chars = keep_chars * 2 // 3
+    tail_chars = keep_chars - head_chars
+    # Snap to line boundaries so turns are not cut mid-sentence
+    head_end = text.rfind("\n", 0, head_chars) + 1 or head_chars
+    tail_start = text.find("\n", len(text) - tail_chars)
+    tail_start = tail_start + 1 if tail_start != -1 else len(text) - tail_chars
+    return text[:head_end] + marker + text[tail_start:]
+
+
+class PromptPlan:
+    """How a prompt will be sent, with its token and cost estimates."""
+
+    def __init__(self, model: str, strategy: str, system_prompt: str, parts: list,
+                 system_tokens: int, input_tokens: int, budget: int):
+        self.model = model
+        self.strategy = strategy
+        self.system_prompt = system_prompt
+        self.parts = parts
+        self.system_tokens = system_tokens
+        self.input_tokens = input_tokens
+        self.budget = budget
+
+    @property
+    def fits(self) -> bool:
+        return self.strategy != "fail"
+
+    @property
+    def calls(self) -> int:
+        if self.strategy == "fail":
+            return 0
+        if self.strategy == "summarize":
+            return len(self.parts) + 1
+        return len(self.parts)
+
+    @property
+    def sent_tokens(self) -> int:
+        """Estimated input tokens across all calls of the plan."""
+        if self.strategy == "fail":
+            return 0
+        part_tokens = sum(estimate_tokens(part) for part in self.parts)
+        if self.strategy == "summarize":
+            summary_prompt = estimate_tokens(SUMMARY_PROMPT)
+            return (part_tokens + len(self.parts) * summary_prompt
+                    + self.system_tokens + len(self.parts) * SUMMARY_OUTPUT_TOKENS)
+        return part_tokens + len(self.parts) * self.system_tokens
+
+    @property
+    def output_tokens(self) -> int:
+        if self.strategy == "summarize":
+            return len(self.parts) * SUMMARY_OUTPUT_TOKENS + EXPECTED_OUTPUT_TOKENS
+        return self.calls * EXPECTED_OUTPUT_TOKENS
+
+    @property
+    def estimated_cost(self) -> float:
+        return estimate_cost(self.model, self.sent_tokens, self.output_tokens)
+
+    def describe(self) -> str:
+        total = self.system_tokens + self.input_tokens
+        head = f"~{total:,} input tokens (budget {self.budget:,}) for {self.model}"
+        if self.strategy == "send":
+            return f"{head}: 1 call, est. ${self.estimated_cost:.2f}"
+        if self.strategy == "fail":
+            return f"{head}: over budget by ~{total - self.budget:,} tokens; not sent"
+        detail = {
+            "truncate": "middle of the transcript dropped to fit",
+            "chunk": f"split into {len(self.parts)} parts analyzed separately",
+            "summarize": f"{len(self.parts)} parts condensed first, then analyzed together",
+        }[self.strategy]
+        return f"{head}: {detail}; {self.calls} call{'s' if self.calls != 1 else ''}, est. ${self.estimated_cost:.2f}"
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "strategy": self.strategy,
+            "system_tokens": self.system_tokens,
+            "input_tokens": self.input_tokens,
+            "budget": self.budget,
+            "calls": self.calls,
+            "sent_tokens": self.sent_tokens,
+            "estimated_cost": round(self.estimated_cost, 4),
+            "fits": self.fits,
+            "description": self.describe(),
+        }
+
+
+def plan_prompt(system_prompt: str, content: str, model: str, strategy: str = None,
+                budget: int = None) -> PromptPlan:
+    """Estimate a prompt's size and choose how to send it within the model's budget."""
+    strategy = strategy or OVER_BUDGET_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown over-budget strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}")
+
+    limit = input_budget(model, budget)
+    system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+    content_tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    available = limit - system_tokens
+
+    def plan(chosen, parts):
+        return PromptPlan(model, chosen, system_prompt, parts, system_tokens, content_tokens, limit)
+
+    if content_tokens <= available:
+        return plan("send", [content])
+    if strategy in ("send", "fail") or available <= 0:
+        return plan("fail", [])
+    if strategy == "truncate":
+        return plan("truncate", [truncate_to_budget(content, available)])
+    if strategy == "summarize":
+        summary_available = limit - estimate_tokens(SUMMARY_PROMPT) - MESSAGE_OVERHEAD_TOKENS
+        parts = split_to_budget(content, summary_available)
+        # The condensed parts must themselves fit in the final call
+        if len(parts) * SUMMARY_OUTPUT_TOKENS > available:
+            return plan("fail", [])
+        return plan("summarize", parts)
+    return plan("chunk", split_to_budget(content, available))
+
+
+def preview_plan(system_prompt: str, content_tokens: int, model: str, strategy: str = None,
+                 budget: int = None) -> dict:
+    """
+    Predict the plan for content of a known token count without the content
+    itself (e.g. audio that has not been transcribed yet).
+    """
+    strategy = strategy or OVER_BUDGET_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown over-budget strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}")
+
+    limit = input_budget(model, budget)
+    system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+    available = limit - system_tokens
+    total = system_tokens + content_tokens
+
+    if content_tokens <= available:
+        chosen, calls, sent, output = "send", 1, total, EXPECTED_OUTPUT_TOKENS
+    elif strategy in ("send", "fail") or available <= 0:
+        chosen, calls, sent, output = "fail", 0, 0, 0
+    elif strategy == "truncate":
+        chosen, calls, sent, output = "truncate", 1, limit, EXPECTED_OUTPUT_TOKENS
+    else:
+        parts = math.ceil(content_tokens / available)
+        chosen, calls = strategy, parts
+        sent = content_tokens + parts * system_tokens
+        output = parts * EXPECTED_OUTPUT_TOKENS
+        if strategy == "summarize":
+            calls = parts + 1
+            sent = (content_tokens + parts * estimate_tokens(SUMMARY_PROMPT)
+                    + system_tokens + parts * SUMMARY_OUTPUT_TOKENS)
+            output = parts * SUMMARY_OUTPUT_TOKENS + EXPECTED_OUTPUT_TOKENS
+
+    cost = estimate_cost(model, sent, output)
+    if chosen == "fail":
+        description = f"~{total:,} input tokens (budget {limit:,}) for {model}: over budget by ~{total - limit:,} tokens; not sent"
+    else:
+        description = f"~{total:,} input tokens (budget {limit:,}) for {model}: {chosen}, {calls} call{'s' if calls != 1 else ''}, est. ${cost:.2f}"
+    return {
+        "model": model,
+        "strategy": chosen,
+        "system_tokens": system_tokens,
+        "input_tokens": content_tokens,
+        "budget": limit,
+        "calls": calls,
+        "sent_tokens": sent,
+        "estimated_cost": round(cost, 4),
+        "fits": chosen != "fail",
+        "description": description,
+    }
+
+
+def run_plan(plan: PromptPlan, send, join_parts=None):
+    """
+    Execute a plan. send(system_prompt, user_content) performs one model call
+    and returns its text; join_parts combines per-chunk results for "chunk"
+    plans (defaults to joining them under "## Part i of n" headings).
+    """
+    if plan.strategy == "fail":
+        raise PromptBudgetError(f"Prompt too large: {plan.describe()}")
+    if plan.strategy in ("send", "truncate"):
+        return send(plan.system_prompt, plan.parts[0])
+    if plan.strategy == "summarize":
+        summaries = [send(SUMMARY_PROMPT, part) for part in plan.parts]
+        condensed = "\n\n".join(
+            f"[Part {i} of {len(summaries)}]\n{summary}" for i, summary in enumerate(summaries, 1)
+        )
+        return send(plan.system_prompt, SUMMARY_HEADER + condensed)
+
+    results = [send(plan.system_prompt, part) for part in plan.parts]
+    if join_parts:
+        return join_parts(results)
+    return "\n\n".join(
+        f"## Part {i} of {len(results)}\n\n{result}" for i, result in enumerate(results, 1)
+    )
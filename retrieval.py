@@ -0,0 +1,292 @@
+"""
+Local embedding index for retrieval-augmented superagent replies.
+
+Transcripts are split into chunks of whole speaker turns (a turn too long
+for one chunk, such as an unlabeled transcript, into overlapping word
+windows), embedded with
+hashed TF-IDF vectors (CPU-only, no model download) and appended to a
+float32 matrix on disk that is memory-mapped at query time. The superagent
+retrieves only the top-k excerpts relevant to each turn instead of carrying
+whole conversations in its prompt.
+
+Appending only reads stats.json (document frequencies, chunk count and
+indexed documents); chunk texts are loaded on the first query, and queries
+scan the matrix in blocks of QUERY_BLOCK_ROWS rows.
+
+Usage:
+    python3 retrieval.py build transcript1.txt transcript2.txt
+    python3 retrieval.py query "how do I handle the budget conversation"
+"""
+
+import os
+import re
+import sys
+import json
+import zlib
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+
+import config
+import file_lock
+from transcript_model import Transcript, load_transcript
+
+RETRIEVAL_INDEX_DIR = config.get("RETRIEVAL_INDEX_DIR", "retrieval_index")
+EMBEDDING_DIM = 2048  # hashed feature space; changing it requires a rebuild
+CHUNK_WORDS = 180  # target chunk size, in words
+CHUNK_OVERLAP_WORDS = 30  # words shared by consecutive windows of one long turn
+TOP_K = 4
+QUERY_BLOCK_ROWS = 4096  # matrix rows scored at a time (8 MB of float32 per 1024 rows)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+WORD_PATTERN = re.compile(r"\S+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has",
+    "have", "i", "in", "is", "it", "its", "of", "on", "or", "so", "that", "the",
+    "this", "to", "was", "we", "were", "with", "you", "um", "uh", "like", "just",
+}
+
+_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS and len(t) > 1]
+
+
+def hashed_tf(text: str) -> np.ndarray:
+    """Sublinear term-frequency vector in the hashed feature space (signed hashing trick)."""
+    vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for token in tokenize(text):
+        h = zlib.crc32(token.encode("utf-8"))
+        vec[h % EMBEDDING_DIM] += 1.0 if (h >> 31) & 1 else -1.0
+    return np.sign(vec) * np.log1p(np.abs(vec))
+
+
+def word_windows(text: str, chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> list:
+    """Slices of text of chunk_words words, each starting overlap words before the previous one ends."""
+    spans = [match.span() for match in WORD_PATTERN.finditer(text)]
+    step = max(1, chunk_words - overlap)
+    windows = []
+    for first in range(0, len(spans), step):
+        last = min(first + chunk_words, len(spans)) - 1
+        windows.append(text[spans[first][0] : spans[last][1]])
+        if last == len(spans) - 1:
+            break
+    return windows
+
+
+def chunk_transcript(transcript: Transcript, chunk_words: int = CHUNK_WORDS,
+                     overlap: int = CHUNK_OVERLAP_WORDS) -> list:
+    """
+    Pack whole speaker turns into chunks of roughly chunk_words words, sliced
+    straight from the buffer. A turn longer than chunk_words gets chunks of
+    its own: word windows overlapping by overlap words.
+    """
+    chunks, first, count = [], 0, 0
+    for i in range(len(transcript)):
+        text = transcript.turn_text(i)
+        words = text.count(" ") + 1
+        if words > chunk_words:
+            if i > first:
+                chunks.append(transcript.window(first, i - 1))
+            chunks.extend(word_windows(text, chunk_words, overlap))
+            first, count = i + 1, 0
+            continue
+        if i > first and count + words > chunk_words:
+            chunks.append(transcript.window(first, i - 1))
+            first, count = i, 0
+        count += words
+    if first < len(transcript):
+        chunks.append(transcript.window(first, len(transcript) - 1))
+    return chunks
+
+
+class RetrievalIndex:
+    """Append-only hashed TF-IDF index stored under a directory."""
+
+    def __init__(self, index_dir: str = None):
+        self.index_dir = index_dir or RETRIEVAL_INDEX_DIR
+        self.vectors_path = os.path.join(self.index_dir, "vectors.f32")
+        self.chunks_path = os.path.join(self.index_dir, "chunks.jsonl")
+        self.stats_path = os.path.join(self.index_dir, "stats.json")
+        self.lock_path = os.path.join(self.index_dir, ".lock")
+        self._load()
+
+    def _stats_stamp(self):
+        try:
+            stat = os.stat(self.stats_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """Read stats.json; chunk texts are left on disk until a query needs them."""
+        self.n_chunks = 0
+        self.doc_hashes = set()
+        self.doc_freq = np.zeros(EMBEDDING_DIM, dtype=np.float64)
+        self._stamp = self._stats_stamp()
+        if self._stamp is not None:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            if stats.get("dim") != EMBEDDING_DIM:
+                raise ValueError(
+                    f"{self.index_dir} was built with dim={stats.get('dim')}; delete it and rebuild."
+                )
+            self.doc_freq = np.asarray(stats["doc_freq"], dtype=np.float64)
+            if "n_chunks" in stats:
+                self.n_chunks = stats["n_chunks"]
+                self.doc_hashes = set(stats["doc_hashes"])
+            else:
+                # Written before the counts were kept in stats.json
+                for chunk in self._read_chunks():
+                    self.n_chunks += 1
+                    self.doc_hashes.add(chunk["doc_hash"])
+        self._chunks = None
+        self._matrix = None
+
+    def _read_chunks(self):
+        try:
+            with open(self.chunks_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def __len__(self):
+        return self.n_chunks
+
+    @property
+    def chunks(self) -> list:
+        """Chunk records (source_file, doc_hash, position, text), loaded on first use."""
+        if self._chunks is None or len(self._chunks) < self.n_chunks:
+            chunks = []
+            for chunk in self._read_chunks():
+                if len(chunks) == self.n_chunks:
+                    break  # appended by another process after stats.json was read
+                chunks.append(chunk)
+            self._chunks = chunks
+        return self._chunks
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Memory-mapped (n_chunks, EMBEDDING_DIM) matrix of stored TF vectors."""
+        if self._matrix is None or self._matrix.shape[0] != self.n_chunks:
+            if not self.n_chunks:
+                return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(self.n_chunks, EMBEDDING_DIM)
+            )
+        return self._matrix
+
+    def idf(self) -> np.ndarray:
+        n = self.n_chunks
+        return (np.log((1.0 + n) / (1.0 + self.doc_freq)) + 1.0).astype(np.float32)
+
+    def add_transcript(self, text, source_file: str) -> int:
+        """
+        Chunk, embed and append a transcript (text or Transcript).
+        Returns the number of chunks added (0 if already indexed).
+        """
+        transcript = text if isinstance(text, Transcript) else Transcript.parse(text)
+        doc_hash = hashlib.sha1(transcript.text.encode("utf-8")).hexdigest()[:16]
+        with _lock, file_lock.locked(self.lock_path):
+            # Another process may have appended since this instance loaded
+            if self._stats_stamp() != self._stamp:
+                self._load()
+            if doc_hash in self.doc_hashes:
+                return 0
+            chunks = chunk_transcript(transcript)
+            if not chunks:
+                return 0
+
+            vectors = np.vstack([hashed_tf(chunk) for chunk in chunks]).astype(np.float32)
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.chunks_path, "a", encoding="utf-8") as f:
+                for i, chunk in enumerate(chunks):
+                    record = {"source_file": source_file, "doc_hash": doc_hash, "position": i, "text": chunk}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    if self._chunks is not None:
+                        self._chunks.append(record)
+
+            self.n_chunks += len(chunks)
+            self.doc_hashes.add(doc_hash)
+            self.doc_freq += (vectors != 0).sum(axis=0)
+            tmp_path = self.stats_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "dim": EMBEDDING_DIM,
+                    "doc_freq": self.doc_freq.tolist(),
+                    "n_chunks": self.n_chunks,
+                    "doc_hashes": sorted(self.doc_hashes),
+                }, f)
+            os.replace(tmp_path, self.stats_path)
+            self._stamp = self._stats_stamp()
+            self._matrix = None
+            return len(chunks)
+
+    def query(self, text: str, k: int = TOP_K) -> list:
+        """Return up to k chunk records most similar to text, each with a 'score'."""
+        matrix = self.matrix
+        if matrix.shape[0] == 0:
+            return []
+        query_vec = hashed_tf(text)
+        if not query_vec.any():
+            return []
+
+        # Cosine similarity between idf-weighted vectors, computed a block of
+        # rows at a time so only QUERY_BLOCK_ROWS rows are ever in memory
+        idf_sq = self.idf() ** 2
+        weighted_query = query_vec * idf_sq
+        query_norm = np.sqrt(np.dot(query_vec * query_vec, idf_sq))
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], QUERY_BLOCK_ROWS):
+            block = np.asarray(matrix[start : start + QUERY_BLOCK_ROWS])
+            row_norms = np.sqrt(np.square(block) @ idf_sq)
+            scores[start : start + len(block)] = (block @ weighted_query) / np.maximum(row_norms * query_norm, 1e-9)
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.chunks[i], score=float(scores[i])) for i in top if scores[i] > 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or query the local transcript retrieval index."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Add transcripts to the index.")
+    build.add_argument("transcripts", nargs="+", help="Paths to transcript text files.")
+
+    query = subparsers.add_parser("query", help="Show the excerpts retrieved for a question.")
+    query.add_argument("text", help="Question or situation to retrieve context for.")
+    query.add_argument("-k", type=int, default=TOP_K, help="Number of excerpts.")
+
+    parser.add_argument("--index-dir", type=str, default=None, help="Index directory.")
+    args = parser.parse_args()
+
+    index = RetrievalIndex(args.index_dir)
+
+    if args.command == "build":
+        for path in args.transcripts:
+            added = index.add_transcript(load_transcript(path), path)
+            print(f"{path}: {added} chunk{'s' if added != 1 else ''} added")
+        print(f"Index now holds {len(index)} chunks in {index.index_dir}")
+    else:
+        results = index.query(args.text, k=args.k)
+        if not results:
+            print("No relevant excerpts.")
+            sys.exit(0)
+        for r in results:
+            print(f"[{r['score']:.3f}] {r['source_file']} #{r['position']}")
+            print(f"    {r['text'][:300]}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Local full-text search over everything HumanIntuition.ai has processed.
+
+Transcripts, Grok analyses, emotional maps and profiles are written into a
+single SQLite FTS5 table as they are produced, so past conversations can be
+queried by text, speaker, inferred emotion, date and source file without
+re-running any models. A document is one kind of output under one key: a
+digest of its content unless the caller passes a stable id (such as a run
+id), so different conversations uploaded under the same file name never
+collide, and indexing a key again replaces its rows. Rows are found by
+rowid through the document_rows table (FTS5 cannot index its doc_id
+column); source_file is only shown and filtered on.
+
+Usage:
+    python3 search_index.py "deadline"
+    python3 search_index.py --emotion anxious --speaker B
+    python3 search_index.py budget --file call1.txt --since 2024-01-01
+"""
+
+import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import config
+from transcript_model import Transcript
+
+SEARCH_INDEX_PATH = config.get("SEARCH_INDEX_PATH", "search_index.db")
+
+# Document kinds stored in the index
+KIND_TRANSCRIPT = "transcript"
+KIND_ANALYSIS = "analysis"
+KIND_EMOTIONAL_MAP = "emotional_map"
+KIND_PROFILE = "profile"
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    content,
+    speaker,
+    emotions,
+    source_file,
+    kind UNINDEXED,
+    doc_id UNINDEXED,
+    position UNINDEXED,
+    created_at UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS document_rows (
+    row INTEGER PRIMARY KEY,  -- rowid in documents
+    doc_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS document_rows_doc_id ON document_rows (doc_id);
+"""
+SCHEMA_VERSION = 1  # PRAGMA user_version once document_rows is filled in
+
+_write_lock = threading.Lock()
+
+
+def _connect(db_path: str = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path or SEARCH_INDEX_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _migrate(conn)
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection):
+    """Map the rows of an index written before document_rows existed to documents keyed by their source."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return  # another process got there first
+        rows = conn.execute("SELECT rowid, kind, source_file FROM documents").fetchall()
+        conn.execute("DELETE FROM document_rows")
+        conn.executemany(
+            "INSERT INTO document_rows (row, doc_id) VALUES (?, ?)",
+            [(row[0], _doc_id(row[1], row[2])) for row in rows],
+        )
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _doc_id(kind: str, key: str) -> str:
+    digest = hashlib.sha1(f"{kind}\0{key}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def content_key(value) -> str:
+    """Default document key: a digest of the indexed text (or JSON-serializable value)."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _quote(value: str) -> str:
+    """Quote a value as an FTS5 string literal."""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _write_rows(kind: str, source_file: str, key: str, rows: list, db_path: str = None) -> int:
+    """Replace all rows of the kind's document under key. rows are (content, speaker, emotions) tuples."""
+    doc_id = _doc_id(kind, key)
+    created_at = _now()
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                old_rows = [row[0] for row in conn.execute("SELECT row FROM document_rows WHERE doc_id = ?", (doc_id,))]
+                conn.executemany("DELETE FROM documents WHERE rowid = ?", [(row,) for row in old_rows])
+                conn.execute("DELETE FROM document_rows WHERE doc_id = ?", (doc_id,))
+                for position, (content, speaker, emotions) in enumerate(rows):
+                    cursor = conn.execute(
+                        "INSERT INTO documents (content, speaker, emotions, source_file, kind, doc_id, position, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (content, speaker, emotions, source_file, kind, doc_id, position, created_at),
+                    )
+                    conn.execute("INSERT INTO document_rows (row, doc_id) VALUES (?, ?)", (cursor.lastrowid, doc_id))
+        finally:
+            conn.close()
+    return len(rows)
+
+
+def index_transcript(text, source_file: str, db_path: str = None, key: str = None) -> int:
+    """
+    Index a transcript (text or Transcript), one row per speaker turn. Returns
+    the number of rows written. Like every index_* function, key identifies
+    the document (default: content_key of it) and source_file labels it.
+    """
+    transcript = text if isinstance(text, Transcript) else Transcript.parse(text)
+    rows = [(body, speaker, "") for speaker, body in transcript.speaker_turns()]
+    return _write_rows(KIND_TRANSCRIPT, source_file, key or content_key(transcript.text), rows, db_path)
+
+
+def index_analysis(text: str, source_file: str, db_path: str = None, key: str = None) -> int:
+    """Index a raw (markdown) Grok analysis report."""
+    return _write_rows(KIND_ANALYSIS, source_file, key or content_key(text), [(text, "", "")], db_path)
+
+
+def index_emotional_map(emo_map: dict, source_file: str, db_path: str = None, key: str = None) -> int:
+    """Index an emotional map: one row per timeline segment plus the global summary."""
+    rows = []
+    for segment in emo_map.get("timeline", []):
+        emotions = segment.get("inferred_emotions") or []
+        if isinstance(emotions, str):
+            emotions = [emotions]
+        content = "\n".join(
+            part for part in (segment.get("text_snippet", ""), segment.get("notes", "")) if part
+        )
+        rows.append((content, str(segment.get("speaker", "")), " ".join(emotions)))
+
+    summary = emo_map.get("global_summary") or {}
+    if summary:
+        content = "\n".join(
+            [summary.get("baseline_tone", ""), summary.get("regulation_style", "")]
+            + list(summary.get("key_triggers", []))
+        ).strip()
+        rows.append((content, "", " ".join(summary.get("main_emotions", []))))
+
+    return _write_rows(KIND_EMOTIONAL_MAP, source_file, key or content_key(emo_map), rows, db_path)
+
+
+def index_profile(profile: dict, source_file: str, db_path: str = None, key: str = None) -> int:
+    """Index a behavioral profile, one row per top-level key."""
+    rows = []
+    for key, value in profile.items():
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        rows.append((f"{key}: {text}", "", ""))
+    return _write_rows(KIND_PROFILE, source_file, key or content_key(profile), rows, db_path)
+
+
+def search(
+    query: str = None,
+    speaker: str = None,
+    emotion: str = None,
+    source_file: str = None,
+    kind: str = None,
+    since: str = None,
+    until: str = None,
+    limit: int = 20,
+    highlight: tuple = ("[", "]"),
+    db_path: str = None,
+) -> list:
+    """
+    Search the index.
+
+    query is an FTS5 expression over the text; speaker, emotion and source_file
+    are column filters; since/until are ISO dates (inclusive) on index time.
+    Returns a list of dicts ordered by relevance, each with a highlighted snippet.
+    """
+    match_parts = []
+    if query:
+        match_parts.append(f"content : ({query})")
+    if speaker:
+        match_parts.append(f"speaker : {_quote(speaker)}")
+    if emotion:
+        match_parts.append(f"emotions : {_quote(emotion)}")
+    if source_file:
+        match_parts.append(f"source_file : {_quote(source_file)}")
+
+    where, params = [], []
+    if match_parts:
+        where.append("documents MATCH ?")
+        params.append(" AND ".join(match_parts))
+    if kind:
+        where.append("kind = ?")
+        params.append(kind)
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        # Dates without a time component include the whole day
+        where.append("created_at <= ?")
+        params.append(until + "T23:59:59" if len(until) == 10 else until)
+
+    if match_parts:
+        snippet_sql = "snippet(documents, 0, ?, ?, '…', 16)"
+        snippet_params = list(highlight)
+        order_sql = "ORDER BY rank"
+    else:
+        snippet_sql = "substr(content, 1, 160)"
+        snippet_params = []
+        order_sql = "ORDER BY created_at DESC"
+
+    sql = (
+        f"SELECT {snippet_sql} AS snippet, speaker, emotions, source_file, kind, position, created_at "
+        f"FROM documents {'WHERE ' + ' AND '.join(where) if where else ''} {order_sql} LIMIT ?"
+    )
+
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(sql, snippet_params + params + [limit]).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search processed transcripts, analyses and emotional maps."
+    )
+    parser.add_argument("query", nargs="?", default=None, help="Full-text query (FTS5 syntax).")
+    parser.add_argument("--speaker", type=str, default=None, help="Filter by speaker label.")
+    parser.add_argument("--emotion", type=str, default=None, help="Filter by inferred emotion.")
+    parser.add_argument("--file", type=str, default=None, help="Filter by source file name.")
+    parser.add_argument(
+        "--kind",
+        type=str,
+        default=None,
+        choices=[KIND_TRANSCRIPT, KIND_ANALYSIS, KIND_EMOTIONAL_MAP, KIND_PROFILE],
+        help="Only return one kind of document.",
+    )
+    parser.add_argument("--since", type=str, default=None, help="Only documents indexed on/after this date (YYYY-MM-DD).")
+    parser.add_argument("--until", type=str, default=None, help="Only documents indexed on/before this date (YYYY-MM-DD).")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum number of results.")
+    parser.add_argument("--db", type=str, default=None, help="Path to the index database.")
+    args = parser.parse_args()
+
+    results = search(
+        query=args.query,
+        speaker=args.speaker,
+        emotion=args.emotion,
+        source_file=args.file,
+        kind=args.kind,
+        since=args.since,
+        until=args.until,
+        limit=args.limit,
+        db_path=args.db,
+    )
+
+    if not results:
+        print("No matches.")
+        return
+
+    for row in results:
+        label = f"{row['source_file']} [{row['kind']}]"
+        if row["speaker"]:
+            label += f" {row['speaker']}"
+        if row["emotions"]:
+            label += f" ({row['emotions']})"
+        print(f"{label} @ {row['created_at']}")
+        print(f"    {row['snippet']}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+State shared by every worker process and node: caches, leases and markers.
+
+One backend is chosen with SHARED_STATE (a URL):
+
+    file://shared_state         directory of files (default); shared by the
+                                workers of one host, or by several nodes
+                                when the directory is a network mount
+    redis://host:6379/0         any Redis-protocol server (pip install redis)
+    memory://                   this process only (tests, single-process runs)
+
+Callers use the namespaced helpers below rather than a backend directly.
+Backend failures (an unreachable Redis, a full disk) are counted and
+treated as cache misses, so an outage costs duplicate work, not uploads.
+
+single_flight() is how duplicate Whisper and Grok spend is avoided across
+nodes: the first caller for a key takes a lease and computes the value;
+callers elsewhere wait for it (polling, and honouring cancellation) and
+reuse the stored result. The holder renews its lease every third of
+SINGLE_FLIGHT_LEASE_SEC for as long as it computes, however long that is,
+so the lease only expires (and the next waiter takes over) when the holder
+has died. A holder only ever deletes a lease that is still its own.
+
+    transcript = shared_state.single_flight("transcription", audio_digest, transcribe, ttl=30 * 86400)
+"""
+
+import os
+import time
+import socket
+import hashlib
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+
+import config
+import cancellation
+
+try:
+    import redis
+except ImportError:
+    redis = None  # only needed for SHARED_STATE=redis://...
+
+SHARED_STATE = config.get("SHARED_STATE", "file://shared_state")
+SINGLE_FLIGHT_LEASE_SEC = float(config.get("SINGLE_FLIGHT_LEASE_SEC", "120"))  # without renewal before a holder counts as dead
+SINGLE_FLIGHT_POLL_SEC = 0.5
+PRUNE_INTERVAL_SEC = 3600
+NO_EXPIRY = 4102444800.0  # 2100-01-01, the stored expiry of keys without a TTL
+
+
+class MemoryBackend:
+    """Process-local stand-in with the same semantics as the shared backends."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}  # key -> (expires at, value)
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry and entry[0] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> str:
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key: str, value: str, ttl: float = None):
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else NO_EXPIRY, value)
+
+    def add(self, key: str, value: str, ttl: float = None) -> bool:
+        """Set key only if it does not exist; True if this call set it."""
+        with self._lock:
+            if self._live(key):
+                return False
+            self._data[key] = (time.time() + ttl if ttl else NO_EXPIRY, value)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def renew(self, key: str, value: str, ttl: float) -> bool:
+        """Reset key's ttl if it still holds value; True if it did."""
+        with self._lock:
+            entry = self._live(key)
+            if not entry or entry[1] != value:
+                return False
+            self._data[key] = (time.time() + ttl, value)
+            return True
+
+    def delete_if(self, key: str, value: str) -> bool:
+        """Delete key if it still holds value; True if it did."""
+        with self._lock:
+            entry = self._live(key)
+            if not entry or entry[1] != value:
+                return False
+            del self._data[key]
+            return True
+
+
+class FileBackend:
+    """
+    One file per key under root/<namespace>/, written atomically. A file's
+    mtime is its expiry time; add() creates with a hard link, which fails if
+    the key exists, on local disks and NFS alike.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._prune_lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def _path(self, key: str) -> str:
+        namespace = key.split(":", 1)[0] if ":" in key else "default"
+        return os.path.join(self.root, namespace, hashlib.sha256(key.encode("utf-8")).hexdigest()[:40])
+
+    def _write_tmp(self, path: str, value: str, ttl: float) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(value)
+        expires = time.time() + ttl if ttl else NO_EXPIRY
+        os.utime(tmp, (time.time(), expires))
+        return tmp
+
+    def get(self, key: str) -> str:
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) <= time.time():
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str, ttl: float = None):
+        path = self._path(key)
+        os.replace(self._write_tmp(path, value, ttl), path)
+        self._maybe_prune()
+
+    def add(self, key: str, value: str, ttl: float = None) -> bool:
+        path = self._path(key)
+        tmp = self._write_tmp(path, value, ttl)
+        try:
+            try:
+                os.link(tmp, path)
+                return True
+            except FileExistsError:
+                pass
+            try:
+                if os.path.getmtime(path) > time.time():
+                    return False
+                # Expired: move it aside (only one caller can) and try once more
+                os.rename(path, f"{tmp}.stale")
+                os.unlink(f"{tmp}.stale")
+            except FileNotFoundError:
+                pass
+            try:
+                os.link(tmp, path)
+                return True
+            except FileExistsError:
+                return False
+        finally:
+            os.unlink(tmp)
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    # Compare-then-act is not atomic here; a lease is only taken over after it
+    # expired, which a renewing holder does not let happen.
+
+    def renew(self, key: str, value: str, ttl: float) -> bool:
+        path = self._path(key)
+        if self.get(key) != value:
+            return False
+        try:
+            os.utime(path, (time.time(), time.time() + ttl))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def delete_if(self, key: str, value: str) -> bool:
+        if self.get(key) != value:
+            return False
+        try:
+            os.unlink(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        with self._prune_lock:
+            if now - self._pruned_at < PRUNE_INTERVAL_SEC:
+                return
+            self._pruned_at = now
+        cutoff = time.time()
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) <= cutoff:
+                        os.unlink(path)
+                except OSError:
+                    continue
+
+
+class RedisBackend:
+    """A Redis-protocol server; keys are prefixed with REDIS_KEY_PREFIX and expire natively."""
+
+    def __init__(self, url: str, prefix: str = None):
+        if redis is None:
+            raise ImportError("SHARED_STATE is a redis:// URL but the redis package is not installed (pip install redis).")
+        self.prefix = prefix if prefix is not None else config.get("REDIS_KEY_PREFIX", "humanintuition:")
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        # Compare-and-act in one step on the server
+        self._renew = self._client.register_script(
+            "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+        )
+        self._delete_if = self._client.register_script(
+            "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+        )
+
+    def get(self, key: str) -> str:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: float = None):
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: str, ttl: float = None) -> bool:
+        return bool(self._client.set(self.prefix + key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def renew(self, key: str, value: str, ttl: float) -> bool:
+        return bool(self._renew(keys=[self.prefix + key], args=[value, int(ttl * 1000)]))
+
+    def delete_if(self, key: str, value: str) -> bool:
+        return bool(self._delete_if(keys=[self.prefix + key], args=[value]))
+
+
+def make_backend(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme == "file":
+        return FileBackend(parsed.netloc + parsed.path)
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown SHARED_STATE backend: {url!r} (use file://, redis:// or memory://).")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_counters = {}  # namespace -> Counter
+
+
+def backend():
+    """The configured backend, created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend(SHARED_STATE)
+        return _backend
+
+
+def use_backend(new_backend):
+    """Replace the backend (e.g. MemoryBackend() in tests); returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, new_backend
+        return previous
+
+
+def _count(namespace: str, event: str):
+    with _stats_lock:
+        _counters.setdefault(namespace, Counter())[event] += 1
+
+
+def _safely(namespace: str, operation, *args, default=None):
+    try:
+        return operation(*args)
+    except Exception:
+        _count(namespace, "errors")
+        return default
+
+
+def get(namespace: str, key: str) -> str:
+    """The stored value, or None if missing, expired or the backend is unavailable."""
+    return _safely(namespace, lambda: backend().get(f"{namespace}:{key}"))
+
+
+def put(namespace: str, key: str, value: str, ttl: float = None):
+    _safely(namespace, lambda: backend().set(f"{namespace}:{key}", value, ttl))
+
+
+def delete(namespace: str, key: str):
+    _safely(namespace, lambda: backend().delete(f"{namespace}:{key}"))
+
+
+def single_flight(namespace: str, key: str, compute, ttl: float = None, keep=None) -> str:
+    """
+    The stored value for key, or compute() stored for ttl seconds. While one
+    caller (on any node) is computing it, the others wait for its result
+    instead of computing it too. compute() must return a string; if
+    keep(value) is false, the value is returned but not stored.
+    """
+    store_key = f"{namespace}:{key}"
+    lease_key = f"lease:{store_key}"
+    # Unique per call (two threads of one process may hold different keys);
+    # host and pid are for inspecting a stuck lease
+    holder = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}:{time.time_ns()}"
+    waited = False
+    while True:
+        value = _safely(namespace, lambda: backend().get(store_key))
+        if value is not None:
+            _count(namespace, "shared" if waited else "hits")
+            return value
+        # If the backend is down, everyone computes for themselves
+        if _safely(namespace, lambda: backend().add(lease_key, holder, SINGLE_FLIGHT_LEASE_SEC), default=True):
+            break
+        waited = True
+        while _safely(namespace, lambda: backend().get(lease_key)) is not None:
+            cancellation.check()
+            time.sleep(SINGLE_FLIGHT_POLL_SEC)
+            if _safely(namespace, lambda: backend().get(store_key)) is not None:
+                break
+    _count(namespace, "misses")
+    done = threading.Event()
+    heartbeat = threading.Thread(
+        target=_renew_lease, args=(namespace, lease_key, holder, done), name="single-flight-lease", daemon=True
+    )
+    heartbeat.start()
+    try:
+        value = compute()
+        if keep is None or keep(value):
+            _safely(namespace, lambda: backend().set(store_key, value, ttl))
+        return value
+    finally:
+        done.set()
+        heartbeat.join()
+        _safely(namespace, lambda: backend().delete_if(lease_key, holder))
+
+
+def _renew_lease(namespace: str, lease_key: str, holder: str, done: threading.Event):
+    """Keep holder's lease alive until done is set (or the lease turns out to be lost)."""
+    while not done.wait(SINGLE_FLIGHT_LEASE_SEC / 3):
+        if not _safely(namespace, lambda: backend().renew(lease_key, holder, SINGLE_FLIGHT_LEASE_SEC), default=True):
+            _count(namespace, "leases_lost")
+            return
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {"backend": type(_backend).__name__ if _backend else None,
+                **{namespace: dict(counts) for namespace, counts in _counters.items()}}
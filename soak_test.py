@@ -0,0 +1,175 @@
+"""
+Memory soak test of the upload pipeline against a mock upstream.
+
+Runs the web app in-process and posts uploads to it thousands of times:
+one audio and two text files per iteration, cycling through the combined
+report, per-file (streamed) reports and reports with an emotional map. Grok
+is replaced by a local mock server speaking the chat-completions API
+(streamed and not), and the Whisper API by a stub that reads the uploaded
+file, so no real API is called. Every store (checkpoints, search index,
+analytics, shared state) goes to a temporary directory, and the Grok cache
+is off so every iteration does the full work.
+
+After a warm-up, the process RSS is sampled as it runs; the test fails
+(exit status 1) if it grew by more than --max-growth-mb. With --trace, the
+allocation sites that grew most are printed at the end.
+
+Usage:
+    python3 soak_test.py --iterations 2000
+"""
+
+import os
+import gc
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The app's modules read their settings at import, so they are imported in
+# main() once isolated_settings() is in place
+
+MOCK_REPORT = "# Conversation Report\n\n## Patterns\n\n" + "\n".join(
+    f"- **Pattern {i}:** the speakers return to the same concern with rising intensity." for i in range(40)
+)
+MOCK_EMOTION_MAP = {
+    "timeline": [
+        {"segment_id": i, "text_snippet": f"turn {i}", "approx_position": "middle", "speaker": "A",
+         "inferred_emotions": ["calm", "curious"], "intensity": 0.4, "notes": ""}
+        for i in range(1, 9)
+    ],
+    "global_summary": {"main_emotions": ["calm"], "key_triggers": ["deadlines"], "reflection_prompts": ["What changed?"]},
+}
+
+
+def isolated_settings() -> str:
+    """Point every store at a new temporary directory and turn the Grok cache off; returns the directory."""
+    workdir = tempfile.mkdtemp(prefix="humanintuition-soak-")
+    os.environ.update({
+        "CHECKPOINT_DIR": os.path.join(workdir, "checkpoints"),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search_index.db"),
+        "RETRIEVAL_INDEX_DIR": os.path.join(workdir, "retrieval_index"),
+        "EMOTION_ANALYTICS_DIR": os.path.join(workdir, "emotion_analytics"),
+        "SHARED_STATE": f"file://{os.path.join(workdir, 'shared_state')}",
+        "GROK_CACHE": "0",
+        "AUDIO_PREPROCESSING": "0",
+    })
+    os.environ.setdefault("XAI_API_KEY", "soak-test")  # never sent anywhere but the mock
+    return workdir
+
+
+class MockGrok(BaseHTTPRequestHandler):
+    """Answers chat completions with a fixed report (and emotional map when the prompt asks for one)."""
+
+    emotion_map_delimiter = None  # set in main()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        system = " ".join(m["content"] for m in payload["messages"] if m["role"] == "system")
+        reply = MOCK_REPORT
+        if self.emotion_map_delimiter in system:
+            reply += f"\n\n{self.emotion_map_delimiter}\n{json.dumps(MOCK_EMOTION_MAP)}"
+        elif "JSON" in system:
+            reply = json.dumps(MOCK_EMOTION_MAP)
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for start in range(0, len(reply), 400):
+                chunk = {"choices": [{"delta": {"content": reply[start:start + 400]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+        else:
+            body = json.dumps({"choices": [{"message": {"content": reply}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def stub_transcribe(audio_path: str) -> str:
+    with open(audio_path, "rb") as f:
+        size = len(f.read())
+    return "\n".join(f"Speaker {i % 2 + 1}: I keep coming back to this ({size} bytes, line {i})." for i in range(60))
+
+
+def make_upload(iteration: int) -> dict:
+    """Form data for one iteration; contents differ per iteration so nothing is deduplicated."""
+    text = "\n".join(f"Alex: part {iteration}, line {i}, how did that land?\nSam: it felt rushed." for i in range(80))
+    modes = ({}, {"mode": "per_file"}, {"emotions": "1"})
+    return {
+        **modes[iteration % len(modes)],
+        "files": [
+            (io.BytesIO(os.urandom(16) + bytes(4096)), f"call-{iteration}.wav"),
+            (io.BytesIO(text.encode("utf-8")), f"notes-{iteration}.txt"),
+            (io.BytesIO(text[::-1].encode("utf-8")), f"chat-{iteration}.txt"),
+        ],
+    }
+
+
+def run_iteration(client, iteration: int):
+    response = client.post("/", data=make_upload(iteration), content_type="multipart/form-data")
+    body = response.get_data()  # drains streamed pages
+    response.close()
+    if response.status_code != 200 or b"Unexpected error" in body:
+        raise RuntimeError(f"Iteration {iteration}: HTTP {response.status_code}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the upload pipeline repeatedly and check memory stays bounded.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100, help="Iterations before the RSS baseline is taken.")
+    parser.add_argument("--max-growth-mb", type=float, default=64, help="Allowed RSS growth after warm-up.")
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--trace", action="store_true", help="Trace allocations (slow) and print the top growth.")
+    args = parser.parse_args()
+
+    workdir = isolated_settings()
+    import memory_diagnostics
+    import grok_client
+    import transcription
+    from app import app
+    from emotional_mapping import EMOTION_MAP_DELIMITER
+
+    MockGrok.emotion_map_delimiter = EMOTION_MAP_DELIMITER
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGrok)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    grok_client.XAI_URL = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    transcription.router.primary = stub_transcribe
+    client = app.test_client()
+
+    baseline = None
+    started = time.monotonic()
+    for iteration in range(1, args.iterations + 1):
+        run_iteration(client, iteration)
+        if iteration == min(args.warmup, args.iterations):
+            gc.collect()
+            baseline = memory_diagnostics.rss_bytes()
+            if args.trace:
+                memory_diagnostics.snapshot()
+        if iteration % args.sample_every == 0:
+            rss = memory_diagnostics.rss_bytes()
+            print(f"{iteration:>6} iterations  {time.monotonic() - started:7.1f}s  RSS {rss / 2**20:7.1f} MB"
+                  f"  (+{(rss - baseline) / 2**20 if baseline else 0:.1f} MB since warm-up)")
+
+    gc.collect()
+    growth_mb = (memory_diagnostics.rss_bytes() - baseline) / 2**20
+    if args.trace:
+        print("\nTop allocation growth since warm-up:")
+        for site in memory_diagnostics.diff()[:10]:
+            print(f"  {site['size_diff_kb']:>+10.1f} KB  {site['file']}:{site['line']}")
+    server.shutdown()
+    print(f"\nRSS grew {growth_mb:.1f} MB over {args.iterations - args.warmup} iterations after warm-up "
+          f"(limit {args.max_growth_mb:g} MB); work files in {workdir}")
+    sys.exit(0 if growth_mb <= args.max_growth_mb else 1)
+
+
+if __name__ == "__main__":
+    main()
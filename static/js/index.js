@@ -0,0 +1,259 @@
+// Full transcripts are not part of the page; fetch one the first time it is expanded
+function toggleTranscript(element) {
+    const preview = element.closest('.transcript-preview');
+    const short = preview.querySelector('.transcript-short');
+    const full = preview.querySelector('.transcript-full');
+
+    if (!full.dataset.loaded) {
+        element.textContent = ' (loading…)';
+        fetch(full.dataset.src)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(text => {
+                full.textContent = text;
+                full.dataset.loaded = '1';
+                toggleTranscript(element);
+            })
+            .catch(() => {
+                element.textContent = ' (full transcript unavailable)';
+            });
+        return;
+    }
+
+    if (full.classList.contains('show')) {
+        full.classList.remove('show');
+        short.style.display = 'inline';
+        element.textContent = '...';
+    } else {
+        full.classList.add('show');
+        short.style.display = 'none';
+        element.textContent = ' (hide)';
+    }
+}
+
+// Loading messages array
+const loadingMessages = [
+    "Transcribing audio…",
+    "Analyzing conversation…",
+    "Extracting emotional patterns…",
+    "Refining behavior insights…",
+    "Polishing the final interpretation…",
+    "Interpreting psychological cues…",
+    "Mapping conversational dynamics…",
+    "Tracing micro-expressions in speech…",
+    "Decoding meaning behind pauses…",
+    "Reconstructing emotional context…",
+    "Exploring subconscious patterns…",
+    "Surfacing hidden emotional layers…",
+    "Revealing shadow motivations…",
+    "Untangling psychological imprinting…",
+    "Listening beneath the words…",
+    "Reading between emotional lines…",
+    "Normalizing audio waveform…",
+    "Running signal processing…",
+    "Stabilizing data stream…",
+    "Computing linguistic embeddings…",
+    "Performing semantic clustering…",
+    "Extracting core themes…",
+    "Evaluating psychological signatures…",
+    "Tuning into the human frequency…",
+    "Following emotional undercurrents…",
+    "Peeling back conversational layers…",
+    "Capturing the essence of the dialogue…",
+    "Shaping the final intuition model…",
+    "Cooking up insights…",
+    "Massaging data gently…",
+    "Connecting emotional dots…",
+    "Teaching the AI to feel…",
+    "Upgrading intuition circuits…",
+    "Calibrating empathy model…",
+    "Preparing human-level interpretation…",
+    "Synchronizing intuition engine…",
+    "Enhancing depth perception…",
+    "Letting intuition take over…",
+    "Detecting behavioral patterns…",
+    "Synthesizing human intention…",
+    "Revealing internal contradictions…",
+    "Tracing origins of emotional imprinting…",
+    "Mapping the speaker's inner landscape…",
+    "Extracting vocal patterns…",
+    "Analyzing emotional signals…",
+    "Performing sentiment calibration…",
+    "Almost done…"
+];
+
+let messageInterval = null;
+let messageIndex = 0;
+
+function showLoading(planText) {
+    const loadingOverlay = document.getElementById('loading-overlay');
+    const loadingStatus = document.getElementById('loading-status');
+
+    messageIndex = 0;
+    loadingStatus.textContent = loadingMessages[messageIndex];
+    document.getElementById('loading-plan').textContent = planText || '';
+    loadingOverlay.classList.add('show');
+
+    messageInterval = setInterval(() => {
+        messageIndex = (messageIndex + 1) % loadingMessages.length;
+        loadingStatus.textContent = loadingMessages[messageIndex];
+    }, 1800);
+
+    document.getElementById('analyze-button').disabled = true;
+}
+
+function hideLoading() {
+    clearInterval(messageInterval);
+    messageInterval = null;
+    document.getElementById('loading-overlay').classList.remove('show');
+    document.getElementById('analyze-button').disabled = false;
+}
+
+// Each submitted upload runs as a job the server can cancel (POST /cancel/<job_id>)
+let activeJobId = null;
+
+function newJobId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+function cancelActiveJob() {
+    if (!activeJobId) {
+        return;
+    }
+    navigator.sendBeacon('/cancel/' + encodeURIComponent(activeJobId));
+    activeJobId = null;
+}
+
+document.getElementById('cancel-button').addEventListener('click', function() {
+    cancelActiveJob();
+    window.stop();  // abandon the pending form response
+    hideLoading();
+});
+
+// Closing the tab or navigating away mid-analysis cancels the job too. A job that
+// has finished is no longer listed by any worker, so cancelling it is then a no-op.
+window.addEventListener('pagehide', cancelActiveJob);
+
+// Preview the token plan before uploading, then show loading overlay and submit
+document.getElementById('analyze-form').addEventListener('submit', function(e) {
+    const form = this;
+    const fileInput = document.getElementById('file-input');
+    const files = fileInput.files;
+
+    if (files.length === 0) {
+        return;
+    }
+
+    e.preventDefault();
+    document.getElementById('analyze-button').disabled = true;
+
+    // Only text files are uploaded for the preview; audio is estimated from its size
+    const planData = new FormData();
+    const audioSizes = [];
+    for (const file of files) {
+        if (file.name.toLowerCase().endsWith('.txt')) {
+            planData.append('files', file);
+        } else {
+            audioSizes.push({ name: file.name, size: file.size });
+        }
+    }
+    planData.append('audio_sizes', JSON.stringify(audioSizes));
+    planData.append('strategy', document.getElementById('strategy-select').value);
+    planData.append('mode', document.getElementById('mode-select').value);
+    planData.append('compaction', document.getElementById('compaction-select').value);
+    if (document.getElementById('emotions-checkbox').checked) {
+        planData.append('emotions', '1');
+    }
+
+    fetch('/plan', { method: 'POST', body: planData })
+        .then(response => response.json())
+        .then(plan => {
+            if (plan.error || !plan.fits) {
+                document.getElementById('analyze-button').disabled = false;
+                alert('Not sent: ' + (plan.error || plan.description));
+                return;
+            }
+            activeJobId = document.getElementById('job-id').value = newJobId();
+            showLoading('Plan: ' + plan.description);
+            form.submit();
+        })
+        .catch(() => {
+            // The preview is advisory; the server checks the budget again
+            activeJobId = document.getElementById('job-id').value = newJobId();
+            showLoading('');
+            form.submit();
+        });
+});
+
+window.addEventListener('load', function() {
+    if (messageInterval) {
+        clearInterval(messageInterval);
+    }
+});
+
+// Smooth scroll for anchor links
+document.querySelectorAll('a[href^="#"]').forEach(anchor => {
+    anchor.addEventListener('click', function (e) {
+        const href = this.getAttribute('href');
+        if (href !== '#' && href !== '#cta') {
+            e.preventDefault();
+            const target = document.querySelector(href);
+            if (target) {
+                target.scrollIntoView({
+                    behavior: 'smooth',
+                    block: 'start'
+                });
+            }
+        }
+    });
+});
+
+// Video autoplay on scroll and mute/unmute functionality
+const video = document.getElementById('main-video');
+const unmuteButton = document.getElementById('unmute-button');
+let videoHasPlayed = false;
+
+function toggleMute() {
+    if (video.muted) {
+        video.muted = false;
+        unmuteButton.textContent = '🔊';
+        unmuteButton.title = 'Mute video';
+    } else {
+        video.muted = true;
+        unmuteButton.textContent = '🔇';
+        unmuteButton.title = 'Unmute video';
+    }
+}
+
+// Intersection Observer for autoplay on scroll
+const observerOptions = {
+    root: null,
+    rootMargin: '0px',
+    threshold: 0.5 // Play when 50% of video is visible
+};
+
+const observer = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting && !videoHasPlayed) {
+            video.play().then(() => {
+                videoHasPlayed = true;
+            }).catch(err => {
+                console.log('Autoplay prevented:', err);
+            });
+        } else if (!entry.isIntersecting && videoHasPlayed) {
+            // Optionally pause when out of view
+            // video.pause();
+        }
+    });
+}, observerOptions);
+
+if (video) {
+    observer.observe(video);
+}
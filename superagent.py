@@ -1,15 +1,15 @@
 import os
 import json
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
-XAI_API_KEY = os.getenv("XAI_API_KEY")
-if not XAI_API_KEY:
-    raise RuntimeError("XAI_API_KEY not found in environment. Check your .env file.")
+import config
+import admission
+import model_routing
+import prompt_budget
+from retrieval import RetrievalIndex, TOP_K
 
-XAI_URL = "https://api.x.ai/v1/chat/completions"
-MODEL = "grok-4-0709"
+# Question/answer pairs kept in the conversation sent with each turn; older
+# ones are dropped so long sessions stay bounded in memory and prompt size
+HISTORY_TURNS = int(config.get("SUPERAGENT_HISTORY_TURNS", "20"))
 
 
 def load_profile(path: str = "profile.json") -> dict:
@@ -68,9 +68,21 @@ STYLE:
 """.strip()
 
 
+def make_retrieval_context(excerpts: list) -> str:
+    """Format retrieved transcript excerpts for inclusion alongside a user turn."""
+    parts = [
+        "RELEVANT EXCERPTS FROM THEIR PAST CONVERSATIONS",
+        "(retrieved for this question only; use them to ground your answer, do not quote them at length):",
+    ]
+    for i, excerpt in enumerate(excerpts, 1):
+        parts.append(f"\n[{i}] {excerpt['source_file']}\n{excerpt['text']}")
+    return "\n".join(parts)
+
+
 def chat_with_superagent():
     profile = load_profile()
     system_prompt = make_system_prompt(profile)
+    retrieval_index = RetrievalIndex()
 
     messages = [
         {"role": "system", "content": system_prompt},
@@ -86,26 +98,30 @@ def chat_with_superagent():
 
         messages.append({"role": "user", "content": user_input})
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {XAI_API_KEY}",
-        }
-
-        payload = {
-            "model": MODEL,
-            "messages": messages,
-            "stream": False,
-        }
-
-        resp = requests.post(XAI_URL, headers=headers, data=json.dumps(payload))
-        resp.raise_for_status()
-        data = resp.json()
-        reply = data["choices"][0]["message"]["content"]
+        # Excerpts are attached to this request only, so history stays bounded
+        request_messages = messages
+        excerpts = retrieval_index.query(user_input, k=TOP_K)
+        if excerpts:
+            request_messages = messages[:-1] + [
+                {"role": "system", "content": make_retrieval_context(excerpts)},
+                messages[-1],
+            ]
+
+        # Follow-up turns with short questions can go to the fast model
+        task = "superagent_followup" if len(messages) > 2 else "superagent"
+        model = model_routing.choose_model(
+            task,
+            prompt_budget.estimate_tokens(user_input),
+            context_tokens=model_routing.message_tokens(request_messages),
+        )
+        reply = model_routing.complete(task, request_messages, model=model)
 
         print("\nSuperagent:\n", reply, "\n")
 
         messages.append({"role": "assistant", "content": reply})
+        del messages[1 : max(1, len(messages) - 2 * HISTORY_TURNS)]
 
 
 if __name__ == "__main__":
-    chat_with_superagent()
+    with admission.acting_as(admission.Client(lane="interactive")):
+        chat_with_superagent()
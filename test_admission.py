@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import AdmissionController, Busy, Client
+
+
+def queue_up(controller, clients):
+    """Start one waiting acquire per client (while the controller is full); returns the grant order."""
+    order = []
+
+    def acquire(client):
+        granted_at = controller.acquire(client)
+        order.append(client)
+        controller.release(client, granted_at)
+
+    threads = []
+    for client in clients:
+        thread = threading.Thread(target=acquire, args=(client,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)  # fixes the arrival order
+    return order, threads
+
+
+def test_lanes_go_in_priority_order():
+    controller = AdmissionController("test", 1, user_slots=1, interactive_reserve=0)
+    blocker = Client("blocker")
+    granted_at = controller.acquire(blocker)
+    batch, standard, interactive = Client("a", "batch"), Client("b", "standard"), Client("c", "interactive")
+
+    order, threads = queue_up(controller, [batch, standard, interactive])
+    controller.release(blocker, granted_at)
+    for thread in threads:
+        thread.join()
+
+    assert order == [interactive, standard, batch]
+
+
+def test_users_take_turns_within_a_lane():
+    controller = AdmissionController("test", 1, user_slots=1, interactive_reserve=0)
+    blocker = Client("blocker")
+    granted_at = controller.acquire(blocker)
+    alice = [Client("alice") for _ in range(3)]
+    bob = Client("bob")
+
+    order, threads = queue_up(controller, alice + [bob])
+    controller.release(blocker, granted_at)
+    for thread in threads:
+        thread.join()
+
+    assert [client.user for client in order][:2] == ["alice", "bob"]
+
+
+def test_user_cap_and_interactive_reserve():
+    controller = AdmissionController("test", 3, user_slots=1, interactive_reserve=1)
+
+    controller.acquire(Client("alice"))
+    assert controller.stats()["active"] == 1
+    granted = threading.Event()
+    second = threading.Thread(target=lambda: (controller.acquire(Client("alice")), granted.set()))
+    second.start()
+    assert not granted.wait(0.3)  # capped at one slot per user
+
+    controller.acquire(Client("bob"))
+    assert controller.stats()["active"] == 2
+    # The last slot is reserved for interactive calls
+    controller.acquire(Client("carol", "interactive"))
+    assert controller.stats()["active"] == 3
+    controller.release(Client("bob"), time.monotonic())
+    controller.release(Client("carol", "interactive"), time.monotonic())
+    controller.release(Client("alice"), time.monotonic())
+    second.join(timeout=5)
+    assert granted.is_set()
+
+
+def test_full_queue_and_long_waits_are_shed(monkeypatch):
+    monkeypatch.setitem(admission.MAX_WAIT_SEC, "standard", 0.3)
+    monkeypatch.setattr(admission.cancellation, "POLL_SEC", 0.05)
+    controller = AdmissionController("test", 1, user_slots=1, interactive_reserve=0, max_queue=1)
+    controller.acquire(Client("blocker"))
+
+    with pytest.raises(Busy):
+        controller.acquire(Client("alice"))  # waited too long behind another user
+    assert controller.stats()["shed_timeout"] == 1
+
+    waiting = threading.Thread(target=lambda: pytest.raises(Busy, controller.acquire, Client("bob")))
+    waiting.start()
+    time.sleep(0.1)
+    with pytest.raises(Busy) as raised:
+        controller.acquire(Client("carol"))
+    assert raised.value.retry_after >= 1
+    assert controller.stats()["shed_queue_full"] == 1
+    waiting.join()
+
+
+def test_waiting_on_ones_own_cap_is_not_shed(monkeypatch):
+    monkeypatch.setitem(admission.MAX_WAIT_SEC, "standard", 0.2)
+    monkeypatch.setattr(admission.cancellation, "POLL_SEC", 0.05)
+    controller = AdmissionController("test", 4, user_slots=1, interactive_reserve=0)
+    alice = Client("alice")
+    granted_at = controller.acquire(alice)
+
+    threading.Timer(0.6, controller.release, args=(alice, granted_at)).start()
+    controller.acquire(alice)  # three lane limits, all spent on alice's own cap
+
+    assert controller.stats()["shed_timeout"] == 0
@@ -0,0 +1,33 @@
+import subprocess
+
+import numpy as np
+
+import audio_preprocess
+
+
+def test_long_silence_is_cut_and_speech_kept():
+    rate = audio_preprocess.SAMPLE_RATE
+    tone = (np.sin(np.arange(rate * 2) * 0.3) * 8000).astype(np.int16)
+    silence = np.zeros(rate * 10, dtype=np.int16)
+    samples = np.concatenate([tone, silence, tone])
+
+    spans = audio_preprocess.detect_speech(samples)
+
+    assert len(spans) == 2
+    assert spans[0][0] == 0 and spans[-1][1] == len(samples)
+    assert sum(end - start for start, end in spans) < len(samples) // 2
+
+
+def test_undecodable_upload_falls_back_to_the_original(monkeypatch):
+    def decode_fails(path):
+        raise subprocess.CalledProcessError(1, "ffmpeg")
+
+    monkeypatch.setattr(audio_preprocess, "AUDIO_PREPROCESSING", True)
+    monkeypatch.setattr(audio_preprocess, "FFMPEG_AVAILABLE", True)
+    monkeypatch.setattr(audio_preprocess, "probe", lambda path: {"has_audio": True, "has_video": False, "duration": 90.0})
+    monkeypatch.setattr(audio_preprocess, "decode_pcm", decode_fails)
+
+    prepared = audio_preprocess.preprocess("upload.m4a")
+
+    assert prepared.path == "upload.m4a"
+    assert prepared.original_duration == 90.0
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+import admission
+import cancellation
+import shared_state
+
+
+@pytest.fixture(autouse=True)
+def memory_state():
+    previous = shared_state.use_backend(shared_state.MemoryBackend())
+    yield
+    shared_state.use_backend(previous)
+
+
+def test_cancelled_blocking_call_keeps_its_admission_slot_until_it_returns():
+    controller = admission.AdmissionController("test", 1, user_slots=1, interactive_reserve=0)
+    finish = threading.Event()
+
+    with cancellation.job() as token:
+        threading.Timer(0.1, token.cancel).start()
+        with pytest.raises(cancellation.Cancelled) as raised:
+            with controller.slot(admission.Client()):
+                cancellation.run(finish.wait)
+
+    assert raised.value.abandoned is not None
+    assert controller.stats()["active"] == 1
+    finish.set()
+    raised.value.abandoned.result(timeout=5)
+    time.sleep(0.05)
+    assert controller.stats()["active"] == 0
+
+
+def test_cancel_reaches_a_job_listed_by_another_process():
+    token = cancellation.CancelToken("job-1")
+    shared_state.put("running", "job-1", "1")  # registered elsewhere
+
+    assert cancellation.cancel("job-1") is False
+    with pytest.raises(cancellation.Cancelled):
+        token.check()
+
+
+def test_cancelling_an_unknown_job_leaves_no_marker():
+    assert cancellation.cancel("nobody") is False
+    assert shared_state.get("cancel", "nobody") is None
+
+
+def test_job_is_cancellable_by_id_while_it_runs():
+    with cancellation.job("job-2") as token:
+        assert cancellation.cancel("job-2") is True
+        with pytest.raises(cancellation.Cancelled):
+            cancellation.check()
+    assert token.cancelled
+    assert shared_state.get("running", "job-2") is None
@@ -0,0 +1,77 @@
+import os
+import time
+
+import checkpoints
+from checkpoints import Run
+
+
+def test_a_failed_run_resumes_from_its_checkpoints(tmp_path):
+    calls = []
+
+    def stage(name):
+        calls.append(name)
+        if name == "report":
+            raise RuntimeError("model unavailable")
+        return {"done": name}
+
+    first = Run("abc", root=str(tmp_path), enabled=True)
+    assert first.step("transcript", stage, "transcript") == {"done": "transcript"}
+    try:
+        first.step("report", stage, "report")
+    except RuntimeError:
+        pass
+    first._active.close()  # the process died here
+
+    second = Run("abc", root=str(tmp_path), enabled=True)
+    assert second.step("transcript", stage, "transcript") == {"done": "transcript"}
+    assert calls == ["transcript", "report"]
+    assert (second.resumed, second.computed) == (1, 0)
+
+
+def test_finish_deletes_the_run_only_after_the_last_user(tmp_path):
+    first = Run("abc", root=str(tmp_path), enabled=True)
+    second = Run("abc", root=str(tmp_path), enabled=True)
+    first.step("transcript", lambda: "text")
+
+    first.finish()
+    assert second.step("transcript", lambda: "again") == "text"
+    second.finish()
+
+    assert checkpoints.list_runs(str(tmp_path)) == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_sender_checkpoints_each_call(tmp_path):
+    sent = []
+
+    def send(system_prompt, content):
+        sent.append(content)
+        return content.upper()
+
+    run = Run("abc", root=str(tmp_path), enabled=True)
+    send = run.sender(send)
+
+    assert [send("sys", "a"), send("sys", "b"), send("sys", "a")] == ["A", "B", "A"]
+    assert sent == ["a", "b"]
+
+
+def test_prune_skips_runs_in_progress(tmp_path):
+    active = Run("active", root=str(tmp_path), enabled=True)
+    active.put("stage", 1)
+    abandoned = Run("abandoned", root=str(tmp_path), enabled=True)
+    abandoned.put("stage", 1)
+    abandoned._active.close()
+    old = time.time() - 86400
+    for name in ("active", "abandoned"):
+        os.utime(tmp_path / name, (old, old))
+
+    assert checkpoints.prune(str(tmp_path), ttl_days=0.5) == ["abandoned"]
+    assert [name for name, _, _ in checkpoints.list_runs(str(tmp_path))] == ["active"]
+
+
+def test_disabled_runs_store_nothing(tmp_path):
+    run = Run("abc", root=str(tmp_path), enabled=False)
+
+    assert run.step("stage", lambda: 1) == 1
+    assert run.step("stage", lambda: 2) == 2
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,60 @@
+import pytest
+
+import compaction
+
+RAW = """WEBVTT
+
+1
+00:00:01.000 --> 00:00:04.000
+SPEAKER_1: Um, uh, I was, you know, thinking... ... about the move.
+SPEAKER_1: Thank you. Thank you. Thank you. Thank you.
+SPEAKER_2: Mm-hmm.
+SPEAKER_2: I I I don't know, hmm."""
+
+
+def test_off_returns_the_text_unchanged():
+    result = compaction.compact(RAW, "off")
+    assert result.text == RAW
+    assert result.saved_tokens == 0
+
+
+def test_light_drops_boilerplate_and_phrase_loops_only():
+    result = compaction.compact(RAW, "light")
+
+    assert "WEBVTT" not in result.text and "-->" not in result.text
+    assert result.text.count("Thank you.") == 1
+    assert "Um, uh," in result.text
+    assert result.text.splitlines()[0].startswith("Speaker 1:")
+
+
+@pytest.mark.parametrize("level", compaction.LEVELS[1:])
+def test_hesitation_markers_are_never_removed(level):
+    text = compaction.compact(RAW, level).text.lower()
+
+    assert "speaker 1: um," in text
+    assert "hmm" in text
+    assert "..." in text
+    assert "i-i" in text or "i i" in text
+
+
+def test_normal_collapses_runs_and_merges_turns():
+    result = compaction.compact(RAW, "normal")
+
+    assert result.text.splitlines()[0] == "Speaker 1: Um, I was thinking... about the move. Thank you."
+    assert result.changes["hesitation_runs"] == 1
+    assert result.changes["fillers"] == 1
+    assert result.changes["merged_turns"] == 2
+    assert result.compacted_tokens < result.original_tokens
+
+
+def test_aggressive_shortens_stutters_and_drops_backchannels():
+    result = compaction.compact(RAW, "aggressive")
+
+    assert "Mm-hmm" not in result.text
+    assert "Speaker 2: I-I don't know, hmm." in result.text
+    assert result.changes["backchannels"] == 1
+
+
+def test_unknown_level_is_refused():
+    with pytest.raises(ValueError):
+        compaction.compact(RAW, "extreme")
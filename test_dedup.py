@@ -0,0 +1,62 @@
+import random
+
+import dedup
+
+random.seed(7)
+VOCABULARY = [f"word{i}" for i in range(2000)]
+
+
+def conversation(n_words: int) -> list:
+    return [random.choice(VOCABULARY) for _ in range(n_words)]
+
+
+def as_transcript(words: list, labels=("A", "B"), timestamps: bool = False) -> str:
+    lines = []
+    for turn, start in enumerate(range(0, len(words), 20)):
+        prefix = f"[00:{turn:02d}:00] " if timestamps else ""
+        lines.append(f"{prefix}{labels[turn % 2]}: " + " ".join(words[start : start + 20]))
+    return "\n".join(lines)
+
+
+def misheard(words: list, share: float) -> list:
+    return [random.choice(VOCABULARY) if random.random() < share else word for word in words]
+
+
+def test_copies_from_different_sources_cluster_and_the_longest_is_kept():
+    call = conversation(600)
+    other = conversation(600)
+    texts = [
+        as_transcript(call, labels=("Speaker 1", "Speaker 2")),  # Otter export
+        as_transcript(misheard(call, 0.05), timestamps=True),  # Whisper run with a few misheard words
+        as_transcript(other),
+        as_transcript(call[:250]),  # a recording of only part of the call
+    ]
+
+    clusters = dedup.find_duplicates(texts)
+
+    assert len(clusters) == 1
+    assert sorted(i for i, _ in clusters[0]) == [0, 1, 3]
+    assert clusters[0][0] == (0, 1.0)
+    assert all(score >= dedup.DEDUP_THRESHOLD for _, score in clusters[0])
+
+
+def test_unrelated_transcripts_on_a_shared_topic_are_kept():
+    shared = conversation(40)
+    texts = [as_transcript(shared + conversation(500)) for _ in range(5)]
+
+    assert dedup.find_duplicates(texts) == []
+
+
+def test_deduplicate_keeps_input_order_and_reports_drops():
+    call = conversation(300)
+    items = [("short.txt", as_transcript(call[:200])), ("other.txt", as_transcript(conversation(300))),
+             ("full.txt", as_transcript(call))]
+
+    kept, dropped = dedup.deduplicate(items)
+
+    assert [name for name, _ in kept] == ["other.txt", "full.txt"]
+    assert [(name, kept_name) for name, kept_name, _ in dropped] == [("short.txt", "full.txt")]
+
+
+def test_normalize_drops_labels_and_timestamps():
+    assert dedup.normalize("[00:01:02] Speaker 1: Hello, THERE!\nB: ok") == ["hello", "there", "ok"]
@@ -0,0 +1,30 @@
+import emotion_analytics
+
+
+def emotional_map(*emotions):
+    return {
+        "timeline": [{"speaker": "A", "inferred_emotions": [emotion], "intensity": "high"} for emotion in emotions],
+        "global_summary": {"main_emotions": list(emotions)},
+    }
+
+
+def test_maps_with_the_same_label_are_kept_apart(tmp_path):
+    store = str(tmp_path)
+
+    emotion_analytics.ingest_map(emotional_map("anxious"), "Combined Analysis (a.txt)", store=store, key="run1")
+    emotion_analytics.ingest_map(emotional_map("calm"), "Combined Analysis (a.txt)", store=store, key="run2")
+    emotion_analytics.ingest_map(emotional_map("hopeful"), "Combined Analysis (a.txt)", store=store)
+
+    assert emotion_analytics.overview(store)["conversations"] == 3
+
+
+def test_reingesting_a_key_replaces_its_rows(tmp_path):
+    store = str(tmp_path)
+
+    assert emotion_analytics.ingest_map(emotional_map("anxious"), "call.json", store=store, key="call.json")
+    assert not emotion_analytics.ingest_map(emotional_map("anxious"), "call.json", store=store, key="call.json")
+    assert emotion_analytics.ingest_map(emotional_map("calm", "calm"), "call.json", store=store, key="call.json")
+
+    overview = emotion_analytics.overview(store)
+    assert overview["conversations"] == 1
+    assert overview["top_emotions"] == {"calm": 2}
@@ -1,8 +1,4 @@
-from dotenv import load_dotenv
-import os
+import config  # loads .env from this folder
 
-# Load variables from .env in this folder
-load_dotenv()
-
-api_key = os.getenv("XAI_API_KEY")
+api_key = config.get("XAI_API_KEY")
 print("API key from .env:", api_key)
@@ -0,0 +1,59 @@
+import pytest
+
+import json_schema
+from emotional_mapping import EMOTION_MAP_SCHEMA
+from json_schema import SchemaError
+
+
+def error_message(value, schema) -> str:
+    with pytest.raises(SchemaError) as raised:
+        json_schema.validate(value, schema)
+    return str(raised.value)
+
+
+def test_errors_name_the_offending_path():
+    emo_map = {
+        "timeline": [
+            {"segment_id": 1, "text_snippet": "hi", "approx_position": "start", "speaker": "A",
+             "inferred_emotions": ["calm"], "intensity": "low", "notes": ""},
+            {"segment_id": 2, "text_snippet": "hm", "approx_position": "end", "speaker": "B",
+             "inferred_emotions": "tense", "intensity": 2, "notes": ""},
+        ],
+        "global_summary": {"main_emotions": ["calm"]},
+    }
+
+    assert error_message(emo_map, EMOTION_MAP_SCHEMA) == "timeline[1].inferred_emotions: expected array, got string"
+    emo_map["timeline"][1]["inferred_emotions"] = ["tense"]
+    json_schema.validate(emo_map, EMOTION_MAP_SCHEMA)
+
+
+def test_required_keys_min_items_and_additional_properties():
+    schema = {
+        **json_schema.object_schema({"items": {"type": "array", "minItems": 1}}),
+        "additionalProperties": False,
+    }
+
+    assert error_message({}, schema) == "missing required key 'items'"
+    assert error_message({"items": []}, schema) == "items: needs at least 1 item(s)"
+    assert error_message({"items": [1], "extra": 1}, schema) == "unexpected key 'extra'"
+
+
+def test_types_and_enums():
+    assert error_message(True, {"type": "integer"}) == "expected integer, got boolean"
+    json_schema.validate(3, {"type": "number"})
+    assert error_message("loud", {"enum": ["low", "high"]}) == 'must be one of "low", "high"'
+
+
+def test_any_of_reports_against_the_intended_form():
+    schema = {"anyOf": [{"type": "string"}, {"type": "array", "items": {"type": "string"}}]}
+
+    json_schema.validate(["a", "b"], schema)
+    assert error_message(["a", 2], schema) == "[1]: expected string, got integer"
+    assert error_message(5, schema) == "expected string or array, got integer"
+
+
+def test_response_format_wraps_the_schema():
+    schema = {"type": "object"}
+    assert json_schema.response_format("emotional_map", schema) == {
+        "type": "json_schema", "json_schema": {"name": "emotional_map", "schema": schema},
+    }
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import json_stream
+from json_stream import StreamingJSONParser
+
+EMOTIONAL_MAP = {
+    "timeline": [
+        {"speaker": "A", "text_snippet": "a {brace} and \"quotes\"", "inferred_emotions": ["calm"]},
+        {"speaker": "B", "text_snippet": "ok", "inferred_emotions": ["tense", "tired"]},
+    ],
+    "global_summary": {"main_emotions": ["calm"], "key_triggers": []},
+    "confidence": 0.7,
+}
+
+
+def feed_in_pieces(parser: StreamingJSONParser, text: str, size: int) -> list:
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start : start + size]))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 7, 10000])
+def test_items_and_values_are_emitted_as_they_close(size):
+    parser = StreamingJSONParser(item_arrays=("timeline",))
+    reply = "Here is the map:\n```json\n" + json.dumps(EMOTIONAL_MAP, indent=2) + "\n```"
+
+    events = feed_in_pieces(parser, reply, size)
+    parser.close()
+
+    assert [path for path, _ in events] == [("timeline", 0), ("timeline", 1), ("global_summary",), ("confidence",)]
+    assert parser.result == EMOTIONAL_MAP
+    assert parser.complete and parser.errors == []
+
+
+def test_first_item_is_emitted_before_the_reply_ends():
+    parser = StreamingJSONParser(item_arrays=("timeline",))
+    text = json.dumps(EMOTIONAL_MAP)
+
+    events = parser.feed(text[: text.index('{"speaker": "B"')])
+
+    assert events == [(("timeline", 0), EMOTIONAL_MAP["timeline"][0])]
+
+
+def test_malformed_item_is_isolated_and_truncation_recorded():
+    parser = StreamingJSONParser(item_arrays=("timeline",))
+    parser.feed('{"timeline": [{"speaker": "A"}, {"speaker": B}, {"speaker": "C"}], "global_summary": {"main')
+    parser.close()
+
+    assert parser.result["timeline"] == [{"speaker": "A"}, None, {"speaker": "C"}]
+    assert [error[0] for error in parser.errors] == [("timeline", 1), ("global_summary",)]
+    assert parser.errors[1][2] == "truncated"
+    assert parser.missing(("timeline", "global_summary")) == ["global_summary"]
+
+
+def test_reject_marks_an_item_for_repair():
+    parser = StreamingJSONParser(item_arrays=("timeline",))
+    parser.feed('{"timeline": [{"speaker": 1}]}')
+
+    parser.reject(("timeline", 0), "speaker: expected string")
+
+    assert parser.result["timeline"] == [None]
+    assert parser.errors == [(("timeline", 0), '{"speaker": 1}', "speaker: expected string")]
+
+
+def test_close_without_json_raises():
+    parser = StreamingJSONParser()
+    parser.feed("I cannot help with that.")
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_parse_fragment_ignores_surrounding_prose():
+    assert json_stream.parse_fragment('Sure:\n```json\n[{"a": 1}]\n```') == [{"a": 1}]
+    with pytest.raises(ValueError):
+        json_stream.parse_fragment("no json here")
+
+
+def test_repair_fragment_sends_only_the_fragment_and_validates(monkeypatch):
+    sent = []
+
+    def complete(task, messages, validate=None, **options):
+        sent.append((task, messages[-1]["content"]))
+        reply = '```json\n{"speaker": "B"}\n```'
+        validate(reply)
+        return reply
+
+    monkeypatch.setattr(json_stream.model_routing, "complete", complete)
+
+    value = json_stream.repair_fragment('{"speaker": B}', "one timeline segment", error="Expecting value")
+
+    assert value == {"speaker": "B"}
+    assert sent == [("json_repair", 'Fragment:\n{"speaker": B}\n\nProblem: Expecting value')]
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import admission
+import live_session
+from audio_preprocess import SAMPLE_RATE
+
+
+def speech(seconds: float) -> bytes:
+    return (np.sin(np.arange(int(SAMPLE_RATE * seconds)) * 0.3) * 8000).astype("<i2").tobytes()
+
+
+def silence(seconds: float) -> bytes:
+    return np.zeros(int(SAMPLE_RATE * seconds), dtype="<i2").tobytes()
+
+
+def test_close_confirms_the_remaining_audio_and_estimates(monkeypatch):
+    monkeypatch.setattr(live_session.model_routing, "complete", lambda *args, **kwargs: '{"current_emotions": ["calm"]}')
+    session = live_session.LiveSession(live_session.StandInTranscriber())
+
+    session.add_audio(speech(1.0) + silence(1.0))
+    transcript = session.close()
+
+    assert len(transcript) == 1
+    events = session.drain_events()
+    assert [event["type"] for event in events] == ["final", "partial", "emotions", "done"]
+    assert events[2]["estimate"] == {"current_emotions": ["calm"]}
+
+
+def test_close_gives_up_on_a_slow_final_pass():
+    release = threading.Event()
+
+    def stuck(audio, prompt=""):
+        release.wait(5)
+        return []
+
+    session = live_session.LiveSession(stuck)
+    session.add_audio(speech(0.5))
+
+    started = time.monotonic()
+    transcript = session.close(timeout=0.2)
+    release.set()
+
+    assert time.monotonic() - started < 2
+    assert len(transcript) == 0
+    assert [event["type"] for event in session.drain_events()] == ["error", "done"]
+
+
+def test_estimates_must_match_the_schema():
+    assert live_session.parse_estimate('```json\n{"current_emotions": ["calm"]}\n```') == {"current_emotions": ["calm"]}
+    with pytest.raises(ValueError):
+        live_session.parse_estimate('{"current_emotions": "calm"}')
+    with pytest.raises(ValueError):
+        live_session.parse_estimate('{"note": "no emotions"}')
+
+
+def test_live_whisper_takes_a_transcription_slot(monkeypatch):
+    active = []
+
+    def transcribe_local(audio, **options):
+        active.append(admission.controllers["transcription"].stats()["active"])
+        return [{"start": 0.0, "end": 1.0, "text": "hello"}]
+
+    monkeypatch.setattr(admission, "ADMISSION", True)
+    monkeypatch.setattr(live_session.transcription, "whisper_model", lambda name=None: None)
+    monkeypatch.setattr(live_session.transcription, "transcribe_local", transcribe_local)
+
+    segments = live_session.WhisperTranscriber()(np.zeros(SAMPLE_RATE, dtype=np.float32))
+
+    assert segments == [{"start": 0.0, "end": 1.0, "text": "hello"}]
+    assert active == [1]
+    assert admission.controllers["transcription"].stats()["active"] == 0
@@ -0,0 +1,53 @@
+import pytest
+import requests
+
+import grok_client
+import model_routing
+
+SCHEMA = {"type": "object", "title": "reply"}
+
+
+def http_error(status: int, body: str) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode("utf-8")
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    monkeypatch.setattr(model_routing, "_unstructured_models", {})
+    monkeypatch.setattr(model_routing, "GROK_STRUCTURED_OUTPUTS", True)
+    return []
+
+
+def test_schema_refusal_retries_without_response_format(monkeypatch, calls):
+    def chat_completion(messages, model, validate=None, **options):
+        calls.append("response_format" in options)
+        if "response_format" in options:
+            raise http_error(400, '{"error": "response_format json_schema is not supported by this model"}')
+        return "{}"
+
+    monkeypatch.setattr(grok_client, "chat_completion", chat_completion)
+
+    assert model_routing.complete("emotions", [], model=model_routing.LARGE_MODEL, schema=SCHEMA) == "{}"
+    assert model_routing.complete("emotions", [], model=model_routing.LARGE_MODEL, schema=SCHEMA) == "{}"
+    assert calls == [True, False, False]
+
+    # Once the refusal expires, the model is asked with the schema again
+    model_routing._unstructured_models[model_routing.LARGE_MODEL] = 0.0
+    model_routing.complete("emotions", [], model=model_routing.LARGE_MODEL, schema=SCHEMA)
+    assert calls[3:] == [True, False]
+
+
+def test_other_bad_requests_are_raised_and_not_remembered(monkeypatch, calls):
+    def chat_completion(messages, model, validate=None, **options):
+        calls.append("response_format" in options)
+        raise http_error(400, '{"error": "This model\'s maximum prompt length is 131072 tokens"}')
+
+    monkeypatch.setattr(grok_client, "chat_completion", chat_completion)
+
+    with pytest.raises(requests.HTTPError):
+        model_routing.complete("emotions", [], model=model_routing.LARGE_MODEL, schema=SCHEMA)
+    assert calls == [True]
+    assert model_routing.routing_stats()["unstructured_models"] == []
@@ -1,13 +1,10 @@
 #!/usr/bin/env python3
 """Quick test to verify OPENAI_API_KEY is loaded from .env"""
 
-from dotenv import load_dotenv
-import os
+import config
 
-load_dotenv()
-
-xai_key = os.getenv("XAI_API_KEY")
-openai_key = os.getenv("OPENAI_API_KEY")
+xai_key = config.get("XAI_API_KEY")
+openai_key = config.get("OPENAI_API_KEY")
 
 print("Environment variables check:")
 print(f"XAI_API_KEY: {'✓ Found' if xai_key else '✗ Not found'}")
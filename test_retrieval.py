@@ -0,0 +1,52 @@
+import retrieval
+from retrieval import CHUNK_WORDS, CHUNK_OVERLAP_WORDS, RetrievalIndex, chunk_transcript
+from transcript_model import Transcript
+
+
+def test_unlabeled_long_transcript_is_split_into_overlapping_windows():
+    words = [f"word{i}" for i in range(22000)]
+    transcript = Transcript.parse(" ".join(words))
+    assert len(transcript) == 1  # no speaker labels: a single turn
+
+    chunks = chunk_transcript(transcript)
+
+    assert len(chunks) > 100
+    assert all(len(chunk.split()) <= CHUNK_WORDS for chunk in chunks)
+    assert chunks[0].split()[0] == "word0"
+    assert chunks[-1].split()[-1] == "word21999"
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.split()[-CHUNK_OVERLAP_WORDS:] == chunk.split()[:CHUNK_OVERLAP_WORDS]
+
+
+def test_short_turns_are_packed_whole():
+    transcript = Transcript.parse("\n".join(f"Speaker {i % 2}: turn {i} " + "talk " * 40 for i in range(10)))
+
+    chunks = chunk_transcript(transcript)
+
+    assert len(chunks) == 3
+    assert chunks[0].startswith("turn 0") and chunks[-1].rstrip().endswith("talk")
+
+
+def test_long_turn_between_short_ones_keeps_their_order():
+    transcript = Transcript.parse("A: before\nB: " + "long " * 400 + "\nA: after")
+
+    chunks = chunk_transcript(transcript)
+
+    assert chunks[0].strip() == "before"
+    assert chunks[-1].strip() == "after"
+    assert sum(chunk.split().count("long") for chunk in chunks[1:-1]) >= 400
+
+
+def test_index_appends_without_loading_chunks_and_queries_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "QUERY_BLOCK_ROWS", 2)
+    writer = RetrievalIndex(str(tmp_path))
+    for i, topic in enumerate(["budget review", "holiday plans", "deadline slipped", "budget cuts", "cats"]):
+        assert writer.add_transcript(f"A: talking about {topic}", f"call{i}.txt") == 1
+    assert writer.add_transcript("A: talking about cats", "again.txt") == 0
+    assert writer._chunks is None  # appending never read chunks.jsonl
+
+    reader = RetrievalIndex(str(tmp_path))
+    results = reader.query("budget", k=3)
+
+    assert len(reader) == 5
+    assert sorted(r["source_file"] for r in results) == ["call0.txt", "call3.txt"]
@@ -0,0 +1,41 @@
+import search_index
+
+
+def test_same_file_name_keeps_both_conversations(tmp_path):
+    db = str(tmp_path / "index.db")
+
+    search_index.index_transcript("A: we should talk about the budget", "transcript.txt", db)
+    search_index.index_transcript("B: the deadline moved again", "transcript.txt", db)
+
+    assert len(search_index.search("budget", db_path=db)) == 1
+    assert len(search_index.search("deadline", db_path=db)) == 1
+    assert len(search_index.search(source_file="transcript.txt", db_path=db)) == 2
+
+
+def test_indexing_a_key_again_replaces_its_rows(tmp_path):
+    db = str(tmp_path / "index.db")
+
+    search_index.index_analysis("first draft mentions apples", "Combined Analysis", db, key="run1")
+    search_index.index_analysis("second draft mentions pears", "Combined Analysis", db, key="run1")
+    search_index.index_transcript("A: apples and pears", "call.txt", db)
+    search_index.index_transcript("A: apples and pears", "call.txt", db)
+
+    assert [row["kind"] for row in search_index.search("apples", db_path=db)] == ["transcript"]
+    assert len(search_index.search("pears", db_path=db)) == 2
+
+
+def test_search_filters_by_speaker_emotion_and_kind(tmp_path):
+    db = str(tmp_path / "index.db")
+    emo_map = {
+        "timeline": [
+            {"speaker": "A", "text_snippet": "I can't keep up", "inferred_emotions": ["anxious"]},
+            {"speaker": "B", "text_snippet": "we will manage", "inferred_emotions": "calm"},
+        ],
+        "global_summary": {"main_emotions": ["anxious"], "baseline_tone": "tense"},
+    }
+
+    assert search_index.index_emotional_map(emo_map, "call.txt", db) == 3
+
+    assert [row["speaker"] for row in search_index.search(emotion="calm", db_path=db)] == ["B"]
+    assert len(search_index.search(emotion="anxious", kind=search_index.KIND_EMOTIONAL_MAP, db_path=db)) == 2
+    assert search_index.search(emotion="anxious", kind=search_index.KIND_PROFILE, db_path=db) == []
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+import shared_state
+
+
+@pytest.fixture(params=["memory", "file"])
+def backend(request, tmp_path, monkeypatch):
+    store = shared_state.MemoryBackend() if request.param == "memory" else shared_state.FileBackend(str(tmp_path))
+    previous = shared_state.use_backend(store)
+    monkeypatch.setattr(shared_state, "SINGLE_FLIGHT_POLL_SEC", 0.01)
+    yield store
+    shared_state.use_backend(previous)
+
+
+def test_concurrent_callers_compute_once(backend):
+    calls, results = [], []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "value"
+
+    threads = [
+        threading.Thread(target=lambda: results.append(shared_state.single_flight("test", "k", compute)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["value"] * 4
+    assert len(calls) == 1
+
+
+def test_lease_is_renewed_while_computing_past_its_expiry(backend, monkeypatch):
+    monkeypatch.setattr(shared_state, "SINGLE_FLIGHT_LEASE_SEC", 0.3)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(1.0)  # three lease lifetimes
+        return "slow"
+
+    holder = threading.Thread(target=shared_state.single_flight, args=("test", "k", slow))
+    holder.start()
+    time.sleep(0.1)
+
+    assert shared_state.single_flight("test", "k", lambda: calls.append(2) or "dup") == "slow"
+    holder.join()
+    assert calls == [1]
+    assert backend.get("lease:test:k") is None
+
+
+def test_holder_does_not_delete_a_lease_taken_over_by_another(backend):
+    def compute():
+        # Our lease was lost and another node took the key over
+        backend.delete("lease:test:k")
+        backend.add("lease:test:k", "other node", 60)
+        return "value"
+
+    shared_state.single_flight("test", "k", compute)
+
+    assert backend.get("lease:test:k") == "other node"
+
+
+def test_renew_and_delete_if_compare_the_holder(backend):
+    backend.add("lease:x", "me", 60)
+
+    assert not backend.renew("lease:x", "someone else", 60)
+    assert not backend.delete_if("lease:x", "someone else")
+    assert backend.renew("lease:x", "me", 60)
+    assert backend.delete_if("lease:x", "me")
+    assert backend.get("lease:x") is None
+
+
+def test_values_failing_keep_are_returned_but_not_stored(backend):
+    assert shared_state.single_flight("test", "k", lambda: "", keep=bool) == ""
+    assert shared_state.single_flight("test", "k", lambda: "good", keep=bool) == "good"
+    assert shared_state.get("test", "k") == "good"
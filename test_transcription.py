@@ -0,0 +1,78 @@
+import pytest
+
+import audio_preprocess
+import transcription
+from transcription import CircuitBreaker, TranscriptionRouter
+
+
+def failing(path):
+    raise RuntimeError("API down")
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(transcription.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(window=4, min_calls=2, error_rate=0.5, open_sec=60)
+
+    assert breaker.allow()
+    breaker.record(False, 1.0)
+    breaker.record(False, 1.0)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock[0] += 61
+    assert breaker.allow()  # the single half-open probe
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record(True, 1.0)
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_and_slow_calls_scale_with_audio():
+    breaker = CircuitBreaker(min_calls=1, slow_sec=60, slow_sec_per_min=30, open_sec=0)
+
+    assert breaker.slow_threshold(None) is None
+    assert breaker.slow_threshold(60) == 60
+    assert breaker.slow_threshold(600) == 300
+
+    breaker.record(True, 200, audio_seconds=600)
+    assert breaker.state == "closed"
+    breaker.record(True, 200, audio_seconds=60)
+    assert breaker.state == "open"
+    assert breaker.allow()
+    breaker.record(False, 1.0)
+    assert breaker.state == "open"
+
+
+def test_router_falls_back_and_labels_the_backend(monkeypatch):
+    monkeypatch.setattr(audio_preprocess, "FFMPEG_AVAILABLE", False)
+    router = TranscriptionRouter(failing, lambda path: "local text", CircuitBreaker(min_calls=1, open_sec=60),
+                                 primary_name="api", fallback_name="local")
+
+    assert router.route("a.m4a") == ("local text", "local")
+    assert router.breaker.state == "open"
+    assert router.route("a.m4a") == ("local text", "local")
+    assert router.stats()["served"] == {"primary": 0, "fallback": 2}
+
+
+def test_failed_duration_probe_does_not_strand_a_half_open_breaker(monkeypatch):
+    def probe_fails(path):
+        raise OSError("ffmpeg vanished")
+
+    monkeypatch.setattr(audio_preprocess, "FFMPEG_AVAILABLE", True)
+    monkeypatch.setattr(audio_preprocess, "probe", probe_fails)
+    breaker = CircuitBreaker(min_calls=1, open_sec=0)
+    breaker.record(False, 1.0)
+    router = TranscriptionRouter(lambda path: "api text", None, breaker)
+
+    assert router("a.m4a") == "api text"
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_without_fallback_raises():
+    breaker = CircuitBreaker(min_calls=1, open_sec=60)
+    breaker.record(False, 1.0)
+    router = TranscriptionRouter(failing, None, breaker)
+
+    with pytest.raises(RuntimeError, match="circuit open"):
+        router("a.m4a")
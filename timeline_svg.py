@@ -0,0 +1,219 @@
+"""
+Inline SVG charts for emotional maps, without matplotlib.
+
+Layout is computed with NumPy over the whole timeline at once: segments are
+binned into at most MAX_COLUMNS columns, so long timelines (thousands of
+segments) produce charts of bounded size in a few milliseconds.
+
+    intensity_curve_svg(timeline)  intensity per speaker across the call
+    emotion_strip_svg(timeline)    heat strip of the most frequent emotions
+    render_timeline_html(emo_map)  both charts, for embedding in a report
+    render_timeline_svg(emo_map)   both charts as one standalone SVG document
+
+Usage:
+    python3 timeline_svg.py emotional_map.json --output emotional_map.svg
+"""
+
+import sys
+import json
+import argparse
+from html import escape
+
+import numpy as np
+
+WIDTH = 720
+CURVE_HEIGHT = 180
+ROW_HEIGHT = 16
+LABEL_WIDTH = 110
+PAD = 12
+MAX_COLUMNS = 240  # segments per column grow beyond this
+MAX_EMOTIONS = 8  # rows in the heat strip
+
+INTENSITY_LEVELS = {"low": 1.0, "medium": 2.0, "high": 3.0}
+SPEAKER_COLORS = ("#FF8C00", "#2B6CB0", "#CC3366", "#2F855A", "#805AD5", "#996633")
+STRIP_COLOR = "#FF6B35"
+FONT = "font-family=\"system-ui, sans-serif\" font-size=\"11\" fill=\"#4a5568\""
+
+
+def _intensities(timeline: list) -> np.ndarray:
+    values = np.full(len(timeline), np.nan)
+    for i, segment in enumerate(timeline):
+        level = segment.get("intensity")
+        if isinstance(level, (int, float)):
+            values[i] = min(max(float(level), 1.0), 3.0)
+        elif isinstance(level, str):
+            values[i] = INTENSITY_LEVELS.get(level.strip().lower(), np.nan)
+    return values
+
+
+def _columns(n: int) -> tuple:
+    """(column index per segment, number of columns)."""
+    columns = min(n, MAX_COLUMNS)
+    return np.arange(n) * columns // max(n, 1), columns
+
+
+def _x(columns: int) -> np.ndarray:
+    """x coordinate of each column's centre."""
+    plot_width = WIDTH - LABEL_WIDTH - 2 * PAD
+    return LABEL_WIDTH + PAD + (np.arange(columns) + 0.5) * plot_width / columns
+
+
+def _svg(height: int, elements: list) -> str:
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {height}" width="100%" role="img">'
+        + "".join(elements) + "</svg>"
+    )
+
+
+def _message(height: int, message: str) -> tuple:
+    return height, [f'<text x="{WIDTH / 2}" y="{height / 2}" text-anchor="middle" {FONT}>{escape(message)}</text>']
+
+
+def _intensity_curve(timeline: list) -> tuple:
+    n = len(timeline)
+    values = _intensities(timeline)
+    if not n or np.isnan(values).all():
+        return _message(CURVE_HEIGHT, "No intensity data")
+
+    speakers = np.array([str(segment.get("speaker") or "unknown") for segment in timeline])
+    names, speaker_ids = np.unique(speakers, return_inverse=True)
+    column, columns = _columns(n)
+    x = _x(columns)
+    top, bottom = PAD + 4, CURVE_HEIGHT - PAD - 14
+    y_of = lambda level: bottom - (level - 1.0) / 2.0 * (bottom - top)
+
+    parts = ["<title>Emotional intensity over the conversation</title>"]
+    for label, level in INTENSITY_LEVELS.items():
+        y = y_of(level)
+        parts.append(
+            f'<line x1="{LABEL_WIDTH + PAD}" x2="{WIDTH - PAD}" y1="{y:.1f}" y2="{y:.1f}" stroke="#E2E8F0"/>'
+            f'<text x="{LABEL_WIDTH}" y="{y + 4:.1f}" text-anchor="end" {FONT}>{label}</text>'
+        )
+
+    known = ~np.isnan(values)
+    for s, name in enumerate(names):
+        mask = known & (speaker_ids == s)
+        if not mask.any():
+            continue
+        sums = np.bincount(column[mask], weights=values[mask], minlength=columns)
+        counts = np.bincount(column[mask], minlength=columns)
+        filled = counts > 0
+        xs, ys = x[filled], y_of(sums[filled] / counts[filled])
+        color = SPEAKER_COLORS[s % len(SPEAKER_COLORS)]
+        points = " ".join(f"{px:.1f},{py:.1f}" for px, py in zip(xs, ys))
+        parts.append(
+            f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="2" '
+            f'stroke-linejoin="round"><title>{escape(name)}</title></polyline>'
+        )
+        if len(xs) <= 60:
+            parts.extend(
+                f'<circle cx="{px:.1f}" cy="{py:.1f}" r="3" fill="{color}"/>' for px, py in zip(xs, ys)
+            )
+        legend_x = LABEL_WIDTH + PAD + s * 110
+        parts.append(
+            f'<rect x="{legend_x}" y="{CURVE_HEIGHT - 10}" width="10" height="3" fill="{color}"/>'
+            f'<text x="{legend_x + 14}" y="{CURVE_HEIGHT - 5}" {FONT}>{escape(name[:14])}</text>'
+        )
+
+    return CURVE_HEIGHT, parts
+
+
+def _emotion_strip(timeline: list) -> tuple:
+    n = len(timeline)
+    segment_index, labels = [], []
+    for i, segment in enumerate(timeline):
+        emotions = segment.get("inferred_emotions") or []
+        if isinstance(emotions, str):
+            emotions = [emotions]
+        for emotion in emotions:
+            segment_index.append(i)
+            labels.append(str(emotion).strip().lower())
+    if not labels:
+        return _message(ROW_HEIGHT * 3, "No emotions inferred")
+
+    segment_index = np.array(segment_index)
+    names, emotion_ids = np.unique(np.array(labels), return_inverse=True)
+    top = np.argsort(-np.bincount(emotion_ids), kind="stable")[:MAX_EMOTIONS]
+    row_of = np.full(len(names), -1)
+    row_of[top] = np.arange(len(top))
+    rows = row_of[emotion_ids]
+    keep = rows >= 0
+
+    # Weight each mention by the segment's intensity (unknown counts as medium)
+    weights = np.nan_to_num(_intensities(timeline), nan=2.0)[segment_index]
+    column, columns = _columns(n)
+    heat = np.zeros((len(top), columns))
+    np.add.at(heat, (rows[keep], column[segment_index[keep]]), weights[keep])
+    heat /= max(heat.max(), 1e-9)
+
+    height = len(top) * ROW_HEIGHT + 2 * PAD
+    cell_width = (WIDTH - LABEL_WIDTH - 2 * PAD) / columns
+    x = _x(columns) - cell_width / 2
+    parts = ["<title>Most frequent emotions over the conversation</title>"]
+    for r, e in enumerate(top):
+        y = PAD + r * ROW_HEIGHT
+        parts.append(
+            f'<text x="{LABEL_WIDTH}" y="{y + ROW_HEIGHT - 4}" text-anchor="end" {FONT}>{escape(names[e][:18])}</text>'
+        )
+        cells = np.flatnonzero(heat[r])
+        parts.extend(
+            f'<rect x="{x[c]:.1f}" y="{y + 1}" width="{cell_width + 0.3:.2f}" height="{ROW_HEIGHT - 2}" '
+            f'fill="{STRIP_COLOR}" fill-opacity="{0.15 + 0.85 * heat[r, c]:.2f}"/>'
+            for c in cells
+        )
+    return height, parts
+
+
+def intensity_curve_svg(timeline: list) -> str:
+    """Mean intensity per speaker per column, one line per speaker."""
+    return _svg(*_intensity_curve(timeline))
+
+
+def emotion_strip_svg(timeline: list) -> str:
+    """Heat strip: one row per frequent emotion, shaded by how strongly it shows up in each column."""
+    return _svg(*_emotion_strip(timeline))
+
+
+def render_timeline_html(emo_map: dict) -> str:
+    """Both charts as an HTML fragment for the report page."""
+    timeline = emo_map.get("timeline") or []
+    return (
+        '<div class="emotion-charts">'
+        f"<h3>Intensity</h3>{intensity_curve_svg(timeline)}"
+        f"<h3>Emotions</h3>{emotion_strip_svg(timeline)}"
+        "</div>"
+    )
+
+
+def render_timeline_svg(emo_map: dict) -> str:
+    """Both charts stacked in one standalone SVG document."""
+    timeline = emo_map.get("timeline") or []
+    groups, offset = [], 0
+    for height, elements in (_intensity_curve(timeline), _emotion_strip(timeline)):
+        groups.append(f'<g transform="translate(0,{offset})">{"".join(elements)}</g>')
+        offset += height
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {offset}" '
+        f'width="{WIDTH}" height="{offset}">' + "".join(groups) + "</svg>"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render an emotional map as an SVG timeline.")
+    parser.add_argument("emotional_map", help="Path to an emotional_map.json file.")
+    parser.add_argument("--output", type=str, default="emotional_map.svg", help="Output SVG file.")
+    args = parser.parse_args()
+
+    with open(args.emotional_map, "r", encoding="utf-8") as f:
+        emo_map = json.load(f)
+    if not emo_map.get("timeline"):
+        print("Error: the emotional map has no timeline.", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(render_timeline_svg(emo_map))
+    print(f"Saved timeline chart to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,15 @@ This is a placeholder that shows how to integrate transcription.
 Replace the transcribe_audio() function with your actual transcription service.
 """
 
-import os
 import sys
+import sqlite3
 from pathlib import Path
 
+import search_index
+import audio_preprocess
+import transcription
+from transcript_model import Transcript, sidecar_path
+
 
 def transcribe_audio_openai(file_path):
     """
@@ -18,20 +23,7 @@ def transcribe_audio_openai(file_path):
     Requires: OPENAI_API_KEY in .env
     """
     try:
-        from openai import OpenAI
-        from dotenv import load_dotenv
-        
-        load_dotenv()
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
-        
-        return transcript
+        return transcription.transcribe_openai(file_path)
     except ImportError:
         print("Error: openai package not installed. Run: pip install openai")
         sys.exit(1)
@@ -40,19 +32,17 @@ def transcribe_audio_openai(file_path):
         sys.exit(1)
 
 
-def transcribe_audio_whisper_local(file_path):
+def transcribe_audio_whisper_local(file_path, segments=False):
     """
     Transcribe audio using local Whisper model.
     
+    Returns the transcript text, or Whisper's timestamped segments
+    (list of {"start", "end", "text"} dicts) if segments=True.
+    
     Requires: pip install openai-whisper
     """
     try:
-        import whisper
-        
-        model = whisper.load_model("base")  # or "tiny", "small", "medium", "large"
-        result = model.transcribe(file_path)
-        
-        return result["text"]
+        return transcription.transcribe_local(file_path, segments=segments)
     except ImportError:
         print("Error: whisper package not installed. Run: pip install openai-whisper")
         sys.exit(1)
@@ -86,22 +76,48 @@ def main():
         print(f"Error: Audio file '{audio_path}' not found.")
         sys.exit(1)
     
-    print(f"Transcribing {audio_path} using {method}...")
-    
-    if method == "openai":
-        transcript = transcribe_audio_openai(audio_path)
-    elif method == "whisper":
-        transcript = transcribe_audio_whisper_local(audio_path)
-    else:
+    if method not in ("openai", "whisper"):
         print(f"Error: Unknown method '{method}'. Use 'openai' or 'whisper'.")
         sys.exit(1)
     
+    # Strip video, downmix to 16 kHz mono and cut long silences before upload
+    prepared = audio_preprocess.preprocess(audio_path)
+    if prepared.changed:
+        stats = prepared.stats()
+        print(
+            f"Preprocessed: {stats['original_bytes'] / 1e6:.1f} MB -> {stats['processed_bytes'] / 1e6:.1f} MB, "
+            f"{stats['original_seconds']:.0f}s -> {stats['processed_seconds']:.0f}s of audio"
+        )
+    
+    print(f"Transcribing {audio_path} using {method}...")
+    
+    try:
+        if method == "openai":
+            transcript = transcribe_audio_openai(prepared.path)
+            parsed = Transcript.parse(transcript)
+        else:
+            # Keep Whisper's segment timestamps in the turn table, one segment per line,
+            # mapped back onto the original recording's timeline
+            segments = transcribe_audio_whisper_local(prepared.path, segments=True)
+            parsed = Transcript.from_whisper_segments(prepared.remap_segments(segments))
+            transcript = parsed.text
+    finally:
+        prepared.cleanup()
+    
     # Save transcript
     output_file = "transcript.txt"
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(transcript)
     
+    # Binary turn table next to the text, so later tools skip re-parsing
+    parsed.save(sidecar_path(output_file))
+
     print(f"\nTranscript saved to {output_file}")
+
+    try:
+        search_index.index_transcript(parsed, audio_path)
+    except sqlite3.Error as e:
+        print(f"Warning: could not update search index: {e}")
     print(f"\nFirst 500 characters:")
     print(transcript[:500] + "..." if len(transcript) > 500 else transcript)
 
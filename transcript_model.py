@@ -0,0 +1,319 @@
+"""
+Shared transcript model.
+
+A Transcript keeps the full text in one string buffer and describes its
+speaker turns in a compact, array-backed turn table (character offsets,
+speaker ids, file ids and optional start/end times). Transcripts are parsed
+once, from "Speaker A:" style text, timestamped lines or Whisper segments,
+and can then be sliced by turn, file or time without re-running regexes.
+
+A Transcript can be saved next to its text file as a binary sidecar
+("transcript.txt.turns") so later tools can load the turn table directly.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import struct
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+SIDECAR_SUFFIX = ".turns"
+_MAGIC = b"HITT"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHII")  # magic, version, turn count, metadata length
+
+# Turn table columns, in sidecar order: (attribute, array typecode)
+_COLUMNS = (
+    ("starts", "I"),
+    ("ends", "I"),
+    ("speaker_ids", "h"),
+    ("file_ids", "h"),
+    ("start_times", "d"),
+    ("end_times", "d"),
+)
+
+_SPEAKER = r"(?:Speaker[ \t]+\w+|[A-Z][\w.'-]*(?:[ \t][A-Z][\w.'-]*){0,2})"
+_TIMESTAMP = r"\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?"
+
+# One scan finds file headers ("[Audio: x]", "=== FILE: x ===") and turn starts
+# ("Speaker A:", "[00:01:23] Marco:", "12:05 -")
+_LINE_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"\[(?P<header_kind>Audio|Text):[ \t]*(?P<header>[^\]\n]+)\][ \t]*$"
+    r"|={3}[ \t]*FILE:[ \t]*(?P<file>.+?)[ \t]*={3}[ \t]*$"
+    rf"|[\[(]?(?P<ts>{_TIMESTAMP})[\])]?[ \t]*(?:[-–][ \t]*)?(?:(?P<ts_speaker>{_SPEAKER})[ \t]*:)?"
+    rf"|(?P<speaker>{_SPEAKER})[ \t]*:"
+    r")[ \t]*",
+    re.MULTILINE,
+)
+
+Turn = namedtuple("Turn", ["index", "speaker", "text", "start_time", "end_time", "file"])
+
+
+def parse_timestamp(value: str) -> float:
+    """Convert "mm:ss", "hh:mm:ss" or "hh:mm:ss.fff" to seconds."""
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+class Transcript:
+    """Text buffer plus an array-backed turn table."""
+
+    __slots__ = ("text", "speakers", "files", "file_labels") + tuple(name for name, _ in _COLUMNS)
+
+    def __init__(self, text: str = "", speakers: list = None, files: list = None, file_labels: list = None):
+        self.text = text
+        self.speakers = speakers or []
+        self.files = files or []
+        self.file_labels = file_labels or []
+        for name, typecode in _COLUMNS:
+            setattr(self, name, array(typecode))
+
+    # -- construction -----------------------------------------------------
+
+    def _speaker_id(self, speaker: str) -> int:
+        if not speaker:
+            return -1
+        try:
+            return self.speakers.index(speaker)
+        except ValueError:
+            self.speakers.append(speaker)
+            return len(self.speakers) - 1
+
+    def _file_id(self, name: str, label: str = "") -> int:
+        self.files.append(name)
+        self.file_labels.append(label)
+        return len(self.files) - 1
+
+    def _append(self, start: int, end: int, speaker_id: int, file_id: int, start_time: float, end_time: float):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.speaker_ids.append(speaker_id)
+        self.file_ids.append(file_id)
+        self.start_times.append(start_time)
+        self.end_times.append(end_time)
+
+    @classmethod
+    def parse(cls, text: str) -> "Transcript":
+        """Parse speaker labels, timestamps and file headers from plain text."""
+        transcript = cls(text)
+        nan = float("nan")
+        file_id = -1
+        pending = None  # (body start, speaker id, start time) of the open turn
+        last_timed = None  # index of the last turn that had a start time
+
+        def close(end: int):
+            nonlocal last_timed
+            body_start, speaker_id, start_time = pending
+            while body_start < end and text[body_start].isspace():
+                body_start += 1
+            while end > body_start and text[end - 1].isspace():
+                end -= 1
+            if end <= body_start:
+                return
+            if not math.isnan(start_time):
+                # A new timestamp closes the previous timed turn in the same file
+                if last_timed is not None and transcript.file_ids[last_timed] == file_id:
+                    transcript.end_times[last_timed] = start_time
+                last_timed = len(transcript)
+            transcript._append(body_start, end, speaker_id, file_id, start_time, nan)
+
+        for match in _LINE_PATTERN.finditer(text):
+            if pending is None:
+                pending = (0, -1, nan)
+            close(match.start())
+
+            header = match.group("header") or match.group("file")
+            if header:
+                file_id = transcript._file_id(header.strip(), match.group("header_kind") or "File")
+                pending = (match.end(), -1, nan)
+                continue
+
+            start_time = parse_timestamp(match.group("ts")) if match.group("ts") else nan
+            speaker = match.group("ts_speaker") or match.group("speaker") or ""
+            pending = (match.end(), transcript._speaker_id(speaker.strip()), start_time)
+
+        if pending is None:
+            pending = (0, -1, nan)
+        close(len(text))
+        return transcript
+
+    @classmethod
+    def from_whisper_segments(cls, segments: list, speaker: str = "") -> "Transcript":
+        """Build a transcript from Whisper segments ({"start", "end", "text"} dicts)."""
+        transcript = cls()
+        speaker_id = transcript._speaker_id(speaker)
+        parts, offset = [], 0
+        for segment in segments:
+            body = str(segment.get("text", "")).strip()
+            if not body:
+                continue
+            if parts:
+                parts.append("\n")
+                offset += 1
+            transcript._append(
+                offset, offset + len(body), speaker_id, -1,
+                float(segment.get("start", "nan")), float(segment.get("end", "nan")),
+            )
+            parts.append(body)
+            offset += len(body)
+        transcript.text = "".join(parts)
+        return transcript
+
+    @classmethod
+    def combine(cls, parts: list, separator: str = "\n\n") -> "Transcript":
+        """
+        Concatenate (label, filename, Transcript) parts under "[label: filename]"
+        headers, shifting turn tables instead of re-parsing the combined text.
+        """
+        combined = cls()
+        buffers, offset = [], 0
+        for i, (label, filename, part) in enumerate(parts):
+            if i:
+                buffers.append(separator)
+                offset += len(separator)
+            header = f"[{label}: {filename}]\n"
+            buffers.append(header)
+            offset += len(header)
+
+            file_id = combined._file_id(filename, label)
+            speaker_map = [combined._speaker_id(name) for name in part.speakers]
+            for t in range(len(part)):
+                sid = part.speaker_ids[t]
+                combined._append(
+                    part.starts[t] + offset, part.ends[t] + offset,
+                    speaker_map[sid] if sid >= 0 else -1, file_id,
+                    part.start_times[t], part.end_times[t],
+                )
+            buffers.append(part.text)
+            offset += len(part.text)
+        combined.text = "".join(buffers)
+        return combined
+
+    # -- access -----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def turn_text(self, i: int) -> str:
+        return self.text[self.starts[i] : self.ends[i]]
+
+    def speaker(self, i: int) -> str:
+        sid = self.speaker_ids[i]
+        return self.speakers[sid] if sid >= 0 else ""
+
+    def turn(self, i: int) -> Turn:
+        fid = self.file_ids[i]
+        return Turn(
+            i, self.speaker(i), self.turn_text(i),
+            self.start_times[i], self.end_times[i],
+            self.files[fid] if fid >= 0 else "",
+        )
+
+    def __iter__(self):
+        return (self.turn(i) for i in range(len(self)))
+
+    def speaker_turns(self) -> list:
+        """(speaker, text) pairs; unlabeled turns have speaker ''."""
+        return [(self.speaker(i), self.turn_text(i)) for i in range(len(self))]
+
+    def window(self, first: int, last: int) -> str:
+        """Text spanning turns first..last (inclusive) as a single slice of the buffer."""
+        if first > last or not len(self):
+            return ""
+        return self.text[self.starts[first] : self.ends[last]]
+
+    def file_turns(self, filename: str) -> range:
+        """Indices of the turns belonging to filename (turns of a file are contiguous)."""
+        try:
+            fid = self.files.index(filename)
+        except ValueError:
+            return range(0)
+        indices = [i for i in range(len(self)) if self.file_ids[i] == fid]
+        return range(indices[0], indices[-1] + 1) if indices else range(0)
+
+    def turns_between(self, start: float, end: float) -> range:
+        """Indices of timed turns starting within [start, end) seconds."""
+        times = self.start_times
+        if any(math.isnan(t) for t in times) or any(a > b for a, b in zip(times, times[1:])):
+            indices = [i for i, t in enumerate(times) if start <= t < end]
+            return range(indices[0], indices[-1] + 1) if indices else range(0)
+        return range(bisect_left(times, start), bisect_left(times, end))
+
+    def duration(self) -> float:
+        """Seconds covered by timed turns, or nan if untimed."""
+        timed = [t for t in self.end_times if not math.isnan(t)] or [
+            t for t in self.start_times if not math.isnan(t)
+        ]
+        return max(timed) if timed else float("nan")
+
+    # -- sidecar serialization -------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        meta = json.dumps(
+            {"speakers": self.speakers, "files": self.files, "file_labels": self.file_labels},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        chunks = [_HEADER.pack(_MAGIC, _VERSION, len(self), len(meta)), meta]
+        for name, _ in _COLUMNS:
+            column = getattr(self, name)
+            if sys.byteorder != "little":
+                column = array(column.typecode, column)
+                column.byteswap()
+            chunks.append(column.tobytes())
+        chunks.append(self.text.encode("utf-8"))
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Transcript":
+        magic, version, n_turns, meta_len = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a transcript sidecar (or unsupported version).")
+        offset = _HEADER.size
+        meta = json.loads(data[offset : offset + meta_len].decode("utf-8"))
+        offset += meta_len
+
+        transcript = cls(speakers=meta["speakers"], files=meta["files"], file_labels=meta["file_labels"])
+        for name, typecode in _COLUMNS:
+            column = array(typecode)
+            size = n_turns * column.itemsize
+            column.frombytes(data[offset : offset + size])
+            if sys.byteorder != "little":
+                column.byteswap()
+            setattr(transcript, name, column)
+            offset += size
+        transcript.text = data[offset:].decode("utf-8")
+        return transcript
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Transcript":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def sidecar_path(transcript_path: str) -> str:
+    return transcript_path + SIDECAR_SUFFIX
+
+
+def load_transcript(path: str) -> Transcript:
+    """Load a transcript file, using its sidecar if it is at least as new as the text."""
+    sidecar = sidecar_path(path)
+    try:
+        if os.path.getmtime(sidecar) >= os.path.getmtime(path):
+            return Transcript.load(sidecar)
+    except (OSError, ValueError, struct.error):
+        pass
+    with open(path, "r", encoding="utf-8") as f:
+        return Transcript.parse(f.read())
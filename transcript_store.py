@@ -0,0 +1,38 @@
+"""
+Content-addressed store of full transcripts shown in reports.
+
+A report page carries only a short preview of each transcript. The full
+text is saved here under a hash of its content and fetched from
+/transcript/<id> when the reader expands it, which keeps large multi-file
+reports small. Transcripts live in the shared state (see shared_state), so
+any worker or node can serve them, and expire TRANSCRIPT_STORE_TTL_DAYS
+after they were last saved.
+"""
+
+import re
+import hashlib
+
+import config
+import shared_state
+
+TRANSCRIPT_STORE_TTL_DAYS = float(config.get("TRANSCRIPT_STORE_TTL_DAYS", "30"))
+
+_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def transcript_id(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def save(text: str) -> str:
+    """Store text (restarting its TTL if already stored) and return its id."""
+    tid = transcript_id(text)
+    shared_state.put("transcript", tid, text, ttl=TRANSCRIPT_STORE_TTL_DAYS * 86400)
+    return tid
+
+
+def load(tid: str) -> str:
+    """The stored text, or None for an unknown or malformed id."""
+    if not _ID_PATTERN.match(tid):
+        return None
+    return shared_state.get("transcript", tid)
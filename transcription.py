@@ -0,0 +1,297 @@
+"""
+Shared transcription clients.
+
+The OpenAI client is created once and reused by every request and thread
+(it is thread-safe and keeps its HTTP connections alive); it is rebuilt
+only when OPENAI_API_KEY changes in the configuration. Local Whisper models
+are loaded once per model name and shared, with a lock per model since
+inference on one model is not thread-safe.
+
+transcribe() routes between the two through a circuit breaker: the API is
+used while it is healthy; once too many recent calls failed or were too
+slow for the length of their audio, the breaker opens and uploads go straight to local Whisper for a
+cool-down period, after which a single probe request decides whether the
+API is back.
+
+Inside a cancellable job (see cancellation) both backends are waited on
+through cancellation.run(), so a cancelled upload stops waiting for its
+transcript at once; a cancelled call is not counted against the API.
+"""
+
+import time
+import threading
+from collections import deque
+
+import config
+import admission
+import cancellation
+import audio_preprocess
+
+OPENAI_TRANSCRIPTION_MODEL = config.get("OPENAI_TRANSCRIPTION_MODEL", "whisper-1")
+LOCAL_WHISPER_MODEL = config.get("LOCAL_WHISPER_MODEL", "base")  # or "tiny", "small", "medium", "large"
+OPENAI_TIMEOUT = float(config.get("OPENAI_TRANSCRIPTION_TIMEOUT", "300"))  # seconds per API call
+TRANSCRIPTION_FALLBACK = config.get_bool("TRANSCRIPTION_FALLBACK", True)  # use local Whisper when the API fails
+
+BREAKER_WINDOW = int(config.get("BREAKER_WINDOW", "20"))  # recent API calls considered
+BREAKER_MIN_CALLS = int(config.get("BREAKER_MIN_CALLS", "4"))  # before the error rate can trip it
+BREAKER_ERROR_RATE = float(config.get("BREAKER_ERROR_RATE", "0.5"))  # failed or slow share that opens it
+BREAKER_SLOW_SEC_PER_MIN = float(config.get("BREAKER_SLOW_SEC_PER_MIN", "30"))  # per minute of audio; slower calls count as bad
+BREAKER_SLOW_SEC = float(config.get("BREAKER_SLOW_SEC", "60"))  # least time any call is allowed before it counts as slow
+BREAKER_OPEN_SEC = float(config.get("BREAKER_OPEN_SEC", "60"))  # cool-down before probing the API again
+
+_client_lock = threading.Lock()
+_openai_client = None
+_openai_key = None
+
+_whisper_lock = threading.Lock()
+_whisper_models = {}  # model name -> (model, inference lock)
+
+
+def openai_client():
+    """The shared OpenAI client for the current OPENAI_API_KEY."""
+    global _openai_client, _openai_key
+    try:
+        from openai import OpenAI
+    except ImportError:
+        raise ImportError("openai package not installed. Run: pip install openai")
+    key = config.get("OPENAI_API_KEY")
+    if not key:
+        raise ValueError(
+            "OPENAI_API_KEY not found in .env file. "
+            "Please add it to your .env file: OPENAI_API_KEY=your_key_here"
+        )
+    with _client_lock:
+        if _openai_client is None or key != _openai_key:
+            _openai_client = OpenAI(api_key=key, timeout=OPENAI_TIMEOUT)
+            _openai_key = key
+        return _openai_client
+
+
+def whisper_model(name: str = None) -> tuple:
+    """(model, lock) for a local Whisper model, loaded on first use."""
+    name = name or LOCAL_WHISPER_MODEL
+    try:
+        import whisper
+    except ImportError:
+        raise ImportError("openai-whisper package not installed. Run: pip install openai-whisper")
+    with _whisper_lock:
+        if name not in _whisper_models:
+            _whisper_models[name] = (whisper.load_model(name), threading.Lock())
+        return _whisper_models[name]
+
+
+def transcribe_openai(audio_path: str) -> str:
+    """Transcribe audio using OpenAI's Whisper API."""
+    client = openai_client()
+    try:
+        with open(audio_path, "rb") as audio_file:
+            return client.audio.transcriptions.create(
+                model=OPENAI_TRANSCRIPTION_MODEL,
+                file=audio_file,
+                response_format="text"
+            )
+    except Exception as e:
+        raise Exception(f"OpenAI transcription error: {e}")
+
+
+def transcribe_local(audio_path, segments: bool = False, model_name: str = None, **options):
+    """
+    Transcribe audio (a path or a float32 array) with a local Whisper model.
+    Returns the text, or Whisper's segments ({"start", "end", "text"}) if segments=True.
+    """
+    model, lock = whisper_model(model_name)
+    try:
+        with lock:
+            result = model.transcribe(audio_path, **options)
+    except Exception as e:
+        raise Exception(f"Local Whisper transcription error: {e}")
+    return result["segments"] if segments else result["text"]
+
+
+class CircuitBreaker:
+    """
+    closed: calls go through and outcomes are recorded.
+    open: calls are refused until open_sec have passed.
+    half_open: one probe call is let through; its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, slow_sec: float = BREAKER_SLOW_SEC,
+                 slow_sec_per_min: float = BREAKER_SLOW_SEC_PER_MIN, open_sec: float = BREAKER_OPEN_SEC):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_sec = slow_sec
+        self.slow_sec_per_min = slow_sec_per_min
+        self.open_sec = open_sec
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True for a good call
+        self._latencies = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0, "probes": 0}
+
+    def allow(self) -> bool:
+        """Whether the next call may go to the protected backend."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.open_sec:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                self._counters["probes"] += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def slow_threshold(self, audio_seconds: float = None) -> float:
+        """Seconds after which a call on audio_seconds of audio counts as slow (None: never, length unknown)."""
+        if audio_seconds is None:
+            return None
+        return max(self.slow_sec, self.slow_sec_per_min * audio_seconds / 60)
+
+    def record(self, ok: bool, seconds: float, audio_seconds: float = None):
+        threshold = self.slow_threshold(audio_seconds)
+        with self._lock:
+            slow = ok and threshold is not None and seconds > threshold
+            self._counters["calls"] += 1
+            self._counters["failures"] += not ok
+            self._counters["slow_calls"] += slow
+            good = ok and not slow
+            if self.state == "half_open":
+                self._probing = False
+                if good:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(good)
+            self._latencies.append(seconds)
+            bad = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and bad / len(self._outcomes) >= self.error_rate:
+                self._open()
+
+    def release(self):
+        """Forget a call that was allowed but abandoned without an outcome."""
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._counters["opened"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+            stats["state"] = self.state
+            stats["recent_error_rate"] = (
+                self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+            )
+            stats["recent_p50_seconds"] = latencies[len(latencies) // 2] if latencies else None
+            if self.state == "open":
+                stats["retry_in_seconds"] = max(0.0, self.open_sec - (time.monotonic() - self._opened_at))
+        return stats
+
+
+def _probe_duration(audio_path: str) -> float:
+    """Seconds of audio in audio_path, or None if it cannot be probed."""
+    if not audio_preprocess.FFMPEG_AVAILABLE:
+        return None
+    try:
+        return audio_preprocess.probe(audio_path)["duration"]
+    except (OSError, ValueError):
+        return None
+
+
+class TranscriptionRouter:
+    """
+    Send audio to primary while its breaker allows it, otherwise (or on
+    failure) to fallback. primary_name and fallback_name label which backend
+    produced a transcript (see route()).
+    """
+
+    def __init__(self, primary, fallback=None, breaker: CircuitBreaker = None,
+                 primary_name: str = "primary", fallback_name: str = "fallback"):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker or CircuitBreaker()
+        self.primary_name = primary_name
+        self.fallback_name = fallback_name
+        self._lock = threading.Lock()
+        self._served = {"primary": 0, "fallback": 0}
+
+    def __call__(self, audio_path: str, audio_seconds: float = None) -> str:
+        return self.route(audio_path, audio_seconds)[0]
+
+    def route(self, audio_path: str, audio_seconds: float = None) -> tuple:
+        """
+        Transcribe audio_path; returns (text, name of the backend that produced it).
+        audio_seconds (probed when not given) scales what counts as a slow call.
+        """
+        cancellation.check()
+        # Admitted before the breaker is consulted, so waiting never holds its probe
+        with admission.slot("transcription"):
+            return self._route(audio_path, audio_seconds)
+
+    def _route(self, audio_path: str, audio_seconds: float = None) -> tuple:
+        primary_error = None
+        # Probed before allow(): once a half-open breaker lets this call
+        # through, nothing may fail before its outcome is recorded
+        if audio_seconds is None:
+            audio_seconds = _probe_duration(audio_path)
+        if self.breaker.allow():
+            started = time.monotonic()
+            try:
+                text = cancellation.run(self.primary, audio_path)
+            except cancellation.Cancelled:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                self.breaker.record(False, time.monotonic() - started, audio_seconds)
+                primary_error = e
+            else:
+                self.breaker.record(True, time.monotonic() - started, audio_seconds)
+                self._serve("primary")
+                return text, self.primary_name
+
+        if self.fallback is None:
+            raise primary_error or RuntimeError("Transcription API unavailable (circuit open) and no fallback configured.")
+        try:
+            text = cancellation.run(self.fallback, audio_path)
+        except cancellation.Cancelled:
+            raise
+        except Exception as e:
+            if primary_error:
+                raise Exception(f"{primary_error}; fallback also failed: {e}")
+            raise
+        self._serve("fallback")
+        return text, self.fallback_name
+
+    def _serve(self, backend: str):
+        with self._lock:
+            self._served[backend] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = dict(self._served)
+        return {"breaker": self.breaker.stats(), "served": served, "fallback": self.fallback is not None}
+
+
+router = TranscriptionRouter(
+    transcribe_openai, transcribe_local if TRANSCRIPTION_FALLBACK else None,
+    primary_name=OPENAI_TRANSCRIPTION_MODEL, fallback_name=f"local-whisper-{LOCAL_WHISPER_MODEL}",
+)
+
+
+def transcribe(audio_path: str, audio_seconds: float = None) -> str:
+    """Transcribe with the API, failing over to local Whisper while the API is unhealthy."""
+    return router(audio_path, audio_seconds)
+
+
+def router_stats() -> dict:
+    return router.stats()
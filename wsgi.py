@@ -0,0 +1,38 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master process, so the app,
+its dependencies (NumPy, pandas, matplotlib) and the warm caches below are
+loaded once and shared copy-on-write by every forked worker instead of
+being loaded per worker. Nothing here starts threads or opens connections,
+which must not be shared across fork; thread pools, HTTP sessions and
+SQLite connections are all created lazily inside each worker.
+
+`python app.py` is still the development server (single process, debugger
+and reloader on).
+"""
+
+import config
+import emotion_analytics
+import transcription
+from app import app
+
+WARM_WHISPER = config.get_bool("WARM_WHISPER", False)  # load the local Whisper model before forking
+
+
+def warm():
+    """Fill caches that every worker would otherwise build on its first request."""
+    try:
+        emotion_analytics.load_tables()
+    except (OSError, ValueError):
+        pass
+    if WARM_WHISPER:
+        try:
+            transcription.whisper_model()
+        except ImportError:
+            pass
+
+
+warm()